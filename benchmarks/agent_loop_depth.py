@@ -0,0 +1,59 @@
+"""Per-chunk overhead of the agent loop as the number of tool rounds in a turn grows.
+
+A scripted LLM streams a fixed number of text chunks per step and calls a no-op tool for the first
+N steps, so any growth in time per chunk between 1 and 50 tool rounds is agent loop overhead.
+
+    uv run python benchmarks/agent_loop_depth.py
+"""
+import asyncio
+import time
+from typing import AsyncGenerator, List
+
+from ame.core.agent_with_tools import AgentWithTools, AgentWithToolsConfig
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import Tool, ToolCall, tool
+from ame.llms.llm import LLM
+
+CHUNKS_PER_STEP = 2000
+TOOL_ROUNDS = [1, 10, 50]
+
+
+class ScriptedLLM(LLM):
+    def __init__(self, tool_rounds: int) -> None:
+        self.tool_rounds = tool_rounds
+        self.step = 0
+
+    async def astream(self, messages: list[ChatMessage], tools: List[Tool]) -> AsyncGenerator[str | ToolCall]:
+        self.step += 1
+        for _ in range(CHUNKS_PER_STEP):
+            yield "x"
+        if self.step <= self.tool_rounds:
+            yield ToolCall(id=f"call_{self.step}", name="noop", args={})
+
+
+class BenchAgent(AgentWithTools):
+    @tool
+    async def noop(self) -> str:
+        """Does nothing."""
+        return ""
+
+
+async def _run(tool_rounds: int) -> None:
+    agent = BenchAgent(ScriptedLLM(tool_rounds), "bench", AgentWithToolsConfig(max_message_history=1000))
+    chunks = 0
+    start = time.perf_counter()
+    async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go")):
+        if isinstance(chunk, str):
+            chunks += 1
+    elapsed = time.perf_counter() - start
+    print(f"{tool_rounds:>12} {chunks:>10} {chunks / elapsed:>16,.0f} {elapsed / chunks * 1e9:>14.0f}ns")
+
+
+async def main() -> None:
+    print(f"{'tool rounds':>12} {'chunks':>10} {'chunks/s':>16} {'per chunk':>16}")
+    for tool_rounds in TOOL_ROUNDS:
+        await _run(tool_rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
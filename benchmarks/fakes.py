@@ -0,0 +1,82 @@
+"""Deterministic stand-ins for LLM providers, shared by the benchmarks.
+
+A `ResponseScript` describes what every response of a turn looks like. Whether a response makes tool
+calls depends only on the history it is given (how many tool rounds the current turn already has), so
+the same script produces the same conversation every run, whether it is played by `ScriptedLLM` or by
+the stub servers in `stub_servers.py`.
+"""
+import asyncio
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from ame.core.agent_with_tools import AgentWithTools
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import Tool, ToolCall, ToolExecution, tool
+from ame.llms.llm import LLM
+
+
+class ResponseScript(BaseModel):
+    # Text chunks streamed in every response, before any tool calls
+    text_chunks: int = 50
+    chunk_text: str = "token "
+    # Responses per turn that make tool calls before the final answer, and tool calls per such response
+    tool_rounds: int = 0
+    tool_calls_per_round: int = 1
+    tool_name: str = "noop"
+    tool_args: Dict = {}
+    # Delay before each chunk. None streams as fast as the consumer reads.
+    tokens_per_second: Optional[float] = None
+
+    def tool_call_ids(self, tool_round: int) -> List[str]:
+        return [f"call_{tool_round}_{i}" for i in range(self.tool_calls_per_round)]
+
+
+def completed_tool_rounds(messages: List[ChatMessage]) -> int:
+    """Tool call messages since the last user text message."""
+    rounds = 0
+    for message in reversed(messages):
+        if message.role == ChatRole.USER and isinstance(message.content, str):
+            break
+        if isinstance(message.content, list):
+            rounds += 1
+    return rounds
+
+
+class ScriptedLLM(LLM):
+    def __init__(self, script: ResponseScript = ResponseScript()) -> None:
+        self.script = script
+        self.requests = 0
+
+    async def astream(self, messages: list[ChatMessage], tools: List[Tool]) -> AsyncGenerator[str | ToolCall]:
+        self.requests += 1
+        script = self.script
+        delay = 1 / script.tokens_per_second if script.tokens_per_second else None
+        for _ in range(script.text_chunks):
+            if delay is not None:
+                await asyncio.sleep(delay)
+            yield script.chunk_text
+        tool_round = completed_tool_rounds(messages)
+        if tool_round < script.tool_rounds:
+            for call_id in script.tool_call_ids(tool_round):
+                yield ToolCall(id=call_id, name=script.tool_name, args=dict(script.tool_args))
+
+
+class BenchAgent(AgentWithTools):
+    @tool
+    async def noop(self) -> str:
+        """Does nothing."""
+        return ""
+
+    @tool
+    async def sleep(self, seconds: float) -> str:
+        """Waits without blocking the event loop, like a network call."""
+        await asyncio.sleep(seconds)
+        return "done"
+
+    @tool(execution=ToolExecution.THREAD)
+    def block(self, seconds: float) -> str:
+        """Blocks its thread, like a synchronous client or subprocess."""
+        time.sleep(seconds)
+        return "done"
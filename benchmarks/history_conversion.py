@@ -0,0 +1,58 @@
+"""Per-turn cost of converting agent history into provider request format.
+
+Simulates a session that grows by one user message, one tool batch and one assistant reply per turn,
+converting the history for a request after every turn, and reports the average conversion time per
+request as the history grows, with and without a `ConvertedHistory` cache.
+
+    uv run python benchmarks/history_conversion.py
+"""
+import time
+from typing import Callable, Dict, List
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import ToolCall
+from ame.llms.anthropic.utils import chat_message_to_anthropic_messages, chat_messages_to_anthropic_system_and_messages
+from ame.llms.gemini.utils import chat_message_to_gemini_contents, chat_messages_to_gemini_system_and_contents
+from ame.llms.history import ConvertedHistory
+
+CHECKPOINTS = [100, 200, 400, 800, 1600]
+
+
+def _append_turn(messages: List[ChatMessage], turn: int) -> None:
+    messages.append(ChatMessage(role=ChatRole.USER, content=f"question {turn} " * 20))
+    messages.append(ChatMessage(role=ChatRole.ASSISTANT, content=[
+        ToolCall(id=f"call_{turn}_{i}", name="search", args={"query": f"q{turn}", "page": i}, response="result " * 50)
+        for i in range(2)
+    ]))
+    messages.append(ChatMessage(role=ChatRole.ASSISTANT, content=f"answer {turn} " * 40))
+
+
+def main() -> None:
+    anthropic_history = ConvertedHistory(chat_message_to_anthropic_messages)
+    gemini_history = ConvertedHistory(chat_message_to_gemini_contents)
+    converters: Dict[str, Callable[[List[ChatMessage]], object]] = {
+        "anthropic (cached)": lambda m: chat_messages_to_anthropic_system_and_messages(m, anthropic_history),
+        "anthropic (uncached)": chat_messages_to_anthropic_system_and_messages,
+        "gemini (cached)": lambda m: chat_messages_to_gemini_system_and_contents(m, gemini_history),
+        "gemini (uncached)": chat_messages_to_gemini_system_and_contents,
+    }
+    print(f"{'messages':>10} " + " ".join(f"{name:>22}" for name in converters))
+
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="You are a helpful assistant.")]
+    turn = 0
+    for checkpoint in CHECKPOINTS:
+        totals = {name: 0.0 for name in converters}
+        turns = 0
+        while len(messages) < checkpoint:
+            _append_turn(messages, turn)
+            turn += 1
+            turns += 1
+            for name, convert in converters.items():
+                start = time.perf_counter()
+                convert(messages)
+                totals[name] += time.perf_counter() - start
+        print(f"{len(messages):>10} " + " ".join(f"{totals[name] / turns * 1e6:>20.1f}us" for name in converters))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Cold import cost of the package, measured in fresh interpreters with `python -X importtime`.
+
+Reports the median total import time, the number of modules imported and the interpreter's wall time
+for each statement, so eager imports of provider SDKs show up as regressions.
+
+    uv run python benchmarks/import_time.py
+"""
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict
+
+STATEMENTS = {
+    "ame": "import ame",
+    "ame.llms": "import ame.llms",
+    "anthropic_llm": "from ame.llms import AnthropicLLM",
+    "gemini_llm": "from ame.llms import GeminiLLM",
+}
+
+
+def measure_import(statement: str, runs: int = 5) -> Dict[str, float]:
+    import_us = []
+    modules = []
+    wall = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+        )
+        wall.append(time.perf_counter() - start)
+        # Lines look like "import time:   self [us] | cumulative | imported package"
+        rows = [line.split("|") for line in completed.stderr.splitlines() if line.startswith("import time:")]
+        rows = [row for row in rows if row[0].split(":")[1].strip().isdigit()]
+        import_us.append(sum(int(row[0].split(":")[1]) for row in rows))
+        modules.append(len(rows))
+    return {
+        "import_ms": statistics.median(import_us) / 1e3,
+        "modules": float(statistics.median(modules)),
+        "wall_ms": statistics.median(wall) * 1e3,
+    }
+
+
+def main() -> None:
+    print(f"{'statement':<40} {'import':>10} {'modules':>8} {'wall':>10}")
+    for statement in STATEMENTS.values():
+        result = measure_import(statement)
+        print(f"{statement:<40} {result['import_ms']:>8.1f}ms {result['modules']:>8.0f} {result['wall_ms']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
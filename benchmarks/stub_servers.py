@@ -0,0 +1,323 @@
+"""Local HTTP servers that speak the Anthropic and Gemini streaming and batch wire formats.
+
+They play a `ResponseScript` so the real adapters, SDKs and HTTP clients can be benchmarked end to end
+without network latency or API costs. Point an adapter at one with `base_url=server.base_url`. Batches
+end `batch_delay` seconds after they are submitted, with every request answered as it would have been
+streamed.
+
+    async with AnthropicStubServer(script) as server:
+        llm = AnthropicLLM(base_url=server.base_url)
+"""
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from fakes import ResponseScript
+
+
+class StubServer(ABC):
+    """Minimal HTTP/1.1 server with keep-alive that answers requests with a chunked event stream, or with
+    JSON for the routes `respond` handles."""
+
+    def __init__(self, script: ResponseScript = ResponseScript(), batch_delay: float = 0.0) -> None:
+        self.script = script
+        self.batch_delay = batch_delay
+        self.requests = 0
+        self.connections = 0
+        # Batch id -> (time it ends, request bodies), and cancelled batch ids
+        self.batches: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self.cancelled: Set[str] = set()
+        self._server: Optional[asyncio.Server] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aenter__(self) -> "StubServer":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._server.close()
+        # Clients keep idle connections open, and wait_closed waits for them
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    @abstractmethod
+    def events(self, body: Dict[str, Any]) -> Iterator[bytes]:
+        """The server-sent events answering a streamed request."""
+        ...
+
+    def respond(self, method: str, path: str, body: Dict[str, Any]) -> Optional[Tuple[str, bytes]]:
+        """A complete response as (content type, body), or None to stream `events` instead."""
+        return None
+
+    def add_batch(self, requests: List[Dict[str, Any]]) -> str:
+        batch_id = f"batch_{len(self.batches) + 1}"
+        self.batches[batch_id] = (time.monotonic() + self.batch_delay, requests)
+        return batch_id
+
+    def batch_ended(self, batch_id: str) -> bool:
+        return batch_id in self.cancelled or time.monotonic() >= self.batches[batch_id][0]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                method, target, _ = request_line.decode().split(" ", 2)
+                response = self.respond(method, target.partition("?")[0], json.loads(body) if body else {})
+                if response is not None:
+                    content_type, content = response
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\n"
+                        b"Content-Type: %s\r\n"
+                        b"Content-Length: %d\r\n"
+                        b"Connection: keep-alive\r\n\r\n%s" % (content_type.encode(), len(content), content)
+                    )
+                    await writer.drain()
+                    continue
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/event-stream\r\n"
+                    b"Transfer-Encoding: chunked\r\n"
+                    b"Connection: keep-alive\r\n\r\n"
+                )
+                delay = 1 / self.script.tokens_per_second if self.script.tokens_per_second else None
+                for event in self.events(json.loads(body) if body else {}):
+                    if delay is not None:
+                        await asyncio.sleep(delay)
+                    writer.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+class AnthropicStubServer(StubServer):
+    """Serves `POST /v1/messages` with `stream: true` as the Messages API's server-sent events, and the
+    Message Batches API under `/v1/messages/batches`."""
+
+    def respond(self, method: str, path: str, body: Dict[str, Any]) -> Optional[Tuple[str, bytes]]:
+        if not path.startswith("/v1/messages/batches"):
+            return None
+        parts = path.removeprefix("/v1/messages/batches").strip("/").split("/")
+        if method == "POST" and parts == [""]:
+            return _json(self._batch(self.add_batch(body["requests"])))
+        batch_id = parts[0]
+        if method == "POST" and parts[1:] == ["cancel"]:
+            self.cancelled.add(batch_id)
+        elif method == "GET" and parts[1:] == ["results"]:
+            lines = [json.dumps(self._result(batch_id, request)) for request in self.batches[batch_id][1]]
+            return "application/binary", "\n".join(lines).encode()
+        return _json(self._batch(batch_id))
+
+    def message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The complete message the events of a streamed response add up to."""
+        script = self.script
+        content: List[Dict[str, Any]] = []
+        if script.text_chunks:
+            content.append({"type": "text", "text": script.chunk_text * script.text_chunks})
+        tool_round = _anthropic_tool_rounds(body.get("messages", []))
+        if tool_round < script.tool_rounds:
+            for call_id in script.tool_call_ids(tool_round):
+                content.append({"type": "tool_use", "id": call_id, "name": script.tool_name, "input": script.tool_args})
+        return {
+            "id": f"msg_{self.requests}", "type": "message", "role": "assistant", "model": body.get("model", ""),
+            "content": content, "stop_reason": "tool_use" if tool_round < script.tool_rounds else "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": _estimate_input_tokens(body), "output_tokens": script.text_chunks},
+        }
+
+    def _batch(self, batch_id: str) -> Dict[str, Any]:
+        ended = self.batch_ended(batch_id)
+        requests = len(self.batches[batch_id][1])
+        cancelled = requests if batch_id in self.cancelled else 0
+        return {
+            "id": batch_id, "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else requests, "succeeded": requests - cancelled if ended else 0,
+                "errored": 0, "canceled": cancelled, "expired": 0,
+            },
+            "created_at": "2025-01-01T00:00:00Z", "expires_at": "2025-01-02T00:00:00Z",
+            "ended_at": "2025-01-01T00:00:00Z" if ended else None,
+            "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _result(self, batch_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        if batch_id in self.cancelled:
+            return {"custom_id": request["custom_id"], "result": {"type": "canceled"}}
+        message = self.message(request["params"])
+        return {"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": message}}
+
+    def events(self, body: Dict[str, Any]) -> Iterator[bytes]:
+        script = self.script
+        yield _sse("message_start", {
+            "type": "message_start",
+            "message": {
+                "id": f"msg_{self.requests}", "type": "message", "role": "assistant", "model": body.get("model", ""),
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": _estimate_input_tokens(body), "output_tokens": 1},
+            },
+        })
+        index = 0
+        if script.text_chunks:
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index, "content_block": {"type": "text", "text": ""}})
+            for _ in range(script.text_chunks):
+                yield _sse("content_block_delta", {"type": "content_block_delta", "index": index, "delta": {"type": "text_delta", "text": script.chunk_text}})
+            yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+            index += 1
+
+        tool_round = _anthropic_tool_rounds(body.get("messages", []))
+        stop_reason = "end_turn"
+        if tool_round < script.tool_rounds:
+            stop_reason = "tool_use"
+            for call_id in script.tool_call_ids(tool_round):
+                yield _sse("content_block_start", {
+                    "type": "content_block_start", "index": index,
+                    "content_block": {"type": "tool_use", "id": call_id, "name": script.tool_name, "input": {}},
+                })
+                yield _sse("content_block_delta", {
+                    "type": "content_block_delta", "index": index,
+                    "delta": {"type": "input_json_delta", "partial_json": json.dumps(script.tool_args)},
+                })
+                yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+                index += 1
+
+        yield _sse("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": script.text_chunks},
+        })
+        yield _sse("message_stop", {"type": "message_stop"})
+
+
+class GeminiStubServer(StubServer):
+    """Serves `POST /v1beta/models/{model}:streamGenerateContent?alt=sse` as server-sent response chunks, and
+    batch mode with inlined requests under `/v1beta/models/{model}:batchGenerateContent` and `/v1beta/batches`."""
+
+    def respond(self, method: str, path: str, body: Dict[str, Any]) -> Optional[Tuple[str, bytes]]:
+        if path.endswith(":batchGenerateContent"):
+            requests = body["batch"]["inputConfig"]["requests"]["requests"]
+            return _json(self._batch(self.add_batch(requests)))
+        if not path.startswith("/v1beta/batches/"):
+            return None
+        batch_id, _, action = path.removeprefix("/v1beta/batches/").partition(":")
+        if method == "POST" and action == "cancel":
+            self.cancelled.add(batch_id)
+            return _json({})
+        return _json(self._batch(batch_id))
+
+    def response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The complete response the chunks of a streamed response add up to."""
+        script = self.script
+        parts: List[Dict[str, Any]] = []
+        if script.text_chunks:
+            parts.append({"text": script.chunk_text * script.text_chunks})
+        tool_round = _gemini_tool_rounds(body.get("contents", []))
+        if tool_round < script.tool_rounds:
+            parts.extend(
+                {"functionCall": {"id": call_id, "name": script.tool_name, "args": script.tool_args}}
+                for call_id in script.tool_call_ids(tool_round)
+            )
+        return {
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": _estimate_input_tokens(body),
+                "candidatesTokenCount": script.text_chunks,
+                "totalTokenCount": _estimate_input_tokens(body) + script.text_chunks,
+            },
+        }
+
+    def _batch(self, batch_id: str) -> Dict[str, Any]:
+        ended = self.batch_ended(batch_id)
+        metadata: Dict[str, Any] = {"@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch"}
+        if batch_id in self.cancelled:
+            metadata["state"] = "BATCH_STATE_CANCELLED"
+        elif not ended:
+            metadata["state"] = "BATCH_STATE_RUNNING"
+        else:
+            metadata["state"] = "BATCH_STATE_SUCCEEDED"
+            metadata["output"] = {"inlinedResponses": {"inlinedResponses": [
+                {"response": self.response(request["request"]), "metadata": request.get("metadata")}
+                for request in self.batches[batch_id][1]
+            ]}}
+        return {"name": f"batches/{batch_id}", "metadata": metadata, "done": ended}
+
+    def events(self, body: Dict[str, Any]) -> Iterator[bytes]:
+        script = self.script
+        for _ in range(script.text_chunks):
+            yield _sse(None, {"candidates": [{"content": {"role": "model", "parts": [{"text": script.chunk_text}]}, "index": 0}]})
+
+        tool_round = _gemini_tool_rounds(body.get("contents", []))
+        if tool_round < script.tool_rounds:
+            parts = [
+                {"functionCall": {"id": call_id, "name": script.tool_name, "args": script.tool_args}}
+                for call_id in script.tool_call_ids(tool_round)
+            ]
+            yield _sse(None, {"candidates": [{"content": {"role": "model", "parts": parts}, "index": 0}]})
+
+        yield _sse(None, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": ""}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {
+                "promptTokenCount": _estimate_input_tokens(body),
+                "candidatesTokenCount": script.text_chunks,
+                "totalTokenCount": _estimate_input_tokens(body) + script.text_chunks,
+            },
+        })
+
+
+def _json(data: Dict[str, Any]) -> Tuple[str, bytes]:
+    return "application/json", json.dumps(data).encode()
+
+
+def _sse(event: Optional[str], data: Dict[str, Any]) -> bytes:
+    prefix = f"event: {event}\n" if event is not None else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode()
+
+
+def _estimate_input_tokens(body: Dict[str, Any]) -> int:
+    return len(json.dumps(body)) // 4
+
+
+def _anthropic_tool_rounds(messages: List[Dict[str, Any]]) -> int:
+    rounds = 0
+    for message in reversed(messages):
+        content = message.get("content")
+        blocks = content if isinstance(content, list) else [{"type": "text"}]
+        if message.get("role") == "user" and any(b.get("type") == "text" for b in blocks):
+            break
+        if any(b.get("type") == "tool_use" for b in blocks):
+            rounds += 1
+    return rounds
+
+
+def _gemini_tool_rounds(contents: List[Dict[str, Any]]) -> int:
+    rounds = 0
+    for content in reversed(contents):
+        parts = content.get("parts") or []
+        if content.get("role") == "user" and any(p.get("text") for p in parts):
+            break
+        if any(p.get("functionCall") or p.get("function_call") for p in parts):
+            rounds += 1
+    return rounds
@@ -0,0 +1,502 @@
+"""Benchmark suite for agent loop overhead, history handling, tool execution and the provider adapters.
+
+Everything runs locally against deterministic fakes (`fakes.py`) and stub HTTP servers
+(`stub_servers.py`), so results are comparable between runs on the same machine. Results are written
+as JSON; pass an earlier result file to `--compare` to print the change in every metric.
+
+    uv run python benchmarks/suite.py
+    uv run python benchmarks/suite.py --quick --only loop_overhead,tool_fanout
+    uv run python benchmarks/suite.py --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+from import_time import STATEMENTS, measure_import
+from stub_servers import AnthropicStubServer, GeminiStubServer
+
+from ame.core.agent_with_tools import AgentWithToolsConfig
+from ame.core.branching import run_branches
+from ame.core.bulk_runner import BulkRunner
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.context import MessageCountContextManager, TokenBudgetContextManager
+from ame.core.session_store import PersistentContextManager, SessionStore
+from ame.core.tools import ToolCall
+from ame.llms.anthropic.utils import chat_message_to_anthropic_messages, chat_messages_to_anthropic_system_and_messages
+from ame.llms.clients import aclose_clients
+from ame.llms.gemini.utils import chat_message_to_gemini_contents, chat_messages_to_gemini_system_and_contents
+from ame.llms.history import ConvertedHistory
+
+# benchmark -> case -> metric -> value
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+async def _drain(agent: BenchAgent, text: str = "go") -> int:
+    chunks = 0
+    async for chunk in agent.astream(_user(text)):
+        if isinstance(chunk, str):
+            chunks += 1
+    return chunks
+
+
+def _turn_messages(turn: int) -> List[ChatMessage]:
+    """A question, a batch of two tool calls and an answer."""
+    return [
+        _user(f"question {turn} " * 20),
+        ChatMessage(role=ChatRole.ASSISTANT, content=[
+            ToolCall(id=f"call_{turn}_{i}", name="search", args={"query": f"q{turn}", "page": i}, response="result " * 50)
+            for i in range(2)
+        ]),
+        ChatMessage(role=ChatRole.ASSISTANT, content=f"answer {turn} " * 40),
+    ]
+
+
+async def loop_overhead(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Time per text chunk through the agent loop, against iterating the same fake stream directly."""
+    results = {}
+    for chunks in [1_000, 10_000] if quick else [1_000, 10_000, 100_000]:
+        llm = ScriptedLLM(ResponseScript(text_chunks=chunks))
+        start = time.perf_counter()
+        async for _ in llm.astream([_user("go")], []):
+            pass
+        raw = (time.perf_counter() - start) / chunks
+
+        agent = BenchAgent(llm, "bench")
+        start = time.perf_counter()
+        await _drain(agent)
+        through_agent = (time.perf_counter() - start) / chunks
+        results[f"chunks={chunks}"] = {
+            "raw_stream_ns_per_chunk": raw * 1e9,
+            "agent_ns_per_chunk": through_agent * 1e9,
+            "overhead_ns_per_chunk": (through_agent - raw) * 1e9,
+        }
+    return results
+
+
+async def history_conversion(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Average time to convert the history for one request, as a session grows by one turn per request."""
+    anthropic_history = ConvertedHistory(chat_message_to_anthropic_messages)
+    gemini_history = ConvertedHistory(chat_message_to_gemini_contents)
+    converters: Dict[str, Callable[[List[ChatMessage]], object]] = {
+        "anthropic_cached_us": lambda m: chat_messages_to_anthropic_system_and_messages(m, anthropic_history),
+        "anthropic_uncached_us": chat_messages_to_anthropic_system_and_messages,
+        "gemini_cached_us": lambda m: chat_messages_to_gemini_system_and_contents(m, gemini_history),
+        "gemini_uncached_us": chat_messages_to_gemini_system_and_contents,
+    }
+    results = {}
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="You are a helpful assistant.")]
+    turn = 0
+    for checkpoint in [100, 400] if quick else [100, 400, 1600]:
+        totals = {name: 0.0 for name in converters}
+        turns = 0
+        while len(messages) < checkpoint:
+            messages.extend(_turn_messages(turn))
+            turn += 1
+            turns += 1
+            for name, convert in converters.items():
+                start = time.perf_counter()
+                convert(messages)
+                totals[name] += time.perf_counter() - start
+        results[f"messages={checkpoint}"] = {name: total / turns * 1e6 for name, total in totals.items()}
+    return results
+
+
+async def tool_fanout(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Tool calls completed per second when one response makes many calls at once."""
+    tools = {
+        "noop": {},
+        "sleep": {"seconds": 0.005},
+        "block": {"seconds": 0.005},
+    }
+    results = {}
+    for name, args in tools.items():
+        for calls in [1, 10, 100]:
+            rounds = 2 if quick else 5
+            script = ResponseScript(
+                text_chunks=1, tool_rounds=rounds, tool_calls_per_round=calls, tool_name=name, tool_args=args
+            )
+            agent = BenchAgent(ScriptedLLM(script), "bench", AgentWithToolsConfig(max_message_history=10_000))
+            start = time.perf_counter()
+            await _drain(agent)
+            elapsed = time.perf_counter() - start
+            results[f"tool={name},calls={calls}"] = {
+                "calls_per_second": rounds * calls / elapsed,
+                "ms_per_round": elapsed / rounds * 1e3,
+            }
+    return results
+
+
+async def trimming(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Time to add a message to a history that is at its limit, so every add trims."""
+    results = {}
+    for limit in [100, 1_000] if quick else [100, 1_000, 10_000]:
+        managers = {
+            "message_count": MessageCountContextManager(limit),
+            # About `limit` messages of the sizes added below
+            "token_budget": TokenBudgetContextManager(limit * 90),
+        }
+        for name, manager in managers.items():
+            messages = [ChatMessage(role=ChatRole.SYSTEM, content="You are a helpful assistant.")]
+            # Fill past the limit first
+            for turn in range(2 * limit):
+                await manager.add(messages, _user(f"question {turn} " * 20))
+            adds = 2_000
+            start = time.perf_counter()
+            for i in range(adds):
+                if i % 2:
+                    await manager.add(messages, ChatMessage(role=ChatRole.ASSISTANT, content=f"answer {i} " * 40))
+                else:
+                    await manager.add(messages, _user(f"question {i} " * 20))
+            results[f"manager={name},limit={limit}"] = {
+                "us_per_add": (time.perf_counter() - start) / adds * 1e6,
+                "messages_kept": float(len(messages)),
+            }
+    return results
+
+
+async def memory_per_session(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Memory held per agent after turns with tool calls, measured with tracemalloc."""
+    results = {}
+    sessions = 100 if quick else 500
+    for turns in [1, 10]:
+        script = ResponseScript(text_chunks=20, tool_rounds=2, tool_calls_per_round=2)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        agents = [BenchAgent(ScriptedLLM(script), "bench") for _ in range(sessions)]
+        for agent in agents:
+            for turn in range(turns):
+                await _drain(agent, f"question {turn}")
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        results[f"turns={turns}"] = {"kib_per_session": allocated / sessions / 1024}
+        del agents
+    return results
+
+
+async def message_overhead(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Memory of 1k-message sessions built by the agent loop, and loop time per step, with tiny contents.
+
+    Contents are shared or short strings, so this measures the messages and tool calls themselves.
+    """
+    # Each turn is a user message, three steps of a text reply and two tool calls, and a final reply
+    script = ResponseScript(text_chunks=1, tool_rounds=3, tool_calls_per_round=2)
+    turns = 125
+    sessions = 5 if quick else 20
+
+    async def build(config: AgentWithToolsConfig) -> BenchAgent:
+        agent = BenchAgent(ScriptedLLM(script), "bench", config)
+        for turn in range(turns):
+            await _drain(agent, f"question {turn}")
+        return agent
+
+    config = AgentWithToolsConfig(max_message_history=10_000)
+    gc.collect()
+    start = time.perf_counter()
+    agents = [await build(config) for _ in range(sessions)]
+    elapsed = time.perf_counter() - start
+    steps = sessions * turns * (script.tool_rounds + 1)
+    messages = len(agents[0]._messages)
+    del agents
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    agents = [await build(config) for _ in range(sessions)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {f"messages={messages}": {
+        "us_per_step": elapsed / steps * 1e6,
+        "kib_per_session": allocated / sessions / 1024,
+    }}
+
+
+async def forking(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Cost of forking an agent into branches, and the memory each branch holds after a turn of its own."""
+    results = {}
+    branches = 20 if quick else 100
+    script = ResponseScript(text_chunks=20, tool_rounds=1, tool_calls_per_round=2)
+    for turns in [10, 100] if quick else [10, 100, 1_000]:
+        agent = BenchAgent(ScriptedLLM(script), "bench", AgentWithToolsConfig(max_message_history=1_000_000))
+        for turn in range(turns):
+            for message in _turn_messages(turn):
+                await agent._context.add(agent._messages, message)
+        start = time.perf_counter()
+        agent.fork(branches)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        forks = agent.fork(branches)
+        await run_branches(forks, _user("continue"))
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        results[f"history={len(agent._messages)}"] = {
+            "us_per_fork": elapsed / branches * 1e6,
+            "kib_per_branch": allocated / branches / 1024,
+        }
+        del forks
+    return results
+
+
+async def end_to_end(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Full turns through the real adapters, SDKs and HTTP clients against local stub servers."""
+    from ame.llms import AnthropicLLM, GeminiLLM
+
+    # The stub servers don't check keys, but the adapters require one
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    results = {}
+    turns = 5 if quick else 20
+    script = ResponseScript(text_chunks=100, tool_rounds=2, tool_calls_per_round=2)
+    for name, server, llm_class in [
+        ("anthropic", AnthropicStubServer(script), AnthropicLLM),
+        ("gemini", GeminiStubServer(script), GeminiLLM),
+    ]:
+        async with server:
+            agent = BenchAgent(llm_class(base_url=server.base_url), "bench")
+            # Warm up the connection pool
+            await _drain(agent)
+            start = time.perf_counter()
+            chunks = 0
+            for turn in range(turns):
+                chunks += await _drain(agent, f"question {turn}")
+            elapsed = time.perf_counter() - start
+            results[f"provider={name}"] = {
+                "us_per_chunk": elapsed / chunks * 1e6,
+                "ms_per_request": elapsed / (turns * (script.tool_rounds + 1)) * 1e3,
+            }
+        await aclose_clients()
+    return results
+
+
+async def interrupt(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Barge-in through the real adapters: time for an interrupted turn to end, and to the next turn's first chunk."""
+    from ame.llms import AnthropicLLM, GeminiLLM
+
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    results = {}
+    turns = 5 if quick else 20
+    # A long, slow response, interrupted a few chunks in
+    script = ResponseScript(text_chunks=1000, tokens_per_second=200)
+    for name, server, llm_class in [
+        ("anthropic", AnthropicStubServer(script), AnthropicLLM),
+        ("gemini", GeminiStubServer(script), GeminiLLM),
+    ]:
+        async with server:
+            agent = BenchAgent(llm_class(base_url=server.base_url), "bench")
+            to_stop = 0.0
+            to_next = 0.0
+            for turn in range(turns):
+                started = asyncio.Event()
+
+                async def speak() -> None:
+                    chunks = 0
+                    async for _ in agent.astream(_user(f"question {turn}")):
+                        chunks += 1
+                        if chunks == 5:
+                            started.set()
+
+                speaking = asyncio.create_task(speak())
+                await started.wait()
+                start = time.perf_counter()
+                agent.interrupt()
+                await speaking
+                to_stop += time.perf_counter() - start
+                start = time.perf_counter()
+                stream = agent.astream(_user("stop"))
+                await anext(stream)
+                to_next += time.perf_counter() - start
+                agent.interrupt()
+                await stream.aclose()
+            results[f"provider={name}"] = {
+                "ms_to_stop": to_stop / turns * 1e3,
+                "ms_to_next_first_chunk": to_next / turns * 1e3,
+            }
+        await aclose_clients()
+    return results
+
+
+async def bulk(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Many agents' turns through the real adapters, streamed concurrently or sent as rounds of batches.
+
+    Stub batches end as soon as they are submitted, so the batch cases measure local overhead and HTTP
+    round trips, not the provider's processing time.
+    """
+    from ame.llms import AnthropicLLM, GeminiLLM
+    from ame.llms.anthropic.batch import AnthropicBatchBackend
+    from ame.llms.gemini.batch import GeminiBatchBackend
+
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    results = {}
+    agents = 20 if quick else 100
+    script = ResponseScript(text_chunks=100, tool_rounds=2, tool_calls_per_round=2)
+    llm_requests = agents * (script.tool_rounds + 1)
+    for name, server, llm_class, backend_class in [
+        ("anthropic", AnthropicStubServer(script), AnthropicLLM, AnthropicBatchBackend),
+        ("gemini", GeminiStubServer(script), GeminiLLM, GeminiBatchBackend),
+    ]:
+        async with server:
+            llm = llm_class(base_url=server.base_url)
+            http_requests = server.requests
+            start = time.perf_counter()
+            await asyncio.gather(*(_drain(BenchAgent(llm, "bench"), f"question {i}") for i in range(agents)))
+            elapsed = time.perf_counter() - start
+            results[f"provider={name},mode=stream"] = {
+                "us_per_llm_request": elapsed / llm_requests * 1e6,
+                "http_requests_per_llm_request": (server.requests - http_requests) / llm_requests,
+            }
+
+            runner = BulkRunner(backend_class(llm, poll_interval=0.001))
+            http_requests = server.requests
+            start = time.perf_counter()
+            await runner.run((BenchAgent(runner.llm, "bench"), _user(f"question {i}")) for i in range(agents))
+            elapsed = time.perf_counter() - start
+            results[f"provider={name},mode=batch"] = {
+                "us_per_llm_request": elapsed / llm_requests * 1e6,
+                "http_requests_per_llm_request": (server.requests - http_requests) / llm_requests,
+                "batches": runner.stats().batches,
+            }
+        await aclose_clients()
+    return results
+
+
+async def session_resume(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Cost of logging each message of a session, and of resuming it from its log."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionStore(directory)
+        for turns in [100, 1_000] if quick else [100, 1_000, 10_000]:
+            log = store.open(f"turns-{turns}")
+            context = PersistentContextManager(log, MessageCountContextManager(200))
+            messages = [ChatMessage(role=ChatRole.SYSTEM, content="You are a helpful assistant.")]
+            appended = 0
+            start = time.perf_counter()
+            for turn in range(turns):
+                for message in _turn_messages(turn):
+                    await context.add(messages, message)
+                    appended += 1
+            logging = (time.perf_counter() - start) / appended
+            log.close()
+
+            # Writing the session leaves a lot of garbage; don't time its collection as part of the resume
+            gc.collect()
+            resumes = []
+            for _ in range(3):
+                start = time.perf_counter()
+                loaded = store.open(f"turns-{turns}").load()
+                resumes.append(time.perf_counter() - start)
+            results[f"turns={turns}"] = {
+                "us_per_logged_message": logging * 1e6,
+                "resume_ms": min(resumes) * 1e3,
+                "messages_resumed": float(len(loaded)),
+                "log_kib": os.path.getsize(log.path) / 1024,
+            }
+    return results
+
+
+async def import_time(quick: bool) -> Dict[str, Dict[str, float]]:
+    """Cold import cost of the package and of each provider adapter, in fresh interpreters."""
+    runs = 3 if quick else 10
+    return {f"import={name}": measure_import(statement, runs) for name, statement in STATEMENTS.items()}
+
+
+BENCHMARKS: Dict[str, Callable[[bool], Awaitable[Dict[str, Dict[str, float]]]]] = {
+    "loop_overhead": loop_overhead,
+    "history_conversion": history_conversion,
+    "tool_fanout": tool_fanout,
+    "trimming": trimming,
+    "memory_per_session": memory_per_session,
+    "message_overhead": message_overhead,
+    "forking": forking,
+    "end_to_end": end_to_end,
+    "interrupt": interrupt,
+    "bulk": bulk,
+    "session_resume": session_resume,
+    "import_time": import_time,
+}
+
+
+def _metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+
+def _print_results(results: Results, baseline: Results) -> None:
+    for benchmark, cases in results.items():
+        print(f"\n{benchmark}")
+        for case, metrics in cases.items():
+            for metric, value in metrics.items():
+                line = f"  {case:<32} {metric:<26} {value:>14,.2f}"
+                previous = baseline.get(benchmark, {}).get(case, {}).get(metric)
+                if previous:
+                    line += f" {(value - previous) / previous:>+9.1%}"
+                print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help="Comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes, for a fast sanity check")
+    parser.add_argument("--output", type=Path, help="Result file. Defaults to benchmarks/results/<timestamp>.json")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results: Results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = await BENCHMARKS[name](args.quick)
+
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else {}
+    _print_results(results, baseline)
+
+    metadata = _metadata()
+    output = args.output
+    if output is None:
+        output = Path(__file__).parent / "results" / f"{metadata['timestamp'].replace(':', '-')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"metadata": {**metadata, "quick": args.quick}, "results": results}, indent=2))
+    print(f"\nSaved {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,89 +1,614 @@
-from typing import AsyncGenerator, List, Optional
+from enum import Enum
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Self, Set
 import asyncio
+import contextlib
+import copy
 import inspect
+import time
+import weakref
 
 from pydantic import BaseModel, create_model
-from ame.core.chat_context import ChatMessage, ChatRole
-from ame.core.tools import Tool, ToolCall
+from ame.core.branching import ForkedHistory
+from ame.core.chat_context import ChatHistory, ChatMessage, ChatRole
+from ame.core.context import (
+    ContextManager,
+    MessageCountContextManager,
+    TokenBudgetContextManager,
+    drop_oldest_turns,
+)
+from ame.core.tool_cache import ToolCacheStats, ToolResultCache, process_tool_cache
+from ame.core.streaming import CoalesceOptions, coalesce_text
+from ame.core.tool_execution import ToolTimeoutError, run_tool
+from ame.core.tool_output import (
+    HANDLE_METADATA_KEY,
+    ToolOutputStore,
+    default_tool_output_store,
+    expire_tool_outputs,
+    truncate_output,
+)
+from ame.core.tools import InterruptPolicy, Tool, ToolCacheScope, ToolCall, ToolOptions, ToolOutputOptions, tool
+from ame.core.tracing import (
+    AGENT_STEP,
+    AGENT_TURN,
+    LLM_INTER_TOKEN_GAP,
+    LLM_REQUEST,
+    LLM_TIME_TO_FIRST_TOKEN,
+    Span,
+    Tracer,
+    get_tracer,
+)
 from ame.llms.llm import LLM
 
 _IS_TOOL = "is_tool"
+_READ_TOOL_OUTPUT = "read_tool_output"
+# Characters returned by one read_tool_output call when the LLM doesn't ask for fewer
+_MAX_READ_LENGTH = 8000
+# Responses recorded for tool calls a turn was interrupted before they finished
+_CANCELLED_RESPONSE = "[Interrupted: the tool call was cancelled before it finished]"
+_DETACHED_RESPONSE = "[Interrupted: the tool call is still running in the background, and its result won't be reported]"
 
 
 class AgentWithToolsConfig(BaseModel):
+    # History limits used when no context manager is given: a token budget if `max_context_tokens`
+    # is set, otherwise a message count.
     max_message_history: int = 50
+    max_context_tokens: Optional[int] = None
+    # Start executing each tool call as soon as the LLM finishes streaming it, instead of
+    # waiting for the whole response. Results are still yielded and recorded in call order.
+    pipeline_tool_calls: bool = False
+    # Tool calls this agent may run at once. Per-tool and process-wide limits apply on top of this.
+    max_concurrent_tool_calls: Optional[int] = None
+    # Budgets for a single `astream` call. A step is one LLM response plus the tool calls it makes;
+    # tokens are the output tokens of the LLM's text, as its `token_counter` counts them; duration is
+    # in seconds. Budgets are checked before each step, so a step that has started always finishes.
+    max_steps: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_duration: Optional[float] = None
+    # Where tools with `ToolOutputOptions.spill` save full outputs. Defaults to a temporary directory
+    # shared by the process and removed when it exits.
+    tool_output_dir: Optional[str] = None
+    # Before each LLM request, drop the oldest turns if the request wouldn't leave `reserve_output_tokens`
+    # of the LLM's context window for the reply, counting tokens locally. Requests that don't fit at
+    # all fail with `ContextWindowExceeded` before they are sent.
+    fit_context_window: bool = True
+    reserve_output_tokens: int = 4096
+    # Tool results over this many tokens, by the LLM's token counter, are replaced with an error for the
+    # LLM instead of being sent. Defaults to half the LLM's context window, when it is known.
+    max_tool_result_tokens: Optional[int] = None
+
+
+class StopReason(Enum):
+    # The LLM answered without calling tools
+    COMPLETED = "COMPLETED"
+    MAX_STEPS = "MAX_STEPS"
+    MAX_TOKENS = "MAX_TOKENS"
+    MAX_DURATION = "MAX_DURATION"
+    # Stopped by `AgentWithTools.interrupt`
+    INTERRUPTED = "INTERRUPTED"
 
 
 class AgentWithTools:
-    def __init__(self, llm: LLM, instructions: str, config: AgentWithToolsConfig = AgentWithToolsConfig()) -> None:
+    # Tools declared with @tool on this class and its bases, by name. Built once per class when the
+    # subclass is defined, and shared by all of its instances.
+    _tool_registry: Dict[str, Tool] = {}
+    # Tool name -> `ToolOutputOptions.keep_turns`, for the tools that set it
+    _tool_output_keep_turns: Dict[str, int] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        functions: Dict[str, Callable] = {}
+        for klass in reversed(cls.__mro__):
+            for attr_name, attr in vars(klass).items():
+                if callable(attr) and hasattr(attr, _IS_TOOL):
+                    functions[attr_name] = attr
+                elif attr_name in functions:
+                    # Overridden without @tool
+                    del functions[attr_name]
+        tools = [_build_tool(functions[attr_name]) for attr_name in sorted(functions)]
+        if not any(t.options.output is not None and t.options.output.spill for t in tools):
+            # Only offered to the LLM when there can be outputs to read
+            tools = [t for t in tools if t.name != _READ_TOOL_OUTPUT]
+        cls._tool_registry = {t.name: t for t in tools}
+        cls._tool_output_keep_turns = {
+            t.name: t.options.output.keep_turns
+            for t in tools
+            if t.options.output is not None and t.options.output.keep_turns is not None
+        }
+
+    def __init__(
+        self,
+        llm: LLM,
+        instructions: str,
+        config: AgentWithToolsConfig = AgentWithToolsConfig(),
+        context_manager: Optional[ContextManager] = None,
+    ) -> None:
         self._llm = llm
-        self._messages: List[ChatMessage] = [ChatMessage(role=ChatRole.SYSTEM, content=instructions)]
+        self._messages: List[ChatMessage] = ChatHistory([ChatMessage(role=ChatRole.SYSTEM, content=instructions)])
         self._config = config
-        self._tools = self._get_tools_from_decorated_methods()
+        if context_manager is None:
+            if config.max_context_tokens is not None:
+                context_manager = TokenBudgetContextManager(config.max_context_tokens, count=llm.token_counter.count_message)
+            else:
+                context_manager = MessageCountContextManager(config.max_message_history)
+        self._context = context_manager
+        self._tools = list(self._tool_registry.values())
         self._thinking = False
+        # The turn `astream` is running, until it has ended
+        self._turn: Optional[_Turn] = None
+        self.stop_reason: Optional[StopReason] = None
+        # Tool calls left running by interrupted turns, referenced until they finish
+        self._detached_tool_tasks: Set[asyncio.Task[str]] = set()
+        # Caches of tools memoized per agent, by tool name
+        self._tool_caches: Dict[str, ToolResultCache] = {}
+        # Semaphores capping this agent's tool calls, one per event loop, as they bind to the loop they are
+        # first contended on
+        self._tool_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._tool_outputs = ToolOutputStore(config.tool_output_dir) if config.tool_output_dir else None
+        self._max_tool_result_tokens = config.max_tool_result_tokens
+        if self._max_tool_result_tokens is None and llm.context_window is not None:
+            self._max_tool_result_tokens = llm.context_window // 2
+        # The agent this one was forked from, and whether the system message is shared with other forks
+        self._fork_parent: Optional[AgentWithTools] = None
+        self._system_shared = False
+
+    def astream(
+        self,
+        chat_message: Optional[ChatMessage] = None,
+        coalesce: CoalesceOptions | bool | None = None,
+    ) -> AsyncGenerator[str | ToolCall]:
+        """Run LLM steps until the LLM stops calling tools, a budget in the config runs out or the turn is interrupted.
 
-    async def astream(self, chat_message: Optional[ChatMessage] = None) -> AsyncGenerator[str | ToolCall]:
+        Each step streams one LLM response and runs the tool calls it made. Why the run ended is
+        available as `stop_reason` afterwards. With `coalesce`, text is yielded in fewer, larger chunks
+        instead of one chunk per provider delta; True uses the default `CoalesceOptions`.
+
+        Stopping iteration early and closing the generator ends the turn as `interrupt` does.
+        """
+        turn = _Turn()
+        generator = self._run_turn(turn, chat_message, coalesce)
+        turn.generator = weakref.ref(generator)
+        return generator
+
+    async def _run_turn(
+        self,
+        turn: "_Turn",
+        chat_message: Optional[ChatMessage],
+        coalesce: CoalesceOptions | bool | None,
+    ) -> AsyncGenerator[str | ToolCall]:
+        previous = self._turn
+        if previous is not None:
+            # A turn whose generator was dropped without being closed is being closed by the event loop
+            if not previous.interrupted and previous.generator() is not None:
+                raise RuntimeError("The agent is already running a turn; interrupt it before starting another")
+            await previous.finish()
+        self._turn = turn
+        if coalesce is True:
+            coalesce = CoalesceOptions()
         self._thinking = True
+        self.stop_reason = None
+        config = self._config
+        deadline = time.monotonic() + config.max_duration if config.max_duration is not None else None
+        steps = 0
+        tokens = 0
+        tracer = get_tracer()
+        traced = tracer.enabled
+        turn_span = tracer.start_span(AGENT_TURN, {"agent": type(self).__name__})
+        step_span: Optional[Span] = None
 
-        if chat_message:
-            self._messages.append(chat_message)
-            if len(self._messages) > self._config.max_message_history:
-                # Always preserve the system message (first message) when trimming
-                system_message = next((m for m in self._messages if m.role == ChatRole.SYSTEM), None)
-                non_system_messages = [m for m in self._messages if m.role != ChatRole.SYSTEM]
-                # Keep system message + last (max_message_history - 1) non-system messages
-                self._messages = ([system_message] if system_message else []) + non_system_messages[-(self._config.max_message_history - 1):]
+        try:
+            if chat_message:
+                await self._context.add(self._messages, chat_message)
+                if self._tool_output_keep_turns:
+                    for index, previous in expire_tool_outputs(
+                        self._messages, self._tool_output_keep_turns, self._llm.token_counter
+                    ):
+                        self._context.replaced(self._messages, index, previous)
 
-        response = ""
-        tool_calls: List[ToolCall] = []
+            while True:
+                if turn.interrupted:
+                    self.stop_reason = StopReason.INTERRUPTED
+                    break
+                if config.max_steps is not None and steps >= config.max_steps:
+                    self.stop_reason = StopReason.MAX_STEPS
+                    break
+                if config.max_tokens is not None and tokens >= config.max_tokens:
+                    self.stop_reason = StopReason.MAX_TOKENS
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.stop_reason = StopReason.MAX_DURATION
+                    break
+                steps += 1
+                step_span = tracer.start_span(AGENT_STEP, {"step": steps}, turn_span)
 
-        stream = self._llm.astream(messages=self._messages, tools=self._tools)
-        async for chunk in stream:
-            if isinstance(chunk, ToolCall):
-                tool_calls.append(chunk)
-            else:
-                response += chunk
-                yield chunk
+                parts: List[str] = []
+                tool_calls: List[ToolCall] = []
+                tool_tasks: List[asyncio.Task[str]] = []
+
+                request_span = tracer.start_span(LLM_REQUEST, {"llm": type(self._llm).__name__}, step_span)
+                if config.fit_context_window and self._llm.context_window is not None:
+                    self._fit_context_window()
+                stream = self._llm.astream(messages=self._messages, tools=self._tools)
+                if traced:
+                    # Timed before coalescing, which would otherwise make its flushes look like provider latency
+                    stream = _timed_stream(stream, tracer)
+                if coalesce:
+                    stream = coalesce_text(stream, coalesce)
+                try:
+                    async with contextlib.aclosing(stream):
+                        # Set while waiting for the next chunk, the wait an interrupt cancels
+                        turn.task = asyncio.current_task()
+                        async for chunk in stream:
+                            turn.task = None
+                            if isinstance(chunk, ToolCall):
+                                tool_calls.append(chunk)
+                                if config.pipeline_tool_calls:
+                                    tool_tasks.append(
+                                        asyncio.create_task(self._execute_tool_call(tool_call=chunk, span=step_span))
+                                    )
+                            else:
+                                parts.append(chunk)
+                                yield chunk
+                                if turn.interrupted:
+                                    break
+                            turn.task = asyncio.current_task()
+                except GeneratorExit:
+                    # The consumer stopped reading, so keep what it received as if it had interrupted
+                    await self._end_interrupted_response(parts, tool_calls, tool_tasks)
+                    self.stop_reason = StopReason.INTERRUPTED
+                    raise
+                except BaseException as e:
+                    if not (isinstance(e, asyncio.CancelledError) and turn.absorb_cancellation()):
+                        self._settle_tool_calls(tool_calls, tool_tasks)
+                        raise
+                finally:
+                    turn.task = None
+                    request_span.end()
+
+                if turn.interrupted:
+                    await self._end_interrupted_response(parts, tool_calls, tool_tasks)
+                    self.stop_reason = StopReason.INTERRUPTED
+                    break
 
+                response = "".join(parts)
+                if response:
+                    await self._context.add(self._messages, ChatMessage(role=ChatRole.ASSISTANT, content=response))
+                tokens += self._llm.token_counter.count_text(response)
+
+                if not tool_calls:
+                    self.stop_reason = StopReason.COMPLETED
+                    break
+
+                step_span.set_attribute("tool_calls", len(tool_calls))
+                if not tool_tasks:
+                    tool_tasks = [
+                        asyncio.create_task(self._execute_tool_call(tool_call=tc, span=step_span)) for tc in tool_calls
+                    ]
+                try:
+                    await turn.wait(tool_tasks)
+                except BaseException:
+                    self._settle_tool_calls(tool_calls, tool_tasks)
+                    raise
+                failed = next((t for t in tool_tasks if t.done() and not t.cancelled() and t.exception()), None)
+                self._settle_tool_calls(tool_calls, tool_tasks)
+                if failed is not None and not turn.interrupted:
+                    raise failed.exception()
+                try:
+                    if not turn.interrupted:
+                        for tool_call in tool_calls:
+                            yield tool_call
+                            if turn.interrupted:
+                                break
+                finally:
+                    # Recorded even if the consumer stops reading, as the tools have run
+                    await self._context.add(self._messages, ChatMessage(role=ChatRole.ASSISTANT, content=tool_calls))
+                step_span.end()
+                step_span = None
+        finally:
+            self._thinking = False
+            if self._turn is turn:
+                self._turn = None
+            turn.done.set()
+            if step_span is not None:
+                step_span.end()
+            if self.stop_reason is not None:
+                turn_span.set_attribute("stop_reason", self.stop_reason.value)
+            turn_span.set_attribute("steps", steps)
+            turn_span.end()
+
+    def interrupt(self) -> bool:
+        """Stop the running turn as soon as possible, such as when the user starts talking over the agent.
+
+        A wait for the LLM or for tool calls is cancelled right away, and the LLM's response stream is
+        closed, releasing its connection. `astream` then ends with `stop_reason` INTERRUPTED once its
+        consumer asks for the next chunk. The text it yielded so far is recorded as the assistant's
+        message; text the LLM sent that wasn't yielded yet is dropped. Tool calls that had started are
+        recorded with their result if they finished, and otherwise cancelled or left running as their
+        tool's `on_interrupt` says, with a note in place of the result. Tool calls that hadn't started
+        are dropped. A new turn can be started right away: it first ends the interrupted one, without
+        waiting for its consumer.
+
+        Returns whether a turn was running. Call it from the event loop's thread, such as with
+        `loop.call_soon_threadsafe` from another thread.
+        """
+        turn = self._turn
+        if turn is None:
+            return False
+        turn.interrupt()
+        return True
+
+    async def _end_interrupted_response(
+        self, parts: List[str], tool_calls: List[ToolCall], tool_tasks: List[asyncio.Task[str]]
+    ) -> None:
+        response = "".join(parts)
         if response:
-            self._messages.append(ChatMessage(role=ChatRole.ASSISTANT, content=response))
+            await self._context.add(self._messages, ChatMessage(role=ChatRole.ASSISTANT, content=response))
+        if tool_tasks:
+            # Only pipelined calls have started, and each has a task
+            self._settle_tool_calls(tool_calls, tool_tasks)
+            await self._context.add(self._messages, ChatMessage(role=ChatRole.ASSISTANT, content=tool_calls))
 
-        if tool_calls:
-            tc_responses = await asyncio.gather(*[self._execute_tool_call(tool_call=tc) for tc in tool_calls])
-            for tool_call, tc_response in zip(tool_calls, tc_responses):
-                tool_call.response = tc_response
-                yield tool_call
-            tool_calls_message = ChatMessage(role=ChatRole.ASSISTANT, content=tool_calls)
+    def _settle_tool_calls(self, tool_calls: List[ToolCall], tool_tasks: List[asyncio.Task[str]]) -> None:
+        """Set each call's response from its task. Tasks still running are cancelled or detached, as their tool's `on_interrupt` says."""
+        for tool_call, task in zip(tool_calls, tool_tasks):
+            if not task.done():
+                tool = self._tool_registry.get(tool_call.name)
+                if tool is not None and tool.options.on_interrupt == InterruptPolicy.DETACH:
+                    self._detached_tool_tasks.add(task)
+                    task.add_done_callback(self._forget_detached)
+                    tool_call.response = _DETACHED_RESPONSE
+                else:
+                    task.cancel()
+                    tool_call.response = _CANCELLED_RESPONSE
+            elif task.cancelled():
+                tool_call.response = _CANCELLED_RESPONSE
+            elif task.exception() is not None:
+                tool_call.response = f"[Interrupted: the tool call failed: {task.exception()}]"
+            else:
+                tool_call.response = task.result()
 
-            async for chunk_after_tool_calls in self.astream(tool_calls_message):
-                yield chunk_after_tool_calls
-        self._thinking = False
+    def _forget_detached(self, task: asyncio.Task[str]) -> None:
+        self._detached_tool_tasks.discard(task)
+        if not task.cancelled():
+            # Nobody waits for the result, so mark a failure as retrieved
+            task.exception()
+
+    def restore_history(self, messages: List[ChatMessage]) -> None:
+        """Replace the history, such as with one loaded from a `SessionLog`. The first message must be the system message."""
+        if not messages or messages[0].role != ChatRole.SYSTEM:
+            raise ValueError("History must start with the system message")
+        # The adapters' caches are kept, and reuse what they converted of messages that are still present
+        self._messages = ChatHistory(messages, self._messages.caches)
+        self._context.restore(self._messages)
+
+    def fork(self, n: int) -> List[Self]:
+        """Return `n` branches that continue the conversation from here, independently of each other and of this agent.
+
+        A branch is an agent of the same class sharing this agent's LLM, tools, caches and other
+        attributes. It also shares the history so far, and only holds the messages it adds itself, so
+        it costs memory for its own turns rather than the whole conversation. Run branches at once with
+        `ame.core.branching.run_branches`, and continue from one of them with `merge`.
+        """
+        if self._thinking:
+            raise RuntimeError("Can't fork an agent while it is running a turn")
+        shared = self._messages if isinstance(self._messages, ForkedHistory) else ForkedHistory(self._messages)
+        self._system_shared = True
+        branches = []
+        for _ in range(n):
+            branch = copy.copy(self)
+            branch._messages = ForkedHistory(shared)
+            branch._context = self._context.fork()
+            branch.stop_reason = None
+            branch._fork_parent = self
+            branches.append(branch)
+        return branches
+
+    def merge(self, branch: "AgentWithTools") -> None:
+        """Continue from `branch`, as if its turns since the fork had run on this agent."""
+        if branch._fork_parent is not self:
+            raise ValueError("Can only merge a branch forked from this agent")
+        if self._thinking or branch._thinking:
+            raise RuntimeError("Can't merge while the agent or the branch is running a turn")
+        if isinstance(self._messages, ForkedHistory):
+            self._messages = ForkedHistory(branch._messages)
+        else:
+            self._messages = ChatHistory(branch._messages, self._messages.caches)
+        self._context.restore(self._messages)
+        self._system_shared = True
+        self.stop_reason = branch.stop_reason
 
     def update_instructions(self, instructions: str) -> None:
+        if self._system_shared:
+            # Replace the system message rather than change it for the forks sharing it too
+            self._messages[0] = ChatMessage(role=ChatRole.SYSTEM, content=instructions)
+            self._system_shared = False
+            return
         system_message = next(m for m in self._messages if m.role == ChatRole.SYSTEM)
         system_message.content = instructions
 
-    async def _execute_tool_call(self, tool_call: ToolCall) -> str:
+    async def _execute_tool_call(self, tool_call: ToolCall, span: Optional[Span] = None) -> str:
         method_name = tool_call.name
-        method = getattr(self, method_name)
-        if not method:
+        if method_name not in self._tool_registry:
             raise ValueError(f"Method '{method_name}' not found on {self.__class__.__name__}")
+        tool = self._tool_registry[method_name]
+        func = getattr(type(self), method_name)
 
         args = tool_call.args if tool_call.args is not None else {}
-        result = await method(**args)
+        cache = self._tool_cache(tool, func)
+        try:
+            if cache is None:
+                output = await self._run_tool(tool, func, args, span)
+            else:
+                output = await cache.get_or_run(cache.key(tool, args), lambda: self._run_tool(tool, func, args, span))
+        except ToolTimeoutError as e:
+            # Reported to the LLM as the call's result, like a tool's own error message, rather than failing the turn
+            return f"[Timed out: {e}]"
+        return self._reject_oversized(self._limit_output(tool, tool_call, output))
+
+    # Pages are only needed for the turn that read them
+    @tool(output=ToolOutputOptions(keep_turns=0))
+    async def read_tool_output(self, handle: str, offset: int = 0, length: int = _MAX_READ_LENGTH) -> str:
+        """Read part of a tool output that was too long to show in full. `handle` is the handle given in the
+        truncated output, `offset` the character to start at and `length` the number of characters to read."""
+        store = self.tool_output_store
+        size = store.size(handle)
+        length = max(0, min(length, _MAX_READ_LENGTH))
+        text = store.read(handle, offset, length)
+        end = offset + len(text)
+        return f"[Characters {offset} to {end} of {size}]\n{text}"
+
+    @property
+    def tool_output_store(self) -> ToolOutputStore:
+        if self._tool_outputs is None:
+            self._tool_outputs = default_tool_output_store()
+        return self._tool_outputs
+
+    def _limit_output(self, tool: Tool, tool_call: ToolCall, output: str) -> str:
+        options = tool.options.output
+        counter = self._llm.token_counter
+        if options is None or options.max_tokens is None or counter.count_text(output) <= options.max_tokens:
+            return output
+        handle = None
+        if options.spill:
+            handle = self.tool_output_store.put(output)
+            tool_call.metadata = {**(tool_call.metadata or {}), HANDLE_METADATA_KEY: handle}
+        return truncate_output(output, options, handle, counter)
+
+    def _reject_oversized(self, output: str) -> str:
+        limit = self._max_tool_result_tokens
+        if limit is None:
+            return output
+        counter = self._llm.token_counter
+        tokens = counter.calibrated(counter.count_text(output))
+        if tokens <= limit:
+            return output
+        return (
+            f"[Tool result rejected: it was about {tokens} tokens, over the limit of {limit}. "
+            f"Ask for less output, such as a narrower query or a smaller range.]"
+        )
+
+    def _fit_context_window(self) -> None:
+        llm = self._llm
+        excess = llm.count_tokens(self._messages, self._tools) - (llm.context_window - self._config.reserve_output_tokens)
+        if excess <= 0:
+            return
+        counter = llm.token_counter
+        # If even dropping every earlier turn isn't enough, the request is sent as is and the adapter
+        # rejects it if it doesn't fit at all
+        if drop_oldest_turns(self._messages, excess, lambda m: counter.calibrated(counter.count_message(m))):
+            self._context.restore(self._messages)
+
+    def tool_cache_stats(self) -> Dict[str, ToolCacheStats]:
+        """Hit and miss counts of this agent's memoized tools. Process-scoped caches count calls from every agent."""
+        stats = {}
+        for t in self._tools:
+            cache = self._tool_cache(t, getattr(type(self), t.name))
+            if cache is not None:
+                stats[t.name] = cache.stats
+        return stats
+
+    def _tool_cache(self, tool: Tool, func: Callable) -> Optional[ToolResultCache]:
+        options = tool.options.cache
+        if options is None:
+            return None
+        if options.scope == ToolCacheScope.PROCESS:
+            return process_tool_cache(func, options)
+        cache = self._tool_caches.get(tool.name)
+        if cache is None:
+            cache = self._tool_caches[tool.name] = ToolResultCache(options)
+        return cache
+
+    async def _run_tool(self, tool: Tool, func: Callable, args: Dict, span: Optional[Span]) -> str:
+        result = await run_tool(func, self, args, tool.options, semaphore=self._tool_semaphore(), parent_span=span)
         return str(result)
 
-    def _get_tools_from_decorated_methods(self) -> List[Tool]:
-        tools = []
-        for attr_name in dir(self):
-            attr = getattr(self, attr_name)
-            if hasattr(attr, _IS_TOOL):
-                sig = inspect.signature(attr)
-                fields = {name: (param.annotation, ...) for name, param in sig.parameters.items() if name != "self"}
-                input_schema = create_model(f"{attr.__name__}Input", **fields) if fields else create_model(f"{attr.__name__}Input")
-                tools.append(Tool(
-                    name=attr.__name__,
-                    description=attr.__doc__ or "",
-                    input_schema=input_schema,
-                ))
-        return tools
\ No newline at end of file
+    def _tool_semaphore(self) -> Optional[asyncio.Semaphore]:
+        limit = self._config.max_concurrent_tool_calls
+        if not limit:
+            return None
+        loop = asyncio.get_running_loop()
+        semaphore = self._tool_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._tool_semaphores[loop] = asyncio.Semaphore(limit)
+        return semaphore
+
+
+class _Turn:
+    """A running `astream` call, as seen by `AgentWithTools.interrupt`."""
+
+    __slots__ = ("generator", "interrupted", "task", "done", "_cancelled")
+
+    def __init__(self) -> None:
+        self.generator: Optional[weakref.ref[AsyncGenerator]] = None
+        self.interrupted = False
+        # The task running the turn, while it waits for the LLM or for tool calls. Only these waits are
+        # cancelled by an interrupt, so the consumer's own code never sees the cancellation.
+        self.task: Optional[asyncio.Task] = None
+        self.done = asyncio.Event()
+        self._cancelled = False
+
+    def interrupt(self) -> None:
+        self.interrupted = True
+        if self.task is not None and not self._cancelled:
+            self._cancelled = True
+            self.task.cancel()
+
+    async def wait(self, tasks: List[asyncio.Task[str]]) -> None:
+        """Wait until all `tasks` are done or one has failed, or the turn is interrupted. The tasks aren't cancelled."""
+        self.task = asyncio.current_task()
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            if not self.absorb_cancellation():
+                raise
+        finally:
+            self.task = None
+
+    async def finish(self) -> None:
+        """Wait for the interrupted turn to end."""
+        generator = self.generator()
+        if generator is not None and inspect.getasyncgenstate(generator) == inspect.AGEN_SUSPENDED:
+            # Waiting for its consumer to ask for the next chunk, which may take a while; end it now
+            await generator.aclose()
+        else:
+            await self.done.wait()
+
+    def absorb_cancellation(self) -> bool:
+        """Whether the cancellation being handled was only the interrupt's, which is then undone."""
+        if not self._cancelled:
+            return False
+        self._cancelled = False
+        return asyncio.current_task().uncancel() == 0
+
+
+def _build_tool(func: Callable) -> Tool:
+    sig = inspect.signature(func)
+    fields = {
+        name: (param.annotation, ... if param.default is inspect.Parameter.empty else param.default)
+        for name, param in sig.parameters.items()
+        if name != "self"
+    }
+    input_schema = create_model(f"{func.__name__}Input", **fields) if fields else create_model(f"{func.__name__}Input")
+    return Tool(
+        name=func.__name__,
+        description=func.__doc__ or "",
+        input_schema=input_schema,
+        options=getattr(func, "tool_options", ToolOptions()),
+    )
+
+
+async def _timed_stream(stream: AsyncIterator[str | ToolCall], tracer: Tracer) -> AsyncGenerator[str | ToolCall]:
+    """`stream`, recording its time to first token and the gaps between its chunks. The time the
+    consumer spends on a chunk doesn't count towards the gap after it."""
+    requested = time.perf_counter()
+    last_chunk_time: Optional[float] = None
+    async with contextlib.aclosing(stream):
+        async for chunk in stream:
+            now = time.perf_counter()
+            if last_chunk_time is None:
+                tracer.record(LLM_TIME_TO_FIRST_TOKEN, now - requested)
+            else:
+                tracer.record(LLM_INTER_TOKEN_GAP, now - last_chunk_time)
+            yield chunk
+            last_chunk_time = time.perf_counter()
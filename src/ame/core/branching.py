@@ -0,0 +1,278 @@
+import asyncio
+import inspect
+from bisect import bisect_right
+from collections.abc import MutableSequence
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ame.core.chat_context import ChatMessage, new_history_version
+from ame.core.streaming import CoalesceOptions
+from ame.core.tools import ToolCall
+
+if TYPE_CHECKING:
+    from ame.core.agent_with_tools import AgentWithTools
+
+
+class ForkedHistory(MutableSequence[ChatMessage]):
+    """A message history that shares its older messages with the histories forked from the same point.
+
+    The history is the system message, a few messages of its own kept in front (such as a summary), the
+    shared messages from `start` on, and the messages added since the fork. Shared messages are held in
+    immutable tuples referenced by every history forked from the same point, so a fork costs memory for
+    the messages it adds or replaces, not for the whole history. Trimming from the front, as context
+    managers do, just moves `start`, and replacing a shared message records an override. Other edits in
+    the middle of the shared messages move the messages before the edit into the history's own front.
+    """
+
+    def __init__(self, messages: Sequence[ChatMessage]) -> None:
+        if isinstance(messages, ForkedHistory):
+            messages._freeze()
+            self._system = messages._system
+            self._head = list(messages._head)
+            self._segments = messages._segments
+            self._ends = messages._ends
+            self._start = messages._start
+            self._overrides = dict(messages._overrides)
+        else:
+            if not messages:
+                raise ValueError("History must start with the system message")
+            shared = tuple(islice(messages, 1, None))
+            self._system = messages[0]
+            self._head: List[ChatMessage] = []
+            # Shared messages, in order, and the index just past each segment in their concatenation
+            self._segments: Tuple[Tuple[ChatMessage, ...], ...] = (shared,) if shared else ()
+            self._ends: Tuple[int, ...] = (len(shared),) if shared else ()
+            # Index of the first shared message still in the history
+            self._start = 0
+            # Shared index -> the message that replaced it in this history
+            self._overrides: Dict[int, ChatMessage] = {}
+        self._own: List[ChatMessage] = []
+        # Per-conversation state of LLM adapters, and the version caches check it by, as in
+        # `ChatHistory`. Every fork starts its own.
+        self.caches: Dict[Hashable, Any] = {}
+        self.version = new_history_version()
+
+    def __len__(self) -> int:
+        return 1 + len(self._head) + self._shared_len() - self._start + len(self._own)
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        return chain((self._system,), self._head, self._iter_shared(), self._own)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        index = self._normalize(index)
+        if index == 0:
+            return self._system
+        head_end, own_start = self._bounds()
+        if index < head_end:
+            return self._head[index - 1]
+        if index < own_start:
+            return self._shared(self._start + index - head_end)
+        return self._own[index - own_start]
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                self._rewrite(lambda messages: messages.__setitem__(index, value))
+                return
+            values = list(value)
+            if stop > start:
+                del self[start:stop]
+            for offset, message in enumerate(values):
+                self.insert(start + offset, message)
+            return
+        index = self._normalize(index)
+        self.version = new_history_version()
+        if index == 0:
+            self._system = value
+            return
+        head_end, own_start = self._bounds()
+        if index < head_end:
+            self._head[index - 1] = value
+        elif index < own_start:
+            self._overrides[self._start + index - head_end] = value
+        else:
+            self._own[index - own_start] = value
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1 or (start == 0 and stop > 0):
+                self._rewrite(lambda messages: messages.__delitem__(index))
+            elif stop > start:
+                self._delete(start, stop)
+            return
+        index = self._normalize(index)
+        if index == 0:
+            self._rewrite(lambda messages: messages.__delitem__(0))
+        else:
+            self._delete(index, index + 1)
+
+    def insert(self, index: int, value: ChatMessage) -> None:
+        self.version = new_history_version()
+        n = len(self)
+        index = min(max(index + n if index < 0 else index, 0), n)
+        head_end, own_start = self._bounds()
+        if index >= own_start:
+            self._own.insert(index - own_start, value)
+        elif index == 0:
+            self._head.insert(0, self._system)
+            self._system = value
+        else:
+            if index > head_end:
+                self._move_to_head(index - head_end)
+            self._head.insert(index - 1, value)
+
+    def append(self, value: ChatMessage) -> None:
+        self._own.append(value)
+
+    def extend(self, values: Iterable[ChatMessage]) -> None:
+        self._own.extend(values)
+
+    def _normalize(self, index: int) -> int:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("history index out of range")
+        return index
+
+    def _bounds(self) -> Tuple[int, int]:
+        """Indexes of the first shared message and of the first message added since the fork."""
+        head_end = 1 + len(self._head)
+        return head_end, head_end + self._shared_len() - self._start
+
+    def _shared_len(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def _shared(self, index: int) -> ChatMessage:
+        message = self._overrides.get(index) if self._overrides else None
+        if message is not None:
+            return message
+        segment = bisect_right(self._ends, index)
+        return self._segments[segment][index - (self._ends[segment - 1] if segment else 0)]
+
+    def _iter_shared(self) -> Iterable[ChatMessage]:
+        first = bisect_right(self._ends, self._start)
+        if first == len(self._segments):
+            return ()
+        offset = self._start - (self._ends[first - 1] if first else 0)
+        shared = chain(islice(self._segments[first], offset, None), *self._segments[first + 1:])
+        if not self._overrides:
+            return shared
+        overrides = self._overrides
+        return (overrides.get(i, message) for i, message in enumerate(shared, self._start))
+
+    def _delete(self, start: int, stop: int) -> None:
+        head_end, own_start = self._bounds()
+        if start >= own_start:
+            del self._own[start - own_start:stop - own_start]
+            return
+        if start > head_end:
+            # Keep the shared messages before the deleted ones, so the deletion is a trim of the front
+            self._move_to_head(start - head_end)
+            head_end = start
+        in_head = min(stop, head_end) - start
+        del self._head[start - 1:start - 1 + in_head]
+        self._drop_front(stop - start - in_head)
+
+    def _move_to_head(self, count: int) -> None:
+        self._head.extend(islice(self._iter_shared(), count))
+        self._drop_front(count)
+
+    def _drop_front(self, count: int) -> None:
+        """Remove the first `count` messages after the head."""
+        shared = min(count, self._shared_len() - self._start)
+        self._start += shared
+        if count > shared:
+            del self._own[:count - shared]
+        if self._segments and self._start >= self._shared_len():
+            # Nothing shared is left, so stop referencing it
+            self._segments, self._ends, self._start, self._overrides = (), (), 0, {}
+        elif self._overrides and shared:
+            self._overrides = {i: m for i, m in self._overrides.items() if i >= self._start}
+
+    def _freeze(self) -> None:
+        """Turn the messages added since the fork into a shared segment, for a new fork to share."""
+        if self._own:
+            self._segments = self._segments + (tuple(self._own),)
+            self._ends = self._ends + (self._shared_len() + len(self._own),)
+            self._own = []
+
+    def _rewrite(self, edit: Callable[[List[ChatMessage]], None]) -> None:
+        messages = list(self)
+        edit(messages)
+        if not messages:
+            raise ValueError("History must start with the system message")
+        self._system, self._head = messages[0], messages[1:]
+        self._segments, self._ends, self._start, self._overrides, self._own = (), (), 0, {}, []
+        self.version = new_history_version()
+
+
+class BranchResult:
+    """One branch's turn, run by `run_branches`."""
+
+    def __init__(self, branch: "AgentWithTools", chunks: List[str | ToolCall], error: Optional[Exception] = None) -> None:
+        self.branch = branch
+        self.chunks = chunks
+        self.error = error
+
+    @property
+    def text(self) -> str:
+        return "".join(chunk for chunk in self.chunks if isinstance(chunk, str))
+
+
+async def run_branches(
+    branches: Sequence["AgentWithTools"],
+    messages: Optional[ChatMessage] | Sequence[Optional[ChatMessage]] = None,
+    coalesce: CoalesceOptions | bool | None = None,
+) -> List[BranchResult]:
+    """Run one turn on every branch at once, and collect each branch's chunks.
+
+    `messages` is the user message for every branch, or one message per branch, such as alternative
+    plans to compare. A branch that fails doesn't stop the others; its error is set on its result.
+    """
+    if messages is None or isinstance(messages, ChatMessage):
+        messages = [messages] * len(branches)
+    elif len(messages) != len(branches):
+        raise ValueError(f"Expected {len(branches)} messages, one per branch, got {len(messages)}")
+    return list(await asyncio.gather(*(
+        _run_branch(branch, message, coalesce) for branch, message in zip(branches, messages)
+    )))
+
+
+async def best_of(
+    agent: "AgentWithTools",
+    message: Optional[ChatMessage],
+    n: int,
+    score: Callable[[BranchResult], float | Awaitable[float]],
+    coalesce: CoalesceOptions | bool | None = None,
+) -> BranchResult:
+    """Run the turn on `n` forks of `agent` at once, and merge the one `score` rates highest back into it.
+
+    Branches that fail aren't scored. If they all fail, the first one's error is raised and the agent is
+    left as it was.
+    """
+    results = await run_branches(agent.fork(n), message, coalesce)
+    succeeded = [result for result in results if result.error is None]
+    if not succeeded:
+        raise results[0].error
+    scores = []
+    for result in succeeded:
+        value = score(result)
+        scores.append(await value if inspect.isawaitable(value) else value)
+    best = succeeded[max(range(len(succeeded)), key=scores.__getitem__)]
+    agent.merge(best.branch)
+    return best
+
+
+async def _run_branch(branch: "AgentWithTools", message: Optional[ChatMessage], coalesce: CoalesceOptions | bool | None) -> BranchResult:
+    chunks: List[str | ToolCall] = []
+    try:
+        async for chunk in branch.astream(message, coalesce=coalesce):
+            chunks.append(chunk)
+    except Exception as e:
+        return BranchResult(branch, chunks, e)
+    return BranchResult(branch, chunks)
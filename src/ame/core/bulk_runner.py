@@ -0,0 +1,251 @@
+import asyncio
+import time
+from typing import AsyncGenerator, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from ame.core.agent_with_tools import AgentWithTools
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool, ToolCall
+from ame.llms.batch import BatchBackend, BatchRequest, BatchRequestError, BatchResult
+from ame.llms.llm import LLM, WrapperLLM
+
+
+class BulkRunnerConfig(BaseModel):
+    # Seconds a request waits for other agents to finish running tools and join its batch. Batches are
+    # submitted sooner once every running turn is waiting on the LLM.
+    max_batch_delay: float = 1.0
+    # Turns running at once; each holds its conversation in memory until it ends. Unlimited if None.
+    max_concurrent_turns: Optional[int] = None
+    # Seconds between checks of a batch's status. The backend's `poll_interval` if None.
+    poll_interval: Optional[float] = None
+    # Consecutive errors checking a batch's status before its requests fail
+    max_poll_errors: int = 3
+
+
+class BulkRunnerStats(BaseModel):
+    batches: int
+    running_batches: int
+    requests: int
+    failed_requests: int
+    completed_turns: int
+    failed_turns: int
+
+
+class BulkResult:
+    """One agent's turn, run by `BulkRunner.run`."""
+
+    def __init__(self, agent: AgentWithTools, chunks: List[str | ToolCall], error: Optional[Exception] = None) -> None:
+        self.agent = agent
+        self.chunks = chunks
+        self.error = error
+
+    @property
+    def text(self) -> str:
+        return "".join(chunk for chunk in self.chunks if isinstance(chunk, str))
+
+
+class BulkRunner:
+    """Runs turns for many agents with their LLM requests sent through a provider's batch API, for offline
+    workloads that can wait minutes to hours per step in exchange for its lower price and separate
+    rate limits.
+
+    Agents must be created with `runner.llm`. Each of their LLM steps becomes one request in a batch; once
+    the batch has ended, every agent in it runs its tool calls and its next step joins the next batch.
+    Batches are submitted as soon as every running turn is waiting on the LLM, after `max_batch_delay`
+    otherwise, or when they reach the backend's `max_batch_size`.
+    """
+
+    def __init__(self, backend: BatchBackend, config: BulkRunnerConfig = BulkRunnerConfig()) -> None:
+        self.backend = backend
+        self.llm: LLM = _BatchLLM(self)
+        self._config = config
+        # Requests waiting to be submitted, with the futures their agents wait on
+        self._pending: List[Tuple[BatchRequest, asyncio.Future[BatchResult]]] = []
+        self._oldest_pending = 0.0
+        self._changed = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._requested = 0
+        # Running turns, and those of them waiting on an LLM request
+        self._active = 0
+        self._waiting = 0
+        self._batches = 0
+        self._failed_requests = 0
+        self._completed_turns = 0
+        self._failed_turns = 0
+
+    async def run(self, jobs: Iterable[Tuple[AgentWithTools, Optional[ChatMessage]]]) -> List[BulkResult]:
+        """Run one turn for every (agent, message) job, and collect each agent's chunks in job order.
+
+        A turn that fails doesn't stop the others; its error is set on its result. If `run` is cancelled,
+        the batches it submitted are cancelled too.
+        """
+        if self._dispatcher is not None:
+            raise RuntimeError("BulkRunner is already running")
+        concurrency = asyncio.Semaphore(self._config.max_concurrent_turns) if self._config.max_concurrent_turns else None
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            return list(await asyncio.gather(*(self._run_job(agent, message, concurrency) for agent, message in jobs)))
+        finally:
+            self._dispatcher.cancel()
+            for task in self._batch_tasks:
+                task.cancel()
+            await asyncio.gather(self._dispatcher, *self._batch_tasks, return_exceptions=True)
+            self._dispatcher = None
+            for _, future in self._pending:
+                future.cancel()
+            self._pending.clear()
+
+    def stats(self) -> BulkRunnerStats:
+        return BulkRunnerStats(
+            batches=self._batches,
+            running_batches=len(self._batch_tasks),
+            requests=self._requested,
+            failed_requests=self._failed_requests,
+            completed_turns=self._completed_turns,
+            failed_turns=self._failed_turns,
+        )
+
+    async def _run_job(
+        self, agent: AgentWithTools, message: Optional[ChatMessage], concurrency: Optional[asyncio.Semaphore]
+    ) -> BulkResult:
+        if concurrency is not None:
+            async with concurrency:
+                return await self._run_turn(agent, message)
+        return await self._run_turn(agent, message)
+
+    async def _run_turn(self, agent: AgentWithTools, message: Optional[ChatMessage]) -> BulkResult:
+        chunks: List[str | ToolCall] = []
+        self._active += 1
+        try:
+            async for chunk in agent.astream(message):
+                chunks.append(chunk)
+        except Exception as e:
+            self._failed_turns += 1
+            return BulkResult(agent, chunks, e)
+        finally:
+            self._active -= 1
+            # One fewer turn to wait for before submitting
+            self._changed.set()
+        self._completed_turns += 1
+        return BulkResult(agent, chunks)
+
+    async def _request(self, messages: List[ChatMessage], tools: List[Tool]) -> BatchResult:
+        self._requested += 1
+        request = BatchRequest(f"req-{self._requested}", messages, tools)
+        self.backend.prepare(request)
+        future: asyncio.Future[BatchResult] = asyncio.get_running_loop().create_future()
+        if not self._pending:
+            self._oldest_pending = time.monotonic()
+        self._pending.append((request, future))
+        self._waiting += 1
+        self._changed.set()
+        try:
+            return await future
+        finally:
+            self._waiting -= 1
+
+    async def _dispatch(self) -> None:
+        while True:
+            if self._pending and (
+                len(self._pending) >= self.backend.max_batch_size
+                or self._waiting >= self._active
+                or time.monotonic() >= self._oldest_pending + self._config.max_batch_delay
+            ):
+                self._submit_pending()
+                continue
+            self._changed.clear()
+            if not self._pending:
+                await self._changed.wait()
+                continue
+            timeout = self._oldest_pending + self._config.max_batch_delay - time.monotonic()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    def _submit_pending(self) -> None:
+        size = self.backend.max_batch_size
+        batch, self._pending = self._pending[:size], self._pending[size:]
+        self._oldest_pending = time.monotonic()
+        # Requests of interrupted turns aren't sent
+        batch = [(request, future) for request, future in batch if not future.done()]
+        if not batch:
+            return
+        self._batches += 1
+        task = asyncio.create_task(self._run_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[BatchRequest, asyncio.Future[BatchResult]]]) -> None:
+        try:
+            batch_id = await self.backend.submit([request for request, _ in batch])
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        poll_interval = self._config.poll_interval if self._config.poll_interval is not None else self.backend.poll_interval
+        errors = 0
+        try:
+            while True:
+                await asyncio.sleep(poll_interval)
+                try:
+                    results = await self.backend.poll(batch_id)
+                except Exception as e:
+                    errors += 1
+                    if errors >= self._config.max_poll_errors:
+                        self._fail(batch, e)
+                        return
+                    continue
+                errors = 0
+                if results is not None:
+                    break
+        except asyncio.CancelledError:
+            try:
+                await self.backend.cancel(batch_id)
+            except Exception:
+                pass
+            raise
+
+        by_id = {result.custom_id: result for result in results}
+        for request, future in batch:
+            result = by_id.get(request.custom_id)
+            if result is None:
+                result = BatchResult(
+                    request.custom_id,
+                    error=BatchRequestError(f"Request {request.custom_id} is missing from the results of batch {batch_id}"),
+                )
+            if result.error is not None:
+                self._failed_requests += 1
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, batch: List[Tuple[BatchRequest, asyncio.Future[BatchResult]]], error: Exception) -> None:
+        self._failed_requests += len(batch)
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+
+class _BatchLLM(WrapperLLM):
+    """The LLM agents run by a `BulkRunner` are created with. Each request waits for its batch to end."""
+
+    def __init__(self, runner: BulkRunner) -> None:
+        self._runner = runner
+        self.llm = runner.backend.llm
+
+    async def astream(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+    ) -> AsyncGenerator[str | ToolCall]:
+        result = await self._runner._request(messages, tools)
+        if result.error is not None:
+            raise result.error
+        for chunk in result.chunks:
+            yield chunk
+
+    def count_tokens(self, messages: list[ChatMessage], tools: List[Tool]) -> int:
+        # The backend counts with the conversions it keeps for its requests
+        return self._runner.backend.count_tokens(messages, tools)
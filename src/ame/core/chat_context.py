@@ -1,7 +1,10 @@
+from dataclasses import dataclass
 from enum import Enum
+from functools import cache
+from itertools import count
+from typing import Any, Dict, Hashable, Iterable, List, Optional
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import TypeAdapter
 
 from ame.core.tools import ToolCall
 
@@ -12,6 +15,63 @@ class ChatRole(Enum):
     SYSTEM = "SYSTEM"
 
 
-class ChatMessage(BaseModel):
+# A plain slotted dataclass rather than a pydantic model: histories hold thousands of these per session,
+# and the agent loop creates them on every step. Construction only converts a str role, which the role
+# checks throughout would otherwise miss; data from outside the process, such as session logs, goes
+# through `validate_message`.
+@dataclass(slots=True, kw_only=True)
+class ChatMessage:
     role: ChatRole
-    content: str | List[ToolCall]
\ No newline at end of file
+    content: str | List[ToolCall]
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.role, ChatRole):
+            self.role = ChatRole(self.role)
+
+
+# Source of history versions, unique across every history in the process
+_versions = count()
+
+
+def new_history_version() -> int:
+    return next(_versions)
+
+
+class ChatHistory(List[ChatMessage]):
+    """A conversation's message list, as agents keep it. LLM adapters keep per-conversation state, such as
+    the history converted to their request format, in `caches`, so it lives exactly as long as the
+    conversation does.
+
+    `version` changes when the history is created and whenever a message is replaced or inserted, so a
+    cache can tell in O(1) that the messages it saw are unchanged, if the last of them is still in place.
+    """
+
+    __slots__ = ("caches", "version")
+
+    def __init__(self, messages: Iterable[ChatMessage] = (), caches: Optional[Dict[Hashable, Any]] = None) -> None:
+        super().__init__(messages)
+        self.caches: Dict[Hashable, Any] = caches if caches is not None else {}
+        self.version = new_history_version()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self.version = new_history_version()
+
+    def insert(self, index, value) -> None:
+        super().insert(index, value)
+        self.version = new_history_version()
+
+
+@cache
+def _message_adapter() -> TypeAdapter[ChatMessage]:
+    return TypeAdapter(ChatMessage)
+
+
+def validate_message(data: Any) -> ChatMessage:
+    """Build a message from untyped data, such as parsed JSON, validating it and its tool calls."""
+    return _message_adapter().validate_python(data)
+
+
+def dump_message(message: ChatMessage, exclude_none: bool = False) -> Dict[str, Any]:
+    """The message as a dict of plain values, as `validate_message` accepts. Roles stay enums."""
+    return _message_adapter().dump_python(message, exclude_none=exclude_none)
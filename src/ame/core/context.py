@@ -0,0 +1,268 @@
+import copy
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, List, Optional
+
+from ame.core.chat_context import ChatMessage, ChatRole
+
+if TYPE_CHECKING:
+    from ame.llms.llm import LLM
+
+_CHARS_PER_TOKEN = 4
+
+# Summarizes the messages being dropped from the context, given the previous summary if there is one
+Summarizer = Callable[[List[ChatMessage], Optional[str]], Awaitable[str]]
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+_SUMMARIZER_INSTRUCTIONS = (
+    "Summarize the conversation below for your own future reference. Keep facts, decisions, open "
+    "questions and tool results that may matter later. Reply with the summary only."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message: ChatMessage) -> int:
+    if isinstance(message.content, str):
+        return estimate_tokens(message.content)
+    tokens = 0
+    for tool_call in message.content:
+        tokens += estimate_tokens(tool_call.name) + estimate_tokens(str(tool_call.args or "")) + estimate_tokens(tool_call.response or "")
+    return tokens
+
+
+class ContextManager(ABC):
+    """Owns an agent's message history and decides which messages stay in the LLM's context.
+
+    The agent adds every message through `add`, and the manager trims the history in place. The system
+    message is always kept first.
+    """
+
+    @abstractmethod
+    async def add(self, messages: List[ChatMessage], message: ChatMessage) -> None:
+        ...
+
+    def restore(self, messages: List[ChatMessage]) -> None:
+        """Called when the agent's history is replaced wholesale, such as when a session is resumed."""
+
+    def replaced(self, messages: List[ChatMessage], index: int, previous: ChatMessage) -> None:
+        """Called when the agent has replaced the message at `index`, which was `previous`, such as with a
+        stub of an expired tool output. The default handles it as a restore of the whole history."""
+        self.restore(messages)
+
+    def fork(self) -> "ContextManager":
+        """A manager for a branch forked from the agent's history, starting from this manager's state.
+
+        The default is a shallow copy, so managers with mutable state must override it.
+        """
+        return copy.copy(self)
+
+
+class MessageCountContextManager(ContextManager):
+    """Keeps the system message and at most `max_messages - 1` other messages.
+
+    Once the limit is exceeded, the oldest messages are dropped until `trim_ratio * max_messages` are
+    left, so trimming happens in batches, and the cut is moved forward to the next user message, as in
+    `TokenBudgetContextManager`.
+    """
+
+    def __init__(self, max_messages: int, trim_ratio: float = 0.75) -> None:
+        self.max_messages = max_messages
+        self.trim_ratio = trim_ratio
+
+    async def add(self, messages: List[ChatMessage], message: ChatMessage) -> None:
+        messages.append(message)
+        if len(messages) <= self.max_messages:
+            return
+        last = len(messages) - 1
+        # Index of the first message kept; the newest message is always kept
+        end = len(messages) + 1 - max(int(self.trim_ratio * self.max_messages), 2)
+        # Move the cut to the next user text message so a turn is never split, unless there is none
+        turn_start = end
+        while turn_start < last and not _starts_turn(messages[turn_start]):
+            turn_start += 1
+        if _starts_turn(messages[turn_start]):
+            end = turn_start
+        del messages[1:end]
+
+
+class TokenBudgetContextManager(ContextManager):
+    """Keeps the history under `max_tokens` estimated tokens, system message included.
+
+    Once the budget is exceeded, the oldest messages are dropped until the history is under
+    `trim_ratio * max_tokens`, so trimming happens in batches and costs amortized O(1) per message.
+    The cut is moved forward to the next user message, so the kept history starts at a turn boundary
+    and never starts with tool calls or a reply whose question was dropped. The newest message is
+    always kept, even if it alone exceeds the budget.
+
+    With a `summarizer`, dropped messages are folded into a summary message kept right after the system
+    message, instead of being discarded. Messages are counted with `count`, such as an LLM's
+    `token_counter.count_message`, or estimated from their length by default.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        trim_ratio: float = 0.75,
+        summarizer: Optional[Summarizer] = None,
+        count: Callable[[ChatMessage], int] = estimate_message_tokens,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.trim_ratio = trim_ratio
+        self.summarizer = summarizer
+        self.count = count
+        self.summary: Optional[str] = None
+        # Estimated tokens of each message after the system message (and summary), in history order
+        self._tokens: Deque[int] = deque()
+        # Messages at the front of the history whose tokens aren't in `_tokens`, but are in `_total`.
+        # A fork estimates them again if it trims them, instead of copying the counts it shares.
+        self._untracked = 0
+        self._total = 0
+        self._system_content: Optional[str] = None
+        self._system_tokens = 0
+        self._summary_tokens = 0
+
+    async def add(self, messages: List[ChatMessage], message: ChatMessage) -> None:
+        messages.append(message)
+        tokens = self.count(message)
+        self._tokens.append(tokens)
+        self._total += tokens
+
+        system_content = messages[0].content
+        if system_content is not self._system_content:
+            self._system_content = system_content
+            self._system_tokens = self.count(messages[0])
+
+        if self._system_tokens + self._summary_tokens + self._total > self.max_tokens:
+            await self._trim(messages)
+
+    def restore(self, messages: List[ChatMessage]) -> None:
+        has_summary = len(messages) > 1 and _is_summary(messages[1])
+        self.summary = messages[1].content[len(SUMMARY_PREFIX):] if has_summary else None
+        self._summary_tokens = self.count(messages[1]) if has_summary else 0
+        self._tokens = deque(self.count(m) for m in messages[2 if has_summary else 1:])
+        self._total = sum(self._tokens)
+        self._untracked = 0
+        self._system_content = messages[0].content
+        self._system_tokens = self.count(messages[0])
+
+    def replaced(self, messages: List[ChatMessage], index: int, previous: ChatMessage) -> None:
+        offset = index - (2 if self.summary is not None else 1)
+        if offset < 0:
+            self.restore(messages)
+            return
+        tokens = self.count(messages[index])
+        if offset < self._untracked:
+            self._total += tokens - self.count(previous)
+        else:
+            offset -= self._untracked
+            self._total += tokens - self._tokens[offset]
+            self._tokens[offset] = tokens
+
+    def fork(self) -> "TokenBudgetContextManager":
+        branch = copy.copy(self)
+        branch._tokens = deque()
+        branch._untracked = self._untracked + len(self._tokens)
+        return branch
+
+    async def _trim(self, messages: List[ChatMessage]) -> None:
+        start = 2 if self.summary is not None else 1
+        last = len(messages) - 1
+        target = self.trim_ratio * self.max_tokens - self._system_tokens - self._summary_tokens
+        total = self._total
+        end = start
+        while end < last and total > target:
+            total -= self._tokens_at(messages, start, end)
+            end += 1
+        # Move the cut to the next user text message so a turn is never split, unless there is none
+        turn_start = end
+        while turn_start < last and not _starts_turn(messages[turn_start]):
+            turn_start += 1
+        if _starts_turn(messages[turn_start]):
+            end = turn_start
+        if end == start:
+            return
+
+        untracked = min(end - start, self._untracked)
+        self._untracked -= untracked
+        for i in range(start, start + untracked):
+            self._total -= self.count(messages[i])
+        for _ in range(end - start - untracked):
+            self._total -= self._tokens.popleft()
+
+        dropped = messages[start:end]
+        if self.summarizer is None:
+            del messages[start:end]
+            return
+
+        self.summary = await self.summarizer(dropped, self.summary)
+        summary_message = ChatMessage(role=ChatRole.USER, content=SUMMARY_PREFIX + self.summary)
+        self._summary_tokens = self.count(summary_message)
+        messages[1:end] = [summary_message]
+
+    def _tokens_at(self, messages: List[ChatMessage], start: int, index: int) -> int:
+        offset = index - start
+        if offset < self._untracked:
+            return self.count(messages[index])
+        return self._tokens[offset - self._untracked]
+
+
+def drop_oldest_turns(messages: List[ChatMessage], tokens: int, count: Callable[[ChatMessage], int]) -> bool:
+    """Drop whole turns from the front of the history, after the system message and any summary, until
+    at least `tokens` are freed as counted by `count`.
+
+    Returns False without changing the history if that would mean dropping the current turn.
+    """
+    if tokens <= 0:
+        return True
+    start = 2 if len(messages) > 1 and _is_summary(messages[1]) else 1
+    last = len(messages) - 1
+    freed = 0
+    end = start
+    while end < last and freed < tokens:
+        freed += count(messages[end])
+        end += 1
+    while end <= last and not _starts_turn(messages[end]):
+        freed += count(messages[end])
+        end += 1
+    if freed < tokens or end > last:
+        return False
+    del messages[start:end]
+    return True
+
+
+def _starts_turn(message: ChatMessage) -> bool:
+    return message.role == ChatRole.USER and isinstance(message.content, str)
+
+
+def _is_summary(message: ChatMessage) -> bool:
+    return _starts_turn(message) and message.content.startswith(SUMMARY_PREFIX)
+
+
+class LLMSummarizer:
+    """A `Summarizer` that asks an LLM to fold the dropped messages into the running summary."""
+
+    def __init__(self, llm: "LLM", instructions: str = _SUMMARIZER_INSTRUCTIONS) -> None:
+        self.llm = llm
+        self.instructions = instructions
+
+    async def __call__(self, messages: List[ChatMessage], previous_summary: Optional[str]) -> str:
+        lines = [f"Previous summary:\n{previous_summary}\n"] if previous_summary else []
+        for message in messages:
+            if isinstance(message.content, str):
+                lines.append(f"{message.role.value}: {message.content}")
+            else:
+                for tool_call in message.content:
+                    lines.append(f"TOOL {tool_call.name}({tool_call.args or {}}) -> {tool_call.response or ''}")
+        request = [
+            ChatMessage(role=ChatRole.SYSTEM, content=self.instructions),
+            ChatMessage(role=ChatRole.USER, content="\n".join(lines)),
+        ]
+        chunks = []
+        async for chunk in self.llm.astream(messages=request, tools=[]):
+            if isinstance(chunk, str):
+                chunks.append(chunk)
+        return "".join(chunks)
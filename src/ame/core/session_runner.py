@@ -0,0 +1,229 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Generator, List, Optional
+
+from pydantic import BaseModel
+
+from ame.core.agent_with_tools import AgentWithTools
+from ame.core.chat_context import ChatMessage
+from ame.core.streaming import CoalesceOptions
+from ame.core.tools import ToolCall
+
+
+class SessionRunnerConfig(BaseModel):
+    # Turns running at once, across all sessions
+    max_concurrent_turns: int = 100
+    # Turns waiting to start, across all sessions. `submit` waits and `submit_nowait` raises past this.
+    max_queued_turns: int = 10_000
+    # Number of recent turns that wait-time percentiles are computed over
+    wait_time_window: int = 1024
+    # Coalesce the text of every turn into fewer, larger chunks. See `AgentWithTools.astream`.
+    coalesce: Optional[CoalesceOptions] = None
+
+
+class SessionRunnerStats(BaseModel):
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    max_queue_depth: int
+    mean_wait: float
+    p50_wait: float
+    p95_wait: float
+    max_wait: float
+
+
+class Turn:
+    """One `AgentWithTools.astream` call scheduled on a `SessionRunner`.
+
+    Iterate it to stream the chunks as they are produced, or await it for all of them at the end.
+    """
+
+    def __init__(self, agent: AgentWithTools, message: Optional[ChatMessage]) -> None:
+        self.agent = agent
+        self.message = message
+        self.chunks: List[str | ToolCall] = []
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._done: asyncio.Future[List[str | ToolCall]] = asyncio.get_running_loop().create_future()
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        return self.started_at - self.enqueued_at if self.started_at is not None else None
+
+    def done(self) -> bool:
+        return self._done.done()
+
+    def __await__(self) -> Generator[None, None, List[str | ToolCall]]:
+        return self._done.__await__()
+
+    async def __aiter__(self) -> AsyncIterator[str | ToolCall]:
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self._done.done():
+                self._done.result()
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def _push(self, chunk: str | ToolCall) -> None:
+        self.chunks.append(chunk)
+        self._changed.set()
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        self.finished_at = time.monotonic()
+        if error is None:
+            self._done.set_result(self.chunks)
+        elif isinstance(error, asyncio.CancelledError):
+            self._done.cancel()
+        else:
+            self._done.set_exception(error)
+        self._changed.set()
+
+
+class _Session:
+    def __init__(self) -> None:
+        self.turns: Deque[Turn] = deque()
+        self.running = False
+
+
+class SessionRunner:
+    """Runs turns for many agents on one event loop.
+
+    Turns of the same agent run one at a time, in submission order. Agents with queued turns take
+    turns round-robin, so an agent with a long backlog can't starve the others. Use it as an async
+    context manager, or call `start` and `stop`.
+
+    Rate limits are applied per provider/model by giving agents a `ame.llms.rate_limit.RateLimitedLLM`.
+    """
+
+    def __init__(self, config: SessionRunnerConfig = SessionRunnerConfig()) -> None:
+        self._config = config
+        self._sessions: Dict[int, _Session] = {}
+        # Sessions with queued turns and no running turn, in the order they get to run
+        self._ready: Deque[_Session] = deque()
+        self._ready_changed = asyncio.Condition()
+        self._space_changed = asyncio.Condition()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queue_depth = 0
+        self._wait_times: Deque[float] = deque(maxlen=config.wait_time_window)
+        self._workers: List[asyncio.Task] = []
+
+    async def __aenter__(self) -> "SessionRunner":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self._config.max_concurrent_turns)]
+
+    async def stop(self) -> None:
+        """Cancel the workers. Running and queued turns fail with CancelledError."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for session in self._sessions.values():
+            for turn in session.turns:
+                turn._finish(asyncio.CancelledError())
+        self._sessions.clear()
+        self._ready.clear()
+        self._queued = 0
+
+    async def submit(self, agent: AgentWithTools, message: Optional[ChatMessage] = None) -> Turn:
+        """Queue a turn, waiting for space if the queue is full."""
+        async with self._space_changed:
+            await self._space_changed.wait_for(lambda: self._queued < self._config.max_queued_turns)
+        return await self._enqueue(agent, message)
+
+    async def submit_nowait(self, agent: AgentWithTools, message: Optional[ChatMessage] = None) -> Turn:
+        """Queue a turn, raising `asyncio.QueueFull` if the queue is full."""
+        if self._queued >= self._config.max_queued_turns:
+            raise asyncio.QueueFull()
+        return await self._enqueue(agent, message)
+
+    def stats(self) -> SessionRunnerStats:
+        waits = sorted(self._wait_times)
+        return SessionRunnerStats(
+            queued=self._queued,
+            running=self._running,
+            completed=self._completed,
+            failed=self._failed,
+            max_queue_depth=self._max_queue_depth,
+            mean_wait=sum(waits) / len(waits) if waits else 0.0,
+            p50_wait=_percentile(waits, 0.5),
+            p95_wait=_percentile(waits, 0.95),
+            max_wait=waits[-1] if waits else 0.0,
+        )
+
+    async def _enqueue(self, agent: AgentWithTools, message: Optional[ChatMessage]) -> Turn:
+        turn = Turn(agent, message)
+        session = self._sessions.get(id(agent))
+        if session is None:
+            session = self._sessions[id(agent)] = _Session()
+        session.turns.append(turn)
+        self._queued += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._queued)
+        if not session.running and len(session.turns) == 1:
+            async with self._ready_changed:
+                self._ready.append(session)
+                self._ready_changed.notify()
+        return turn
+
+    async def _work(self) -> None:
+        while True:
+            async with self._ready_changed:
+                await self._ready_changed.wait_for(lambda: bool(self._ready))
+                session = self._ready.popleft()
+            turn = session.turns.popleft()
+            session.running = True
+            self._queued -= 1
+            async with self._space_changed:
+                self._space_changed.notify()
+
+            await self._run(turn)
+
+            session.running = False
+            if session.turns:
+                async with self._ready_changed:
+                    self._ready.append(session)
+                    self._ready_changed.notify()
+            else:
+                self._sessions.pop(id(turn.agent), None)
+
+    async def _run(self, turn: Turn) -> None:
+        turn.started_at = time.monotonic()
+        self._wait_times.append(turn.wait_time)
+        self._running += 1
+        try:
+            async for chunk in turn.agent.astream(turn.message, coalesce=self._config.coalesce):
+                turn._push(chunk)
+        except asyncio.CancelledError as e:
+            turn._finish(e)
+            raise
+        except Exception as e:
+            self._failed += 1
+            turn._finish(e)
+        else:
+            self._completed += 1
+            turn._finish()
+        finally:
+            self._running -= 1
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
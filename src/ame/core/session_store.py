@@ -0,0 +1,266 @@
+import json
+import mmap
+import operator
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import Any, BinaryIO, Deque, Dict, List, Optional
+
+from ame.core.chat_context import ChatMessage, dump_message, validate_message
+from ame.core.context import ContextManager
+from ame.core.serialization import from_jsonable, to_jsonable
+
+_SESSION_ID = re.compile(r"[A-Za-z0-9_\-][A-Za-z0-9_.\-]*")
+
+# Record types. A snapshot holds the whole history; an append adds one message and then drops `drop`
+# messages after the system message; a system record replaces the system message's content; a replace
+# record replaces the message at `index`, such as with a stub of an expired tool output.
+_SNAPSHOT = "snapshot"
+_APPEND = "append"
+_SYSTEM = "system"
+_REPLACE = "replace"
+
+
+class SessionLog:
+    """Append-only JSON Lines log of one session's history.
+
+    Every record is one line. Loading scans the file backwards from the end with mmap, to the latest
+    snapshot, so resuming costs the size of the current history window and the records written since
+    the snapshot, not the whole conversation.
+    """
+
+    def __init__(self, path: Path, snapshot_every: int = 1000, compact_bytes: int = 16 * 1024 * 1024, fsync: bool = False) -> None:
+        self.path = path
+        # Append records written before a snapshot is forced, bounding the work of a resume
+        self.snapshot_every = snapshot_every
+        # At a snapshot, rewrite the log as just that snapshot once it has grown past this size
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self._file: Optional[BinaryIO] = None
+        self._since_snapshot: Optional[int] = None
+
+    def needs_snapshot(self) -> bool:
+        if self._since_snapshot is None:
+            # Unknown until the log is loaded or written; a new or unread log starts with a snapshot
+            return True
+        return self._since_snapshot >= self.snapshot_every
+
+    def write_snapshot(self, messages: List[ChatMessage]) -> None:
+        record = {"type": _SNAPSHOT, "messages": [_dump(m) for m in messages]}
+        if self.path.exists() and self.path.stat().st_size > self.compact_bytes:
+            self._compact(record)
+        else:
+            self._write(record)
+        self._since_snapshot = 0
+
+    def append(self, message: ChatMessage, drop: int) -> None:
+        self._write_update({"type": _APPEND, "message": _dump(message), "drop": drop})
+
+    def replace_system(self, content: str) -> None:
+        self._write_update({"type": _SYSTEM, "content": content})
+
+    def replace(self, index: int, message: ChatMessage) -> None:
+        self._write_update({"type": _REPLACE, "index": index, "message": _dump(message)})
+
+    def load(self) -> Optional[List[ChatMessage]]:
+        """The history as of the last record, or None if the log has no snapshot yet."""
+        records = self._tail_records()
+        if records is None:
+            return None
+        snapshot, *updates = records
+        system, *rest = snapshot["messages"]
+        # Replayed on the raw records, so only the messages that survive are validated
+        window = deque(rest)
+        for record in updates:
+            if record["type"] == _APPEND:
+                window.append(record["message"])
+                for _ in range(record["drop"]):
+                    window.popleft()
+            elif record["type"] == _SYSTEM:
+                system = {**system, "content": record["content"]}
+            elif record["type"] == _REPLACE:
+                window[record["index"] - 1] = record["message"]
+        self._since_snapshot = len(updates)
+        return [_load(system), *map(_load, window)]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def delete(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self._since_snapshot = None
+
+    def _tail_records(self) -> Optional[List[Dict[str, Any]]]:
+        """The latest snapshot record and every record after it, in order."""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return None
+        records: List[Dict[str, Any]] = []
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = len(data)
+            while end > 0:
+                start = data.rfind(b"\n", 0, end - 1) + 1
+                line = data[start:end]
+                end = start
+                if not line.endswith(b"\n"):
+                    # A record cut short by a crash mid-write
+                    continue
+                record = json.loads(line)
+                records.append(record)
+                if record["type"] == _SNAPSHOT:
+                    records.reverse()
+                    return records
+        return None
+
+    def _write_update(self, record: Dict[str, Any]) -> None:
+        if self._since_snapshot is None:
+            # Updates only make sense on top of a history this log knows
+            raise RuntimeError(f"Load {self.path} or write a snapshot to it before updating it")
+        self._write(record)
+        self._since_snapshot += 1
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            if self._file.tell() > 0:
+                self._truncate_partial_record()
+        self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _truncate_partial_record(self) -> None:
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            complete = data.rfind(b"\n") + 1
+            size = len(data)
+        if complete < size:
+            self._file.truncate(complete)
+
+    def _compact(self, snapshot: Dict[str, Any]) -> None:
+        self.close()
+        temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(temporary, "wb") as f:
+            f.write(json.dumps(snapshot, separators=(",", ":")).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+
+class SessionStore:
+    """A directory of session logs, one `<session_id>.jsonl` file per session."""
+
+    def __init__(self, directory: str | Path, snapshot_every: int = 1000, compact_bytes: int = 16 * 1024 * 1024, fsync: bool = False) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+
+    def open(self, session_id: str) -> SessionLog:
+        return SessionLog(self._path(session_id), self.snapshot_every, self.compact_bytes, self.fsync)
+
+    def exists(self, session_id: str) -> bool:
+        return self._path(session_id).exists()
+
+    def session_ids(self) -> List[str]:
+        return sorted(p.stem for p in self.directory.glob("*.jsonl"))
+
+    def _path(self, session_id: str) -> Path:
+        if not _SESSION_ID.fullmatch(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return self.directory / f"{session_id}.jsonl"
+
+
+class PersistentContextManager(ContextManager):
+    """Wraps a context manager to record every change it makes to the history in a `SessionLog`.
+
+    New messages, front trims and replaced messages are appended as small records. Any other change,
+    such as a new summary message, is written as a snapshot of the whole history, as is the history every
+    `snapshot_every` records. Resume a session with:
+
+        messages = context_manager.load()
+        if messages is not None:
+            agent.restore_history(messages)
+    """
+
+    def __init__(self, log: SessionLog, inner: ContextManager) -> None:
+        self.log = log
+        self.inner = inner
+        # The history after the system message as of the last record, by reference, to tell
+        # front trims apart from other changes without comparing the whole history
+        self._window: Deque[ChatMessage] = deque()
+        self._system_content: Optional[str] = None
+
+    def load(self) -> Optional[List[ChatMessage]]:
+        """The logged history, as `SessionLog.load`. Restoring it as it is writes nothing to the log."""
+        messages = self.log.load()
+        if messages is not None:
+            self._window = deque(messages[1:])
+            self._system_content = messages[0].content
+        return messages
+
+    async def add(self, messages: List[ChatMessage], message: ChatMessage) -> None:
+        length = len(messages)
+        await self.inner.add(messages, message)
+        drop = length + 1 - len(messages)
+
+        window = self._window
+        window.append(message)
+        front_trim = 0 <= drop < len(window) and messages[-1] is message
+        if front_trim:
+            for _ in range(drop):
+                window.popleft()
+            front_trim = len(messages) == 1 + len(window) and messages[1] is window[0]
+
+        if not front_trim or self.log.needs_snapshot():
+            self._write_snapshot(messages)
+            return
+        if messages[0].content is not self._system_content:
+            self._system_content = messages[0].content
+            self.log.replace_system(messages[0].content)
+        self.log.append(message, drop)
+
+    def restore(self, messages: List[ChatMessage]) -> None:
+        self.inner.restore(messages)
+        unchanged = (
+            messages[0].content is self._system_content
+            and len(messages) == 1 + len(self._window)
+            and all(map(operator.is_, messages[1:], self._window))
+        )
+        if not unchanged or self.log.needs_snapshot():
+            self._write_snapshot(messages)
+
+    def replaced(self, messages: List[ChatMessage], index: int, previous: ChatMessage) -> None:
+        self.inner.replaced(messages, index, previous)
+        window = self._window
+        tracked = (
+            0 < index <= len(window)
+            and window[index - 1] is previous
+            and len(messages) == 1 + len(window)
+            and messages[0].content is self._system_content
+        )
+        if not tracked or self.log.needs_snapshot():
+            self._write_snapshot(messages)
+            return
+        window[index - 1] = messages[index]
+        self.log.replace(index, messages[index])
+
+    def fork(self) -> ContextManager:
+        # Branches aren't logged. Merging one back restores this manager, which snapshots the result.
+        return self.inner.fork()
+
+    def _write_snapshot(self, messages: List[ChatMessage]) -> None:
+        self.log.write_snapshot(messages)
+        self._window = deque(messages[1:])
+        self._system_content = messages[0].content
+
+
+def _dump(message: ChatMessage) -> Dict[str, Any]:
+    return to_jsonable(dump_message(message, exclude_none=True))
+
+
+def _load(data: Dict[str, Any]) -> ChatMessage:
+    return validate_message(from_jsonable(data))
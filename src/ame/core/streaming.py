@@ -0,0 +1,130 @@
+import asyncio
+import contextlib
+from typing import AsyncGenerator, AsyncIterator, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+from ame.core.tools import ToolCall
+
+_END = object()
+# Chunks read ahead of the consumer when coalescing with a time limit
+_READ_AHEAD = 64
+
+
+class CoalesceOptions(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Flush once this many characters of text are buffered
+    max_chars: int = 256
+    # Flush text that has been buffered for this many seconds, even if the LLM is quiet. None flushes
+    # on size, before tool calls and at the end only.
+    max_delay: Optional[float] = 0.05
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+async def coalesce_text(
+    stream: AsyncIterator[str | ToolCall], options: CoalesceOptions
+) -> AsyncGenerator[str | ToolCall]:
+    """Merge consecutive text chunks of `stream` into fewer, larger chunks.
+
+    Buffered text is flushed when it reaches `max_chars`, when it gets older than `max_delay`, right
+    before a tool call and at the end of the stream. Tool calls are passed through in order.
+    """
+    if options.max_delay is None:
+        buffer: List[str] = []
+        size = 0
+        try:
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    if isinstance(chunk, ToolCall):
+                        if buffer:
+                            yield "".join(buffer)
+                            buffer.clear()
+                            size = 0
+                        yield chunk
+                        continue
+                    buffer.append(chunk)
+                    size += len(chunk)
+                    if size >= options.max_chars:
+                        yield "".join(buffer)
+                        buffer.clear()
+                        size = 0
+        except Exception:
+            # Text received before an error is still delivered, as it would be without coalescing
+            if buffer:
+                yield "".join(buffer)
+            raise
+        if buffer:
+            yield "".join(buffer)
+        return
+
+    # The stream is read by a separate task, so buffered text can be flushed while waiting for the
+    # next chunk. A single task reads it from start to end, as provider streams expect.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_READ_AHEAD)
+    reader = asyncio.create_task(_read(stream, queue))
+    loop = asyncio.get_running_loop()
+    buffer = []
+    size = 0
+    deadline = 0.0
+    try:
+        while True:
+            if buffer:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await queue.get()
+                except TimeoutError:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    size = 0
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                if buffer:
+                    yield "".join(buffer)
+                raise item.error
+            if isinstance(item, ToolCall):
+                if buffer:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    size = 0
+                yield item
+                continue
+            if not buffer:
+                deadline = loop.time() + options.max_delay
+            buffer.append(item)
+            size += len(item)
+            if size >= options.max_chars:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        reader.cancel()
+        try:
+            await reader
+        except asyncio.CancelledError:
+            # The reader's own cancellation, unless this task is being cancelled too
+            if asyncio.current_task().cancelling():
+                raise
+
+
+async def _read(stream: AsyncIterator[str | ToolCall], queue: asyncio.Queue) -> None:
+    try:
+        async with contextlib.aclosing(stream):
+            async for chunk in stream:
+                await queue.put(chunk)
+    except Exception as e:
+        await queue.put(_Failure(e))
+        return
+    await queue.put(_END)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from ame.core.tools import Tool, ToolCacheOptions
+
+
+class ToolCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    # Calls that waited for an identical call already in flight instead of running the tool
+    deduplicated: int = 0
+
+
+class _InFlight:
+    """A running call of the tool, and how many callers are waiting for its result."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future[str]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class ToolResultCache:
+    """LRU cache of one tool's results, with optional TTL and de-duplication of concurrent identical calls."""
+
+    def __init__(self, options: ToolCacheOptions) -> None:
+        self.options = options
+        self.stats = ToolCacheStats()
+        # key -> (expiry time, result)
+        self._results: OrderedDict[Hashable, Tuple[float, str]] = OrderedDict()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+
+    def key(self, tool: Tool, args: Dict[str, Any]) -> Hashable:
+        try:
+            validated = tool.input_schema.model_validate(args).model_dump(mode="json")
+        except ValidationError:
+            # The call will fail in the tool itself; don't let the key hide that
+            validated = args
+        if self.options.key is not None:
+            return self.options.key(validated)
+        return json.dumps(validated, sort_keys=True, default=str)
+
+    async def get_or_run(self, key: Hashable, run: Callable[[], Awaitable[str]]) -> str:
+        entry = self._results.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._results.move_to_end(key)
+                self.stats.hits += 1
+                return entry[1]
+            del self._results[key]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.stats.deduplicated += 1
+        else:
+            self.stats.misses += 1
+            # Run as a separate task, so a cancelled caller doesn't cancel the calls waiting on the same result
+            in_flight = self._in_flight[key] = _InFlight(asyncio.ensure_future(self._run_and_store(key, run)))
+            in_flight.task.add_done_callback(lambda t: self._finish(key, in_flight))
+
+        in_flight.waiters += 1
+        try:
+            return await asyncio.shield(in_flight.task)
+        finally:
+            in_flight.waiters -= 1
+            if not in_flight.waiters and not in_flight.task.done():
+                # Every caller was cancelled, so nobody needs the result
+                in_flight.task.cancel()
+                self._forget(key, in_flight)
+
+    async def _run_and_store(self, key: Hashable, run: Callable[[], Awaitable[str]]) -> str:
+        result = await run()
+        self._store(key, result)
+        return result
+
+    def _finish(self, key: Hashable, in_flight: _InFlight) -> None:
+        self._forget(key, in_flight)
+        if not in_flight.task.cancelled():
+            # Mark the exception retrieved in case every caller was cancelled
+            in_flight.task.exception()
+
+    def _forget(self, key: Hashable, in_flight: _InFlight) -> None:
+        if self._in_flight.get(key) is in_flight:
+            del self._in_flight[key]
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def _store(self, key: Hashable, result: str) -> None:
+        expiry = time.monotonic() + self.options.ttl if self.options.ttl is not None else float("inf")
+        self._results[key] = (expiry, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.options.max_entries:
+            self._results.popitem(last=False)
+
+
+_process_caches: Dict[Callable, ToolResultCache] = {}
+
+
+def process_tool_cache(func: Callable, options: ToolCacheOptions) -> ToolResultCache:
+    """The process-wide cache for the tool function `func`."""
+    cache = _process_caches.get(func)
+    if cache is None:
+        cache = _process_caches[func] = ToolResultCache(options)
+    return cache
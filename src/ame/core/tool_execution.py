@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from ame.core.tools import ToolExecution, ToolOptions
+from ame.core.tracing import TOOL_DURATION, TOOL_EXECUTE, TOOL_QUEUE_TIME, Span, get_tracer
+
+# Process-wide executors and limits, shared by every agent. Created on first use.
+_max_threads: Optional[int] = None
+_max_processes: Optional[int] = None
+_max_concurrent_calls: Optional[int] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+# Semaphores bind to the event loop they are first contended on, so each loop gets its own:
+# loop -> tool function (None for the process-wide cap) -> semaphore
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Optional[Callable], asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool call ran longer than its `ToolOptions.timeout`."""
+
+    def __init__(self, name: str, timeout: float) -> None:
+        super().__init__(f"the {name} tool call didn't finish within {timeout} seconds")
+        self.timeout = timeout
+
+
+def configure_tool_execution(
+    max_threads: Optional[int] = None,
+    max_processes: Optional[int] = None,
+    max_concurrent_calls: Optional[int] = None,
+) -> None:
+    """Size the shared tool executors and cap the tool calls running at once across the process.
+
+    Call before the first tool runs; executors that already exist are shut down and recreated lazily.
+    """
+    global _max_threads, _max_processes, _max_concurrent_calls
+    shutdown_tool_executors(wait=False)
+    _max_threads = max_threads
+    _max_processes = max_processes
+    _max_concurrent_calls = max_concurrent_calls
+    for semaphores in _semaphores.values():
+        semaphores.pop(None, None)
+
+
+def shutdown_tool_executors(wait: bool = True) -> None:
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=wait)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait)
+        _process_pool = None
+
+
+def resolve_execution(func: Callable, options: ToolOptions) -> ToolExecution:
+    if options.execution is not None:
+        return options.execution
+    return ToolExecution.ASYNC if inspect.iscoroutinefunction(func) else ToolExecution.THREAD
+
+
+async def run_tool(
+    func: Callable,
+    instance: Any,
+    args: Dict[str, Any],
+    options: ToolOptions,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    parent_span: Optional[Span] = None,
+) -> Any:
+    """Run the tool function `func` for `instance`, applying its execution mode, timeout and limits.
+
+    `semaphore` is an extra concurrency limit from the caller, such as an agent's own. The timeout
+    covers the call itself, not the time spent waiting for a concurrency slot, and raises `ToolTimeoutError`. Timed out THREAD and
+    PROCESS calls are abandoned rather than killed, and keep their worker until they return.
+    """
+    tracer = get_tracer()
+    if not tracer.enabled:
+        async with _tool_slot(func, options, semaphore):
+            return await _call(func, instance, args, options)
+
+    attributes = {"tool": func.__name__}
+    span = tracer.start_span(TOOL_EXECUTE, attributes, parent_span)
+    queued = time.perf_counter()
+    try:
+        async with _tool_slot(func, options, semaphore):
+            started = time.perf_counter()
+            tracer.record(TOOL_QUEUE_TIME, started - queued, attributes)
+            try:
+                return await _call(func, instance, args, options)
+            finally:
+                tracer.record(TOOL_DURATION, time.perf_counter() - started, attributes)
+    except BaseException as e:
+        span.set_attribute("error", type(e).__name__)
+        raise
+    finally:
+        span.end()
+
+
+async def _call(func: Callable, instance: Any, args: Dict[str, Any], options: ToolOptions) -> Any:
+    call = _start_call(func, instance, args, resolve_execution(func, options))
+    if options.timeout is None:
+        return await call
+    try:
+        async with asyncio.timeout(options.timeout) as timeout:
+            return await call
+    except TimeoutError:
+        # Told apart from a TimeoutError the tool raised itself
+        if timeout.expired():
+            raise ToolTimeoutError(func.__name__, options.timeout) from None
+        raise
+
+
+def _start_call(func: Callable, instance: Any, args: Dict[str, Any], execution: ToolExecution) -> Any:
+    if execution == ToolExecution.ASYNC:
+        return func(instance, **args)
+    loop = asyncio.get_running_loop()
+    if execution == ToolExecution.THREAD:
+        return loop.run_in_executor(_get_thread_pool(), functools.partial(func, instance, **args))
+    return loop.run_in_executor(_get_process_pool(), functools.partial(func, None, **args))
+
+
+@contextlib.asynccontextmanager
+async def _tool_slot(func: Callable, options: ToolOptions, semaphore: Optional[asyncio.Semaphore]) -> AsyncIterator[None]:
+    async with contextlib.AsyncExitStack() as stack:
+        if semaphore is not None:
+            await stack.enter_async_context(semaphore)
+        if options.max_concurrency is not None:
+            await stack.enter_async_context(_get_semaphore(func, options.max_concurrency))
+        if _max_concurrent_calls is not None:
+            await stack.enter_async_context(_get_semaphore(None, _max_concurrent_calls))
+        yield
+
+
+def _get_semaphore(func: Optional[Callable], limit: int) -> asyncio.Semaphore:
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get(func)
+    if semaphore is None:
+        semaphore = semaphores[func] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def _get_thread_pool() -> Executor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_max_threads, thread_name_prefix="ame-tool")
+    return _thread_pool
+
+
+def _get_process_pool() -> Executor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=_max_processes)
+    return _process_pool
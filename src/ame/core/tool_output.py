@@ -0,0 +1,142 @@
+import atexit
+import dataclasses
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import ToolCall, ToolOutputOptions, Truncation
+from ame.llms.tokens import DEFAULT_TOKEN_COUNTER, TokenCounter
+
+# ToolCall.metadata key holding the handle of a spilled output
+HANDLE_METADATA_KEY = "tool_output_handle"
+STUB_PREFIX = "[Output removed from history"
+
+
+class ToolOutputStore:
+    """Full tool outputs saved to disk, one file per distinct output, addressed by a content hash handle."""
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def put(self, output: str) -> str:
+        handle = "out_" + hashlib.sha256(output.encode()).hexdigest()[:16]
+        path = self._path(handle)
+        if not path.exists():
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(output, encoding="utf-8")
+            temporary.replace(path)
+        return handle
+
+    def read(self, handle: str, offset: int = 0, length: Optional[int] = None) -> str:
+        text = self._path(handle).read_text(encoding="utf-8")
+        return text[offset:offset + length] if length is not None else text[offset:]
+
+    def size(self, handle: str) -> int:
+        return len(self._path(handle).read_text(encoding="utf-8"))
+
+    def clear(self) -> None:
+        for path in self.directory.glob("out_*.txt"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, handle: str) -> Path:
+        if not handle.startswith("out_") or not handle[4:].isalnum():
+            raise ValueError(f"Invalid tool output handle: {handle!r}")
+        return self.directory / f"{handle}.txt"
+
+
+_default_store: Optional[ToolOutputStore] = None
+
+
+def default_tool_output_store() -> ToolOutputStore:
+    """A process-wide store in a temporary directory, removed when the process exits."""
+    global _default_store
+    if _default_store is None:
+        directory = tempfile.mkdtemp(prefix="ame-tool-outputs-")
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        _default_store = ToolOutputStore(directory)
+    return _default_store
+
+
+def truncate_output(
+    output: str,
+    options: ToolOutputOptions,
+    handle: Optional[str] = None,
+    counter: TokenCounter = DEFAULT_TOKEN_COUNTER,
+) -> str:
+    """`output` cut down to `options.max_tokens` tokens as counted by `counter`, such as the agent's LLM's
+    `token_counter`, with a note on what was left out."""
+    if options.max_tokens is None:
+        return output
+    tokens = counter.count_text(output)
+    if tokens <= options.max_tokens:
+        return output
+    # Characters to keep, at the output's own ratio of characters to tokens
+    keep = len(output) * options.max_tokens // tokens
+    if options.truncation == Truncation.HEAD:
+        head_chars, tail_chars = keep, 0
+    elif options.truncation == Truncation.TAIL:
+        head_chars, tail_chars = 0, keep
+    else:
+        head_chars, tail_chars = keep // 2, keep - keep // 2
+    # Sliced from the end by index, as output[-0:] would be the whole output
+    head, tail = output[:head_chars], output[len(output) - tail_chars:]
+
+    omitted = len(output) - len(head) - len(tail)
+    note = f"[{omitted} of {len(output)} characters omitted"
+    if handle is not None:
+        note += (
+            f". The full output is saved as {handle}: call read_tool_output with this handle and a "
+            f"character offset to read any part of it"
+        )
+    note += "]"
+    return "\n".join(part for part in (head, note, tail) if part)
+
+
+def expire_tool_outputs(
+    messages: List[ChatMessage],
+    keep_turns: Dict[str, int],
+    counter: TokenCounter = DEFAULT_TOKEN_COUNTER,
+) -> List[Tuple[int, ChatMessage]]:
+    """Replace outputs of the tools in `keep_turns` that are more than that many user turns old with stubs,
+    which give their size in tokens as counted by `counter`.
+
+    Messages are replaced rather than modified, since converted histories are cached by message
+    identity. Returns the index and previous message of each message replaced.
+    """
+    replaced: List[Tuple[int, ChatMessage]] = []
+    turns = 0
+    for i in range(len(messages) - 1, 0, -1):
+        message = messages[i]
+        if message.role == ChatRole.USER and isinstance(message.content, str):
+            turns += 1
+            continue
+        if not isinstance(message.content, list):
+            continue
+        if not any(
+            tc.name in keep_turns and turns > keep_turns[tc.name] and not _is_stub(tc) for tc in message.content
+        ):
+            continue
+        messages[i] = ChatMessage(role=message.role, content=[
+            _stub(tc, counter) if tc.name in keep_turns and turns > keep_turns[tc.name] and not _is_stub(tc) else tc
+            for tc in message.content
+        ])
+        replaced.append((i, message))
+    return replaced
+
+
+def _is_stub(tool_call: ToolCall) -> bool:
+    return tool_call.response is None or tool_call.response.startswith(STUB_PREFIX)
+
+
+def _stub(tool_call: ToolCall, counter: TokenCounter) -> ToolCall:
+    stub = f"{STUB_PREFIX} to save context; it was about {counter.count_text(tool_call.response)} tokens"
+    handle = (tool_call.metadata or {}).get(HANDLE_METADATA_KEY)
+    if handle is not None:
+        stub += f". The full output is saved as {handle} and can be read with read_tool_output"
+    else:
+        stub += ". Call the tool again if it is needed"
+    return dataclasses.replace(tool_call, response=stub + "]")
@@ -1,14 +1,114 @@
-from typing import Any, Dict, Optional, Type
-from pydantic import BaseModel
+from dataclasses import dataclass
+from enum import Enum
+from functools import cache
+from typing import Any, Callable, Dict, Hashable, Optional, Type, TypeVar
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, TypeAdapter
+
+T = TypeVar("T")
+
+
+class ToolExecution(Enum):
+    # Awaited on the event loop. Only for coroutines that don't block.
+    ASYNC = "ASYNC"
+    # Run in the shared thread pool, for blocking I/O such as subprocesses or sync clients.
+    THREAD = "THREAD"
+    # Run in the shared process pool, for CPU-heavy work. The tool is called with `self=None`, so it
+    # can't use the agent, and it must be importable by qualified name with picklable args and result.
+    PROCESS = "PROCESS"
+
+
+class ToolCacheScope(Enum):
+    # Results are shared by calls from the same agent
+    AGENT = "AGENT"
+    # Results are shared by calls from every agent in the process
+    PROCESS = "PROCESS"
+
+
+class ToolCacheOptions(BaseModel):
+    """Memoization of a tool's results by its arguments. Only for tools whose result depends on nothing else."""
+    model_config = ConfigDict(frozen=True)
+
+    scope: ToolCacheScope = ToolCacheScope.AGENT
+    max_entries: int = 1024
+    # Seconds a result stays valid
+    ttl: Optional[float] = None
+    # Cache key for the arguments, after validation against the tool's input schema. Defaults to their
+    # canonical JSON.
+    key: Optional[Callable[[Dict[str, Any]], Hashable]] = None
+
+
+class Truncation(Enum):
+    # Keep the start of the output
+    HEAD = "HEAD"
+    # Keep the end of the output, such as the last lines of a log or a command's final error
+    TAIL = "TAIL"
+    # Keep the start and the end
+    HEAD_AND_TAIL = "HEAD_AND_TAIL"
+
+
+class InterruptPolicy(Enum):
+    # Cancel the call. THREAD and PROCESS calls that already started keep their worker until they
+    # return, but their result is discarded.
+    CANCEL = "CANCEL"
+    # Let the call finish in the background, for tools whose side effects shouldn't be cut short, such as
+    # sending a message. Its result is discarded.
+    DETACH = "DETACH"
+
+
+class ToolOutputOptions(BaseModel):
+    """Limits on how much of a tool's output is kept in the agent's history and sent to the LLM."""
+    model_config = ConfigDict(frozen=True)
+
+    # Outputs over this many tokens, as the agent's LLM's `token_counter` counts them, are truncated; 0
+    # keeps only the note on what was left out
+    max_tokens: Optional[int] = Field(default=None, ge=0)
+    truncation: Truncation = Truncation.HEAD_AND_TAIL
+    # Save the full output of truncated calls to the agent's `ToolOutputStore`, and let the LLM page
+    # through it with the built-in `read_tool_output` tool
+    spill: bool = False
+    # Replace the output in the history with a short stub once it is more than this many user turns old
+    keep_turns: Optional[int] = None
+
+
+class ToolOptions(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # Defaults to ASYNC for coroutine functions and THREAD otherwise
+    execution: Optional[ToolExecution] = None
+    # Seconds a single call may run before it fails with `ToolTimeoutError`, which agents give the LLM as
+    # the call's result
+    timeout: Optional[float] = None
+    # Calls of this tool allowed to run at once across the whole process
+    max_concurrency: Optional[int] = None
+    cache: Optional[ToolCacheOptions] = None
+    output: Optional[ToolOutputOptions] = None
+    # What happens to an unfinished call when the agent's turn is interrupted or abandoned
+    on_interrupt: InterruptPolicy = InterruptPolicy.CANCEL
 
 
 class Tool(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     name: str
     description: str
     input_schema: Type[BaseModel]
+    options: ToolOptions = ToolOptions()
 
+    # Provider request payloads (tool definitions) built from this tool, keyed by provider name
+    _payloads: Dict[str, Any] = PrivateAttr(default_factory=dict)
 
-class ToolCall(BaseModel):
+    def payload(self, provider: str, build: Callable[["Tool"], T]) -> T:
+        """Return `build(self)`, built once per provider. The result is shared, so don't modify it."""
+        payload = self._payloads.get(provider)
+        if payload is None:
+            payload = self._payloads[provider] = build(self)
+        return payload
+
+
+# A slotted dataclass like `ChatMessage`, for the same reason: adapters create one per streamed call.
+# Use `validate_tool_call` for untyped data.
+@dataclass(slots=True, kw_only=True)
+class ToolCall:
     id: str
     name: str
     args: Optional[Dict[str, Any]] = None
@@ -16,9 +116,49 @@ class ToolCall(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
-def tool(func):
-    func.is_tool = True
-    return func
+@cache
+def _tool_call_adapter() -> TypeAdapter[ToolCall]:
+    return TypeAdapter(ToolCall)
+
+
+def validate_tool_call(data: Any) -> ToolCall:
+    return _tool_call_adapter().validate_python(data)
+
+
+def dump_tool_call(tool_call: ToolCall, exclude_none: bool = False) -> Dict[str, Any]:
+    return _tool_call_adapter().dump_python(tool_call, exclude_none=exclude_none)
+
+
+def tool(
+    func: Optional[Callable] = None,
+    *,
+    execution: Optional[ToolExecution] = None,
+    timeout: Optional[float] = None,
+    max_concurrency: Optional[int] = None,
+    cache: ToolCacheOptions | bool | None = None,
+    output: Optional[ToolOutputOptions] = None,
+    on_interrupt: InterruptPolicy = InterruptPolicy.CANCEL,
+):
+    """Mark an agent method as a tool. Use as `@tool`, or `@tool(...)` to set its `ToolOptions`.
+
+    `cache=True` memoizes results with the default `ToolCacheOptions`.
+    """
+    if cache is True:
+        cache = ToolCacheOptions()
+
+    def decorate(func: Callable) -> Callable:
+        func.is_tool = True
+        func.tool_options = ToolOptions(
+            execution=execution,
+            timeout=timeout,
+            max_concurrency=max_concurrency,
+            cache=cache or None,
+            output=output,
+            on_interrupt=on_interrupt,
+        )
+        return func
+
+    return decorate(func) if func is not None else decorate
 
 
 # class User(BaseModel):
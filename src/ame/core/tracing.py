@@ -0,0 +1,175 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+Attributes = Dict[str, Any]
+
+# Span names
+AGENT_TURN = "agent.turn"
+AGENT_STEP = "agent.step"
+LLM_REQUEST = "llm.request"
+TOOL_EXECUTE = "tool.execute"
+
+# Metric names. Durations are in seconds.
+LLM_TIME_TO_FIRST_TOKEN = "llm.time_to_first_token"
+LLM_INTER_TOKEN_GAP = "llm.inter_token_gap"
+LLM_HISTORY_CONVERSION = "llm.history_conversion"
+LLM_INPUT_TOKENS = "llm.tokens.input"
+LLM_OUTPUT_TOKENS = "llm.tokens.output"
+LLM_CACHE_READ_TOKENS = "llm.tokens.cache_read"
+LLM_CACHE_CREATION_TOKENS = "llm.tokens.cache_creation"
+TOOL_QUEUE_TIME = "tool.queue_time"
+TOOL_DURATION = "tool.duration"
+
+
+class Span(ABC):
+    @abstractmethod
+    def set_attribute(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def end(self) -> None:
+        ...
+
+
+class Tracer(ABC):
+    """Receives the spans and metrics emitted by agents and LLM adapters. Install one with `set_tracer`."""
+
+    # Instrumentation skips timing work entirely when this is False
+    enabled = True
+
+    @abstractmethod
+    def start_span(self, name: str, attributes: Optional[Attributes] = None, parent: Optional[Span] = None) -> Span:
+        ...
+
+    @abstractmethod
+    def record(self, name: str, value: float, attributes: Optional[Attributes] = None) -> None:
+        ...
+
+
+class _NoopSpan(Span):
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class NoopTracer(Tracer):
+    enabled = False
+
+    def start_span(self, name: str, attributes: Optional[Attributes] = None, parent: Optional[Span] = None) -> Span:
+        return _NOOP_SPAN
+
+    def record(self, name: str, value: float, attributes: Optional[Attributes] = None) -> None:
+        pass
+
+
+_tracer: Tracer = NoopTracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """Install `tracer` process-wide, or disable tracing with None."""
+    global _tracer
+    _tracer = tracer if tracer is not None else NoopTracer()
+
+
+class MetricSummary(BaseModel):
+    count: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = float("-inf")
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _AggregatedSpan(Span):
+    __slots__ = ("_aggregator", "_name", "_start")
+
+    def __init__(self, aggregator: "MetricsAggregator", name: str) -> None:
+        self._aggregator = aggregator
+        self._name = name
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        self._aggregator.record(self._name, time.perf_counter() - self._start)
+
+
+class MetricsAggregator(Tracer):
+    """In-process tracer keeping count, total, min and max per metric. Span durations are recorded under
+    the span name. Attributes are ignored."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, MetricSummary] = {}
+
+    def start_span(self, name: str, attributes: Optional[Attributes] = None, parent: Optional[Span] = None) -> Span:
+        return _AggregatedSpan(self, name)
+
+    def record(self, name: str, value: float, attributes: Optional[Attributes] = None) -> None:
+        summary = self.metrics.get(name)
+        if summary is None:
+            summary = self.metrics[name] = MetricSummary()
+        summary.count += 1
+        summary.total += value
+        if value < summary.min:
+            summary.min = value
+        if value > summary.max:
+            summary.max = value
+
+    def reset(self) -> None:
+        self.metrics.clear()
+
+
+class _OpenTelemetrySpan(Span):
+    __slots__ = ("span",)
+
+    def __init__(self, span: Any) -> None:
+        self.span = span
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.span.set_attribute(key, value)
+
+    def end(self) -> None:
+        self.span.end()
+
+
+class OpenTelemetryTracer(Tracer):
+    """Exports spans and metrics through the OpenTelemetry API. Requires the `otel` extra.
+
+    Metrics are recorded as histograms. Without explicit `tracer` and `meter`, the globally configured
+    OpenTelemetry providers are used.
+    """
+
+    def __init__(self, tracer: Any = None, meter: Any = None) -> None:
+        try:
+            from opentelemetry import metrics, trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryTracer requires the `otel` extra: pip install agents-made-easy[otel]") from e
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("ame")
+        self._meter = meter or metrics.get_meter("ame")
+        self._histograms: Dict[str, Any] = {}
+
+    def start_span(self, name: str, attributes: Optional[Attributes] = None, parent: Optional[Span] = None) -> Span:
+        context = self._trace.set_span_in_context(parent.span) if isinstance(parent, _OpenTelemetrySpan) else None
+        return _OpenTelemetrySpan(self._tracer.start_span(name, context=context, attributes=attributes))
+
+    def record(self, name: str, value: float, attributes: Optional[Attributes] = None) -> None:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = self._meter.create_histogram(name)
+        histogram.record(value, attributes=attributes)
@@ -1,10 +1,22 @@
+import subprocess
+
 from ame.core.agent_with_tools import AgentWithTools
+from ame.core.tools import ToolExecution, ToolOutputOptions, tool
+from ame.llms.llm import LLM
 
 class AgentWithFilesystem(AgentWithTools):
-    def __init__(self, root_file_path: str) -> None:
+    def __init__(self, llm: LLM, root_file_path: str) -> None:
+        super().__init__(llm, instructions=f"You can run bash commands in {root_file_path}.")
         self.root_file_path = root_file_path
 
-    @tool
+    # subprocess.run blocks, so run it in the thread pool instead of on the event loop. Long outputs
+    # are cut to their start and end, with the rest readable through read_tool_output.
+    @tool(
+        execution=ToolExecution.THREAD,
+        timeout=60,
+        max_concurrency=8,
+        output=ToolOutputOptions(max_tokens=2000, spill=True, keep_turns=2),
+    )
     def run_bash_command(self, command: str) -> str:
         """Runs a bash command and returns the output."""
-        return subprocess.run(command, shell=True, capture_output=True, text=True).stdout
\ No newline at end of file
+        return subprocess.run(command, shell=True, capture_output=True, text=True, cwd=self.root_file_path).stdout
@@ -1,4 +1,31 @@
-from .anthropic.llm import LLM as AnthropicLLM
-from .gemini.llm import LLM as GeminiLLM
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-__all__ = ["AnthropicLLM", "GeminiLLM"]
\ No newline at end of file
+if TYPE_CHECKING:
+    from .anthropic.llm import LLM as AnthropicLLM
+    from .gemini.llm import LLM as GeminiLLM
+    from .router import RouterLLM
+
+# Exported name -> (module, attribute). Provider SDKs are imported on first access only, so a process
+# using one provider doesn't pay for importing the others.
+_LAZY_EXPORTS: Dict[str, Tuple[str, str]] = {
+    "AnthropicLLM": (".anthropic.llm", "LLM"),
+    "GeminiLLM": (".gemini.llm", "LLM"),
+    "RouterLLM": (".router", "RouterLLM"),
+}
+
+__all__ = ["AnthropicLLM", "GeminiLLM", "RouterLLM"]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _LAZY_EXPORTS[name]
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    # Cache on the module so later lookups don't go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
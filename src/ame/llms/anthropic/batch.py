@@ -0,0 +1,95 @@
+from typing import Dict, List, Optional
+
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool
+from ame.llms.anthropic.llm import LLM
+from ame.llms.anthropic.utils import (
+    anthropic_message_to_chunks,
+    chat_message_to_anthropic_messages,
+)
+from ame.llms.batch import BatchBackend, BatchRequest, BatchRequestError, BatchResult
+from ame.llms.history import ConvertedHistories
+from ame.llms.llm import LLMUsage, trace_usage
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Message Batches API requests built like `llm`'s streaming requests, with its model, prompt caching
+    and output token sizing.
+
+    Converted histories are kept with agents' histories (see `ConvertedHistories`); those of other
+    message lists are cached for up to `max_histories` conversations, as bulk jobs run many.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        poll_interval: float = 30.0,
+        max_batch_size: int = 10_000,
+        max_histories: int = 10_000,
+    ) -> None:
+        super().__init__()
+        self.llm = llm
+        self.poll_interval = poll_interval
+        # The API accepts up to 100,000 requests or 256 MB per batch
+        self.max_batch_size = max_batch_size
+        self._histories = ConvertedHistories(
+            chat_message_to_anthropic_messages, max_histories, count=llm.token_counter.count_message
+        )
+        # Uncalibrated prompt token counts of prepared requests, and of each submitted batch's requests, to
+        # calibrate the token counter against the reported usage
+        self._counted: Dict[str, int] = {}
+        self._batch_counted: Dict[str, Dict[str, int]] = {}
+
+    def prepare(self, request: BatchRequest) -> None:
+        params, counted = self.llm.build_request(request.messages, request.tools, self._histories)
+        # Copied, since the payload is kept until the batch is submitted and the history may grow before then
+        params["messages"] = list(params["messages"])
+        request.payload = {"custom_id": request.custom_id, "params": params}
+        self._counted[request.custom_id] = counted
+
+    def count_tokens(self, messages: List[ChatMessage], tools: List[Tool]) -> int:
+        return self.llm.count_tokens(messages, tools, self._histories)
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        batch = await self.llm.client.messages.batches.create(requests=[r.payload for r in requests])
+        self._batch_counted[batch.id] = {
+            r.custom_id: self._counted.pop(r.custom_id) for r in requests if r.custom_id in self._counted
+        }
+        return batch.id
+
+    async def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        batch = await self.llm.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        counts = self._batch_counted.pop(batch_id, {})
+        results = []
+        async for entry in await self.llm.client.messages.batches.results(batch_id):
+            counted = counts.get(entry.custom_id)
+            result = entry.result
+            if result.type != "succeeded":
+                message = f"Request {entry.custom_id} of batch {batch_id} {result.type}"
+                if result.type == "errored":
+                    message += f": {result.error.error.message}"
+                error = BatchRequestError(message)
+                results.append(BatchResult(entry.custom_id, error=error))
+                continue
+
+            message = result.message
+            usage = LLMUsage(
+                input_tokens=message.usage.input_tokens,
+                output_tokens=message.usage.output_tokens,
+                cache_creation_input_tokens=message.usage.cache_creation_input_tokens or 0,
+                cache_read_input_tokens=message.usage.cache_read_input_tokens or 0,
+            )
+            if counted is not None:
+                reported = usage.input_tokens + usage.cache_creation_input_tokens + usage.cache_read_input_tokens
+                self.llm.token_counter.calibrate(counted, reported)
+            self.usage.add(usage)
+            trace_usage(usage, "anthropic")
+            results.append(BatchResult(entry.custom_id, anthropic_message_to_chunks(message), usage=usage))
+        return results
+
+    async def cancel(self, batch_id: str) -> None:
+        self._batch_counted.pop(batch_id, None)
+        await self.llm.client.messages.batches.cancel(batch_id)
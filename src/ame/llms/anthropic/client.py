@@ -0,0 +1,21 @@
+import importlib
+from typing import Optional
+
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+
+from ame.llms.clients import HTTPPoolConfig, get_client
+
+
+def get_anthropic_client(
+    api_key: Optional[str],
+    base_url: Optional[str] = None,
+    pool: Optional[HTTPPoolConfig] = None,
+) -> AsyncAnthropic:
+    """Return the shared `AsyncAnthropic` client for these settings."""
+    def create(pool: HTTPPoolConfig) -> tuple[AsyncAnthropic, DefaultAsyncHttpxClient]:
+        # Newer SDK versions are built on `httpx2` rather than `httpx`, and only accept its Limits
+        httpx = importlib.import_module(DefaultAsyncHttpxClient.__mro__[1].__module__.partition(".")[0])
+        http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(**pool.limits_kwargs()), http2=pool.http2)
+        return AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http_client), http_client
+
+    return get_client("anthropic", api_key, base_url, pool, create)
@@ -1,63 +1,181 @@
 import json
 import os
-from typing import AsyncGenerator, List
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 from anthropic import AsyncAnthropic, types
 
-from ame.core.chat_context import ChatMessage
+from ame.core.chat_context import ChatMessage, ChatRole
 from ame.core.tools import Tool, ToolCall
-from ame.llms.anthropic.utils import chat_messages_to_anthropic_system_and_messages, tool_to_anthropic_tool
-from .models import AnthropicLLMModel
-from ame.llms.llm import LLM as BaseLLM
-from dotenv import load_dotenv
+from ame.core.tracing import LLM_HISTORY_CONVERSION, get_tracer
+from ame.llms.anthropic.client import get_anthropic_client
+from ame.llms.anthropic.tokens import anthropic_token_counter
+from ame.llms.anthropic.utils import (
+    add_cache_breakpoints,
+    chat_message_to_anthropic_messages,
+    chat_messages_to_anthropic_system_and_messages,
+    tool_to_anthropic_tool,
+)
+from ame.llms.clients import HTTPPoolConfig
+from ame.llms.env import ensure_environment
+from ame.llms.history import ConvertedHistories
+from .models import CONTEXT_WINDOWS, MAX_OUTPUT_TOKENS, AnthropicLLMModel
+from ame.llms.llm import LLM as BaseLLM, ContextWindowExceeded, LLMUsage, trace_usage
+from ame.llms.tokens import TokenCounter
 
-load_dotenv()
+# Output tokens requested for models whose limit isn't known
+_DEFAULT_MAX_OUTPUT_TOKENS = 4096
+# Least room for output worth sending a request for
+_MIN_OUTPUT_TOKENS = 256
 
 
 class LLM(BaseLLM):
-    def __init__(self, model: AnthropicLLMModel = AnthropicLLMModel.CLAUDE_4_5_SONNET) -> None:
+    def __init__(
+        self,
+        model: AnthropicLLMModel = AnthropicLLMModel.CLAUDE_4_5_SONNET,
+        prompt_caching: bool = False,
+        base_url: Optional[str] = None,
+        pool: Optional[HTTPPoolConfig] = None,
+        max_output_tokens: Optional[int] = None,
+        token_counter: Optional[TokenCounter] = None,
+    ) -> None:
         self.model = model
-        self.client = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        self.prompt_caching = prompt_caching
+        # Output tokens requested per response. The model's limit by default; either way, capped to what
+        # fits in the context window after the prompt.
+        self.max_output_tokens = max_output_tokens or MAX_OUTPUT_TOKENS.get(model, _DEFAULT_MAX_OUTPUT_TOKENS)
+        self.context_window = CONTEXT_WINDOWS.get(model)
+        self.token_counter = token_counter or anthropic_token_counter()
+        ensure_environment()
+        self._api_key = os.environ.get("ANTHROPIC_API_KEY")
+        self._base_url = base_url
+        self._pool = pool
+        self._histories = ConvertedHistories(chat_message_to_anthropic_messages, count=self.token_counter.count_message)
+        # Token usage of the most recent request, and accumulated over all requests
+        self.last_usage = LLMUsage()
+        self.usage = LLMUsage()
+
+    @property
+    def client(self) -> AsyncAnthropic:
+        # Shared with every other LLM using the same key, base URL and pool config. Looked up on each
+        # request, so a client closed by `aclose_clients` is replaced.
+        return get_anthropic_client(api_key=self._api_key, base_url=self._base_url, pool=self._pool)
 
     async def astream(
         self,
         messages: list[ChatMessage],
         tools: List[Tool],
     ) -> AsyncGenerator[str | ToolCall]:
-        system, messages = chat_messages_to_anthropic_system_and_messages(messages)
-        stream = await self.client.messages.create(
-            max_tokens=1024,
-            system=system,
-            messages=messages,
-            model=self.model.value,
-            stream=True,
-            tools=[tool_to_anthropic_tool(t) for t in tools]
-        )
+        params, counted = self.build_request(messages, tools)
+        stream = await self.client.messages.create(**params, stream=True)
 
         current_tool_call: ToolCall | None = None
         current_tool_args: str = ""
+        # Kept local until the message ends, as other requests on this LLM may be streaming meanwhile
+        usage = LLMUsage()
 
-        async for chunk in stream:
-            if isinstance(chunk, types.RawContentBlockStartEvent):
-                content_block = chunk.content_block
-                if isinstance(content_block, types.ToolUseBlock):
-                    current_tool_call = ToolCall(id=content_block.id, name=content_block.name)
-                    current_tool_args = ""
-            elif isinstance(chunk, types.RawContentBlockDeltaEvent):
-                if isinstance(chunk.delta, types.TextDelta):
-                    yield chunk.delta.text
-                elif isinstance(chunk.delta, types.InputJSONDelta):
-                    current_tool_args += chunk.delta.partial_json
-            elif isinstance(chunk, types.RawContentBlockStopEvent):
-                # Block is done, yield the completed tool call if we have one
-                if current_tool_call:
-                    if current_tool_args.strip():
-                        try:
-                            current_tool_call.args = json.loads(current_tool_args)
-                        except json.JSONDecodeError:
+        # Closes the response, and with it the connection, when the caller stops early
+        async with stream:
+            async for chunk in stream:
+                if isinstance(chunk, types.RawMessageStartEvent):
+                    start_usage = chunk.message.usage
+                    usage = LLMUsage(
+                        input_tokens=start_usage.input_tokens,
+                        output_tokens=start_usage.output_tokens,
+                        cache_creation_input_tokens=start_usage.cache_creation_input_tokens or 0,
+                        cache_read_input_tokens=start_usage.cache_read_input_tokens or 0,
+                    )
+                    reported = usage.input_tokens + usage.cache_creation_input_tokens + usage.cache_read_input_tokens
+                    self.token_counter.calibrate(counted, reported)
+                elif isinstance(chunk, types.RawMessageDeltaEvent):
+                    # Delta usage counts are cumulative for the message
+                    usage.output_tokens = chunk.usage.output_tokens
+                    if chunk.usage.cache_creation_input_tokens is not None:
+                        usage.cache_creation_input_tokens = chunk.usage.cache_creation_input_tokens
+                    if chunk.usage.cache_read_input_tokens is not None:
+                        usage.cache_read_input_tokens = chunk.usage.cache_read_input_tokens
+                elif isinstance(chunk, types.RawMessageStopEvent):
+                    self.last_usage = usage
+                    self.usage.add(usage)
+                    trace_usage(usage, "anthropic")
+                elif isinstance(chunk, types.RawContentBlockStartEvent):
+                    content_block = chunk.content_block
+                    if isinstance(content_block, types.ToolUseBlock):
+                        current_tool_call = ToolCall(id=content_block.id, name=content_block.name)
+                        current_tool_args = ""
+                elif isinstance(chunk, types.RawContentBlockDeltaEvent):
+                    if isinstance(chunk.delta, types.TextDelta):
+                        yield chunk.delta.text
+                    elif isinstance(chunk.delta, types.InputJSONDelta):
+                        current_tool_args += chunk.delta.partial_json
+                elif isinstance(chunk, types.RawContentBlockStopEvent):
+                    # Block is done, yield the completed tool call if we have one
+                    if current_tool_call:
+                        if current_tool_args.strip():
+                            try:
+                                current_tool_call.args = json.loads(current_tool_args)
+                            except json.JSONDecodeError:
+                                current_tool_call.args = {}
+                        else:
                             current_tool_call.args = {}
-                    else:
-                        current_tool_call.args = {}
-                    yield current_tool_call
-                    current_tool_call = None
-                    current_tool_args = ""
\ No newline at end of file
+                        yield current_tool_call
+                        current_tool_call = None
+                        current_tool_args = ""
+
+    def build_request(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+        histories: Optional[ConvertedHistories[types.MessageParam]] = None,
+    ) -> Tuple[Dict[str, Any], int]:
+        """Messages API parameters for a request, as `astream` sends it, and its uncalibrated prompt token count.
+
+        The history is converted incrementally with `histories`, this LLM's own by default, such as a batch
+        backend's. The parameters hold the converted history's own message list, which it extends when the
+        conversation grows, so copy it to keep the parameters past the next request.
+        """
+        tracer = get_tracer()
+        started = time.perf_counter() if tracer.enabled else 0.0
+        history = (histories if histories is not None else self._histories).get(messages)
+        system, converted = chat_messages_to_anthropic_system_and_messages(messages, history)
+        if tracer.enabled:
+            tracer.record(LLM_HISTORY_CONVERSION, time.perf_counter() - started, {"provider": "anthropic"})
+
+        counted = self._count(system, history.tokens, tools)
+        max_tokens = self._max_tokens(self.token_counter.calibrated(counted))
+        anthropic_tools = [tool_to_anthropic_tool(t) for t in tools]
+        if self.prompt_caching:
+            system, anthropic_tools, converted = add_cache_breakpoints(system, anthropic_tools, converted)
+        params = {
+            "max_tokens": max_tokens,
+            "system": system,
+            "messages": converted,
+            "model": self.model.value,
+            "tools": anthropic_tools,
+        }
+        return params, counted
+
+    def count_tokens(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+        histories: Optional[ConvertedHistories[types.MessageParam]] = None,
+    ) -> int:
+        history = (histories if histories is not None else self._histories).get(messages)
+        history.sync(messages)
+        system = messages[0].content if messages and messages[0].role == ChatRole.SYSTEM else ""
+        return self.token_counter.calibrated(self._count(system, history.tokens, tools))
+
+    def _count(self, system: str, history_tokens: int, tools: List[Tool]) -> int:
+        # The history's count includes the system message, which is also sent as its first user message
+        return history_tokens + self.token_counter.count_text(system) + self.token_counter.count_tools(tools)
+
+    def _max_tokens(self, prompt_tokens: int) -> int:
+        if self.context_window is None:
+            return self.max_output_tokens
+        # Leave a margin for estimation error, which the provider would reject as an oversized request
+        margin = 0 if self.token_counter.exact else prompt_tokens // 20
+        room = self.context_window - prompt_tokens - margin
+        if room < _MIN_OUTPUT_TOKENS:
+            raise ContextWindowExceeded(prompt_tokens, self.context_window)
+        return min(self.max_output_tokens, room)
@@ -2,4 +2,12 @@ from enum import Enum
 
 
 class AnthropicLLMModel(Enum):
-    CLAUDE_4_5_SONNET = "claude-sonnet-4-5"
\ No newline at end of file
+    CLAUDE_4_5_SONNET = "claude-sonnet-4-5"
+
+# Tokens of prompt and output per request, and of output alone
+CONTEXT_WINDOWS = {
+    AnthropicLLMModel.CLAUDE_4_5_SONNET: 200_000,
+}
+MAX_OUTPUT_TOKENS = {
+    AnthropicLLMModel.CLAUDE_4_5_SONNET: 64_000,
+}
@@ -0,0 +1,11 @@
+from ame.llms.tokens import HeuristicTokenCounter, TokenCounter
+
+# Claude's tokenizer isn't published, so counts are estimated: about 3.5 characters of English per token,
+# a few tokens of framing per message, and the tool use instructions the API adds when tools are given.
+_CHARS_PER_TOKEN = 3.5
+_MESSAGE_OVERHEAD = 4
+_TOOLS_OVERHEAD = 346
+
+
+def anthropic_token_counter() -> TokenCounter:
+    return HeuristicTokenCounter("anthropic", _CHARS_PER_TOKEN, _MESSAGE_OVERHEAD, _TOOLS_OVERHEAD)
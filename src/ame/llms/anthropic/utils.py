@@ -1,79 +1,144 @@
+from typing import Optional, Sequence
+
 from anthropic import types as anthropic_types
 from ame.core.chat_context import ChatMessage, ChatRole
 from ame.core.tools import Tool, ToolCall
+from ame.llms.history import ConvertedHistory
 
 
-def chat_messages_to_anthropic_system_and_messages(messages: list[ChatMessage]) -> tuple[str, list[ChatMessage]]:
+def chat_messages_to_anthropic_system_and_messages(
+    messages: list[ChatMessage],
+    history: Optional[ConvertedHistory[anthropic_types.MessageParam]] = None,
+) -> tuple[str, Sequence[anthropic_types.MessageParam]]:
     system_prompt = next((m.content for m in messages if m.role == ChatRole.SYSTEM), None)
     if not system_prompt:
         raise ValueError("No system prompt found!")
 
+    # With a history cache, only messages appended since the previous request are converted, and the
+    # history's own list is returned rather than a copy.
+    if history is not None:
+        return system_prompt, history.update(messages)
+
     anthropic_messages = []
     for msg in messages:
-        role = "assistant" if msg.role == ChatRole.ASSISTANT else "user"
-        if isinstance(msg.content, str):
-            anthropic_messages.append(anthropic_types.MessageParam(role=role, content=msg.content))
-        elif isinstance(msg.content, ToolCall):
-            # Single tool call
-            tool_call = msg.content
-            tool_use_block = anthropic_types.ToolUseBlockParam(
+        anthropic_messages.extend(chat_message_to_anthropic_messages(msg))
+
+    return system_prompt, anthropic_messages
+
+
+def chat_message_to_anthropic_messages(msg: ChatMessage) -> list[anthropic_types.MessageParam]:
+    role = "assistant" if msg.role == ChatRole.ASSISTANT else "user"
+    if isinstance(msg.content, str):
+        return [anthropic_types.MessageParam(role=role, content=msg.content)]
+    elif isinstance(msg.content, ToolCall):
+        # Single tool call
+        tool_call = msg.content
+        tool_use_block = anthropic_types.ToolUseBlockParam(
+            id=tool_call.id,
+            input=tool_call.args or {},
+            name=tool_call.name,
+            type="tool_use",
+        )
+        tool_result_block = anthropic_types.ToolResultBlockParam(
+            tool_use_id=tool_call.id,
+            content=tool_call.response or "",
+            is_error=False,
+            type="tool_result",
+        )
+        return [
+            # Assistant message with tool use
+            anthropic_types.MessageParam(
+                role="assistant",
+                content=[tool_use_block]
+            ),
+            # User message with tool result
+            anthropic_types.MessageParam(
+                role="user",
+                content=[tool_result_block]
+            ),
+        ]
+    elif isinstance(msg.content, list) and all(isinstance(tc, ToolCall) for tc in msg.content):
+        # Multiple tool calls
+        tool_use_blocks = []
+        tool_result_blocks = []
+        for tool_call in msg.content:
+            tool_use_blocks.append(anthropic_types.ToolUseBlockParam(
                 id=tool_call.id,
                 input=tool_call.args or {},
                 name=tool_call.name,
                 type="tool_use",
-            )
-            tool_result_block = anthropic_types.ToolResultBlockParam(
+            ))
+            tool_result_blocks.append(anthropic_types.ToolResultBlockParam(
                 tool_use_id=tool_call.id,
                 content=tool_call.response or "",
                 is_error=False,
                 type="tool_result",
-            )
-            # Assistant message with tool use
-            anthropic_messages.append(anthropic_types.MessageParam(
-                role="assistant",
-                content=[tool_use_block]
             ))
-            # User message with tool result
-            anthropic_messages.append(anthropic_types.MessageParam(
-                role="user",
-                content=[tool_result_block]
-            ))
-        elif isinstance(msg.content, list) and all(isinstance(tc, ToolCall) for tc in msg.content):
-            # Multiple tool calls
-            tool_use_blocks = []
-            tool_result_blocks = []
-            for tool_call in msg.content:
-                tool_use_blocks.append(anthropic_types.ToolUseBlockParam(
-                    id=tool_call.id,
-                    input=tool_call.args or {},
-                    name=tool_call.name,
-                    type="tool_use",
-                ))
-                tool_result_blocks.append(anthropic_types.ToolResultBlockParam(
-                    tool_use_id=tool_call.id,
-                    content=tool_call.response or "",
-                    is_error=False,
-                    type="tool_result",
-                ))
+        return [
             # Assistant message with all tool uses
-            anthropic_messages.append(anthropic_types.MessageParam(
+            anthropic_types.MessageParam(
                 role="assistant",
                 content=tool_use_blocks
-            ))
+            ),
             # User message with all tool results
-            anthropic_messages.append(anthropic_types.MessageParam(
+            anthropic_types.MessageParam(
                 role="user",
                 content=tool_result_blocks
-            ))
-        else:
-            raise ValueError(f"Unknown message type: {type(msg.content)}")
+            ),
+        ]
+    else:
+        raise ValueError(f"Unknown message type: {type(msg.content)}")
 
-    return system_prompt, anthropic_messages
+
+def anthropic_message_to_chunks(message: anthropic_types.Message) -> list[str | ToolCall]:
+    """The text and tool calls of a complete message, as `LLM.astream` streams them."""
+    chunks: list[str | ToolCall] = []
+    for block in message.content:
+        if isinstance(block, anthropic_types.TextBlock):
+            chunks.append(block.text)
+        elif isinstance(block, anthropic_types.ToolUseBlock):
+            chunks.append(ToolCall(id=block.id, name=block.name, args=dict(block.input) if block.input else {}))
+    return chunks
 
 
 def tool_to_anthropic_tool(tool: Tool) -> anthropic_types.ToolParam:
+    return tool.payload("anthropic", _build_anthropic_tool)
+
+
+def _build_anthropic_tool(tool: Tool) -> anthropic_types.ToolParam:
     return anthropic_types.ToolParam(
         name=tool.name,
         description=tool.description,
         input_schema=tool.input_schema.model_json_schema(),
-    )
\ No newline at end of file
+    )
+
+_CACHE_CONTROL = anthropic_types.CacheControlEphemeralParam(type="ephemeral")
+
+
+def add_cache_breakpoints(
+    system: str,
+    tools: list[anthropic_types.ToolParam],
+    messages: Sequence[anthropic_types.MessageParam],
+) -> tuple[list[anthropic_types.TextBlockParam], list[anthropic_types.ToolParam], Sequence[anthropic_types.MessageParam]]:
+    """Add prompt cache breakpoints after the tools, the system prompt and the last history message.
+
+    The history breakpoint is placed relative to the end of the history, so trimming old messages never
+    moves it. Each request writes the cache up to its last message and the next request, which only
+    appends to the history, reads that prefix back through the API's automatic breakpoint lookback.
+    The tool and message payloads passed in are copied rather than modified, since they may be cached.
+    """
+    system_blocks = [anthropic_types.TextBlockParam(type="text", text=system, cache_control=_CACHE_CONTROL)]
+
+    if tools:
+        tools = tools[:-1] + [anthropic_types.ToolParam(**tools[-1], cache_control=_CACHE_CONTROL)]
+
+    if messages:
+        last = messages[-1]
+        content = last["content"]
+        blocks = [anthropic_types.TextBlockParam(type="text", text=content)] if isinstance(content, str) else list(content)
+        if blocks and (blocks[-1].get("type") != "text" or blocks[-1].get("text")):
+            # The API rejects cache_control on empty text blocks
+            blocks[-1] = {**blocks[-1], "cache_control": _CACHE_CONTROL}
+            messages = [*messages[:-1], anthropic_types.MessageParam(role=last["role"], content=blocks)]
+
+    return system_blocks, tools, messages
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool, ToolCall
+from ame.llms.llm import LLM, LLMUsage
+
+
+class BatchRequest:
+    """One LLM request in a batch: the arguments `LLM.astream` would have been called with."""
+
+    __slots__ = ("custom_id", "messages", "tools", "payload")
+
+    def __init__(self, custom_id: str, messages: List[ChatMessage], tools: List[Tool]) -> None:
+        # Unique within the batch. Letters, digits, `_` and `-` only, as provider batch APIs require.
+        self.custom_id = custom_id
+        self.messages = messages
+        self.tools = tools
+        # The request in the provider's format, set by `BatchBackend.prepare`
+        self.payload: Any = None
+
+
+class BatchResult:
+    """The response to one `BatchRequest`: its chunks, as `LLM.astream` would have streamed them, or why it failed."""
+
+    __slots__ = ("custom_id", "chunks", "error", "usage")
+
+    def __init__(
+        self,
+        custom_id: str,
+        chunks: Optional[List[str | ToolCall]] = None,
+        error: Optional[Exception] = None,
+        usage: Optional[LLMUsage] = None,
+    ) -> None:
+        self.custom_id = custom_id
+        self.chunks = chunks if chunks is not None else []
+        self.error = error
+        self.usage = usage
+
+
+class BatchRequestError(Exception):
+    """A batch request the provider didn't answer: it failed, expired or its batch was cancelled."""
+
+
+class BatchBackend(ABC):
+    """A provider's batch API. Requests are submitted together, processed asynchronously at a lower
+    price and under separate rate limits, and collected once the whole batch has ended.
+
+    `llm` is the adapter requests are built for, with its model, conversion and limits. Agents run by a
+    `ame.core.bulk_runner.BulkRunner` see its context window and token counter.
+    """
+
+    llm: LLM
+    # Requests accepted in one batch
+    max_batch_size: int = 10_000
+    # Seconds between checks of a batch's status
+    poll_interval: float = 30.0
+
+    def __init__(self) -> None:
+        # Token usage accumulated over every result collected
+        self.usage = LLMUsage()
+
+    def prepare(self, request: BatchRequest) -> None:
+        """Convert the request to the provider's format, as soon as it is made. Like `LLM.astream`, raises
+        `ContextWindowExceeded` for a request that can't fit."""
+        pass
+
+    def count_tokens(self, messages: List[ChatMessage], tools: List[Tool]) -> int:
+        """The prompt tokens of a request, counted locally, for agents fitting their history to the context window."""
+        return self.llm.count_tokens(messages, tools)
+
+    @abstractmethod
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        """Submit `requests` as one batch, and return its id."""
+        ...
+
+    @abstractmethod
+    async def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        """The batch's results once it has ended, in any order, or None while it is still processing."""
+        ...
+
+    @abstractmethod
+    async def cancel(self, batch_id: str) -> None:
+        ...
+
+
+class LocalBatchBackend(BatchBackend):
+    """A stand-in for a provider's batch API that answers each request with `llm.astream`.
+
+    Batches end `latency` seconds after they are submitted, or once every request is answered if that
+    takes longer. Use it with a scripted LLM to test bulk jobs without a network or provider account.
+    """
+
+    def __init__(self, llm: LLM, latency: float = 0.0, poll_interval: float = 0.01, max_batch_size: int = 10_000) -> None:
+        super().__init__()
+        self.llm = llm
+        self.latency = latency
+        self.poll_interval = poll_interval
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        # Batch id -> (time it ends at the earliest, task answering its requests)
+        self._batches: Dict[str, Tuple[float, asyncio.Task[List[BatchResult]]]] = {}
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        self.batches += 1
+        batch_id = f"localbatch_{self.batches}"
+        task = asyncio.create_task(self._answer_all(requests))
+        self._batches[batch_id] = (time.monotonic() + self.latency, task)
+        return batch_id
+
+    async def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        ends_at, task = self._batches[batch_id]
+        if not task.done() or time.monotonic() < ends_at:
+            return None
+        del self._batches[batch_id]
+        return task.result()
+
+    async def cancel(self, batch_id: str) -> None:
+        entry = self._batches.pop(batch_id, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def _answer_all(self, requests: List[BatchRequest]) -> List[BatchResult]:
+        return list(await asyncio.gather(*(self._answer(request) for request in requests)))
+
+    async def _answer(self, request: BatchRequest) -> BatchResult:
+        chunks: List[str | ToolCall] = []
+        try:
+            async for chunk in self.llm.astream(messages=request.messages, tools=request.tools):
+                chunks.append(chunk)
+        except Exception as e:
+            return BatchResult(request.custom_id, error=BatchRequestError(f"Request {request.custom_id} failed: {e}"))
+        return BatchResult(request.custom_id, chunks)
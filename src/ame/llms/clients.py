@@ -0,0 +1,69 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel, ConfigDict
+
+T = TypeVar("T")
+
+
+class HTTPPoolConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    # Seconds an idle connection is kept open for reuse
+    keepalive_expiry: float = 30.0
+    # Requires the `http2` extra (the `h2` package)
+    http2: bool = False
+
+    def limits_kwargs(self) -> Dict[str, Any]:
+        """Arguments for `httpx.Limits`, or the `Limits` of whichever httpx package a provider SDK uses."""
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+        }
+
+
+_default_pool = HTTPPoolConfig()
+# (provider, credentials, base URL, pool config) -> (provider client, its async HTTP client)
+_clients: Dict[Tuple[Hashable, ...], Tuple[Any, Any]] = {}
+
+
+def configure_http_pool(pool: HTTPPoolConfig) -> None:
+    """Set the pool config of LLMs without an explicit one, from their next request on."""
+    global _default_pool
+    _default_pool = pool
+
+
+def get_client(
+    provider: str,
+    credentials: Hashable,
+    base_url: Optional[str],
+    pool: Optional[HTTPPoolConfig],
+    create: Callable[[HTTPPoolConfig], Tuple[T, Any]],
+) -> T:
+    """Return the process-wide provider client for these settings, creating it with `create` on first use.
+
+    LLM instances with the same provider, credentials, base URL and pool config share one client and so
+    one connection pool. Connections belong to the event loop that opened them, so call
+    `aclose_clients` before switching to a new event loop.
+    """
+    pool = pool or _default_pool
+    key = (provider, credentials, base_url, pool)
+    entry = _clients.get(key)
+    if entry is None:
+        entry = _clients[key] = create(pool)
+    return entry[0]
+
+
+def client_count() -> int:
+    return len(_clients)
+
+
+async def aclose_clients() -> None:
+    """Close every shared client's connection pool. LLMs look their client up on each request, so
+    they get a new one on their next request."""
+    entries = list(_clients.values())
+    _clients.clear()
+    for _, http_client in entries:
+        await http_client.aclose()
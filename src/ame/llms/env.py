@@ -0,0 +1,26 @@
+from typing import Optional
+
+_loaded = False
+
+
+def load_environment(dotenv_path: Optional[str] = None, override: bool = False) -> None:
+    """Load provider credentials from a `.env` file into the environment.
+
+    Without a path, the file is searched for from the working directory upwards. Adapters call
+    `ensure_environment` when they are created, so calling this is only needed to pick a specific
+    file, or to load it at a chosen time instead of on the first adapter's creation.
+    """
+    global _loaded
+    from dotenv import find_dotenv, load_dotenv
+
+    if dotenv_path is None:
+        # find_dotenv would otherwise search upwards from this module's directory
+        dotenv_path = find_dotenv(usecwd=True)
+    load_dotenv(dotenv_path=dotenv_path, override=override)
+    _loaded = True
+
+
+def ensure_environment() -> None:
+    """Load the `.env` file on first use only."""
+    if not _loaded:
+        load_environment()
@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional
+
+from google.genai import types
+
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool
+from ame.llms.batch import BatchBackend, BatchRequest, BatchRequestError, BatchResult
+from ame.llms.gemini.llm import LLM, usage_from_metadata
+from ame.llms.gemini.utils import (
+    chat_message_to_gemini_contents,
+    gemini_response_to_chunks,
+)
+from ame.llms.history import ConvertedHistories
+from ame.llms.llm import trace_usage
+
+_ENDED_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+
+
+class GeminiBatchBackend(BatchBackend):
+    """Batch mode requests with inlined requests and responses, built like `llm`'s streaming requests.
+
+    Converted histories are kept with agents' histories (see `ConvertedHistories`); those of other
+    message lists are cached for up to `max_histories` conversations, as bulk jobs run many.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        poll_interval: float = 30.0,
+        max_batch_size: int = 1_000,
+        max_histories: int = 10_000,
+    ) -> None:
+        super().__init__()
+        self.llm = llm
+        self.poll_interval = poll_interval
+        # Inlined requests are limited to 20 MB per batch
+        self.max_batch_size = max_batch_size
+        self._histories = ConvertedHistories(
+            chat_message_to_gemini_contents, max_histories, count=llm.token_counter.count_message
+        )
+        # Uncalibrated prompt token counts of prepared requests, and of each submitted batch's requests, to
+        # calibrate the token counter against the reported usage
+        self._counted: Dict[str, int] = {}
+        self._batch_counted: Dict[str, Dict[str, int]] = {}
+        # Custom ids of each submitted batch's requests, in order, for responses that come back without
+        # their metadata
+        self._batch_ids: Dict[str, List[str]] = {}
+
+    def prepare(self, request: BatchRequest) -> None:
+        contents, config, counted = self.llm.build_request(request.messages, request.tools, self._histories)
+        # Validation copies the contents, so the payload is unaffected by the history growing before submission
+        request.payload = types.InlinedRequest(contents=contents, config=config, metadata={"custom_id": request.custom_id})
+        self._counted[request.custom_id] = counted
+
+    def count_tokens(self, messages: List[ChatMessage], tools: List[Tool]) -> int:
+        return self.llm.count_tokens(messages, tools, self._histories)
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        job = await self.llm.client.aio.batches.create(model=self.llm.model, src=[r.payload for r in requests])
+        self._batch_counted[job.name] = {
+            r.custom_id: self._counted.pop(r.custom_id) for r in requests if r.custom_id in self._counted
+        }
+        self._batch_ids[job.name] = [r.custom_id for r in requests]
+        return job.name
+
+    async def poll(self, batch_id: str) -> Optional[List[BatchResult]]:
+        job = await self.llm.client.aio.batches.get(name=batch_id)
+        if job.state not in _ENDED_STATES:
+            return None
+
+        counts = self._batch_counted.pop(batch_id, {})
+        custom_ids = self._batch_ids.pop(batch_id, [])
+        responses = job.dest.inlined_responses if job.dest is not None and job.dest.inlined_responses else []
+        if not responses:
+            state = job.state.name.removeprefix("JOB_STATE_").lower()
+            reason = f": {job.error.message}" if job.error is not None and job.error.message else ""
+            return [
+                BatchResult(custom_id, error=BatchRequestError(f"Request {custom_id} of batch {batch_id} {state}{reason}"))
+                for custom_id in custom_ids
+            ]
+
+        results = []
+        for i, inlined in enumerate(responses):
+            if inlined.metadata and "custom_id" in inlined.metadata:
+                custom_id = inlined.metadata["custom_id"]
+            elif i < len(custom_ids):
+                custom_id = custom_ids[i]
+            else:
+                continue
+            if inlined.error is not None or inlined.response is None:
+                reason = f": {inlined.error.message}" if inlined.error is not None and inlined.error.message else ""
+                error = BatchRequestError(f"Request {custom_id} of batch {batch_id} failed{reason}")
+                results.append(BatchResult(custom_id, error=error))
+                continue
+
+            response = inlined.response
+            usage = None
+            if response.usage_metadata is not None:
+                counted = counts.get(custom_id)
+                if counted is not None:
+                    self.llm.token_counter.calibrate(counted, response.usage_metadata.prompt_token_count or 0)
+                usage = usage_from_metadata(response.usage_metadata)
+                self.usage.add(usage)
+                trace_usage(usage, "gemini")
+            results.append(BatchResult(custom_id, gemini_response_to_chunks(response), usage=usage))
+        return results
+
+    async def cancel(self, batch_id: str) -> None:
+        self._batch_counted.pop(batch_id, None)
+        self._batch_ids.pop(batch_id, None)
+        await self.llm.client.aio.batches.cancel(name=batch_id)
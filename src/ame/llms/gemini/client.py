@@ -0,0 +1,21 @@
+from typing import Optional
+
+import httpx
+from google import genai
+from google.genai import types
+
+from ame.llms.clients import HTTPPoolConfig, get_client
+
+
+def get_gemini_client(
+    api_key: str,
+    base_url: Optional[str] = None,
+    pool: Optional[HTTPPoolConfig] = None,
+) -> genai.Client:
+    """Return the shared `genai.Client` for these settings. Only its async (`client.aio`) side is pooled."""
+    def create(pool: HTTPPoolConfig) -> tuple[genai.Client, httpx.AsyncClient]:
+        http_client = httpx.AsyncClient(limits=httpx.Limits(**pool.limits_kwargs()), http2=pool.http2)
+        http_options = types.HttpOptions(base_url=base_url, httpx_async_client=http_client)
+        return genai.Client(api_key=api_key, http_options=http_options), http_client
+
+    return get_client("gemini", api_key, base_url, pool, create)
@@ -1,18 +1,28 @@
+import contextlib
 import os
-from typing import AsyncGenerator, List
-import uuid
+import time
+from typing import AsyncGenerator, List, Optional, Sequence, Tuple
 
 from google import genai
 from google.genai import types
 
 from ame.core.chat_context import ChatMessage
 from ame.core.tools import Tool, ToolCall
-from ame.llms.gemini.utils import chat_messages_to_gemini_system_and_contents, tool_to_gemini_function_declaration
-from .models import GeminiLLMModel
-from ame.llms.llm import LLM as BaseLLM
-from dotenv import load_dotenv
-
-load_dotenv()
+from ame.core.tracing import LLM_HISTORY_CONVERSION, get_tracer
+from ame.llms.clients import HTTPPoolConfig
+from ame.llms.env import ensure_environment
+from ame.llms.gemini.client import get_gemini_client
+from ame.llms.gemini.tokens import gemini_token_counter
+from ame.llms.gemini.utils import (
+    chat_message_to_gemini_contents,
+    chat_messages_to_gemini_system_and_contents,
+    gemini_part_to_tool_call,
+    tool_to_gemini_function_declaration,
+)
+from ame.llms.history import ConvertedHistories
+from .models import INPUT_TOKEN_LIMITS, GeminiLLMModel
+from ame.llms.llm import LLM as BaseLLM, ContextWindowExceeded, LLMUsage, trace_usage
+from ame.llms.tokens import TokenCounter
 
 
 class LLM(BaseLLM):
@@ -20,23 +30,108 @@ class LLM(BaseLLM):
         self,
         model: GeminiLLMModel = GeminiLLMModel.GEMINI_3_FLASH_PREVIEW,
         enable_search: bool = False,
+        base_url: Optional[str] = None,
+        pool: Optional[HTTPPoolConfig] = None,
+        max_output_tokens: Optional[int] = None,
+        token_counter: Optional[TokenCounter] = None,
+        local_tokenizer: bool = False,
     ) -> None:
         self.model = model.value
         self.enable_search = enable_search
+        # Output tokens allowed per response; the model's limit if None. Gemini limits prompt and output
+        # separately, so `context_window` is the prompt limit.
+        self.max_output_tokens = max_output_tokens
+        self.context_window = INPUT_TOKEN_LIMITS.get(model)
+        # With `local_tokenizer`, text is counted exactly with Gemma's tokenizer (see `GemmaTokenCounter`)
+        self.token_counter = token_counter or gemini_token_counter(self.model, local_tokenizer)
+        ensure_environment()
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set")
-        self.client = genai.Client(api_key=api_key)
+        self._api_key = api_key
+        self._base_url = base_url
+        self._pool = pool
+        self._histories = ConvertedHistories(chat_message_to_gemini_contents, count=self.token_counter.count_message)
+        # Token usage of the most recent request, and accumulated over all requests
+        self.last_usage = LLMUsage()
+        self.usage = LLMUsage()
+
+    @property
+    def client(self) -> genai.Client:
+        # Shared with every other LLM using the same key, base URL and pool config. Looked up on each
+        # request, so a client closed by `aclose_clients` is replaced.
+        return get_gemini_client(api_key=self._api_key, base_url=self._base_url, pool=self._pool)
 
     async def astream(
         self,
         messages: list[ChatMessage],
         tools: List[Tool],
     ) -> AsyncGenerator[str | ToolCall]:
-        system_prompt, contents = chat_messages_to_gemini_system_and_contents(messages)
+        contents, config, counted = self.build_request(messages, tools)
+
+        # Use async streaming
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=config,
+        )
+
+        usage_metadata = None
+        # Closes the response, and with it the connection, when the caller stops early
+        async with contextlib.aclosing(stream):
+            async for chunk in stream:
+                # Counts are cumulative, the last chunk that has them holds the totals
+                if chunk.usage_metadata is not None:
+                    usage_metadata = chunk.usage_metadata
+
+                # Check if this chunk has any parts
+                if not chunk.candidates or not chunk.candidates[0].content.parts:
+                    continue
+
+                for part in chunk.candidates[0].content.parts:
+                    # Handle text content
+                    if hasattr(part, 'text') and part.text:
+                        yield part.text
+
+                    # Handle function calls. Each call is yielded as soon as its part arrives so the
+                    # caller can start executing it while the rest of the response is still streaming.
+                    if hasattr(part, 'function_call') and part.function_call:
+                        yield gemini_part_to_tool_call(part)
+
+        if usage_metadata is not None:
+            self.token_counter.calibrate(counted, usage_metadata.prompt_token_count or 0)
+            self.last_usage = usage_from_metadata(usage_metadata)
+            self.usage.add(self.last_usage)
+            trace_usage(self.last_usage, "gemini")
+
+    def build_request(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+        histories: Optional[ConvertedHistories[types.Content]] = None,
+    ) -> Tuple[Sequence[types.Content], types.GenerateContentConfig, int]:
+        """The contents and config of a request, as `astream` sends it, and its uncalibrated prompt token count.
+
+        The history is converted incrementally with `histories`, this LLM's own by default, such as a batch
+        backend's. The contents are usually the converted history's own list, which it extends when the
+        conversation grows, so copy them to keep them past the next request.
+        """
+        tracer = get_tracer()
+        started = time.perf_counter() if tracer.enabled else 0.0
+        history = (histories if histories is not None else self._histories).get(messages)
+        system_prompt, contents = chat_messages_to_gemini_system_and_contents(messages, history)
+        if tracer.enabled:
+            tracer.record(LLM_HISTORY_CONVERSION, time.perf_counter() - started, {"provider": "gemini"})
+
+        # The history's count includes the system message, sent as the system instruction
+        counted = history.tokens + self.token_counter.count_tools(tools)
+        if self.context_window is not None:
+            prompt_tokens = self.token_counter.calibrated(counted)
+            if prompt_tokens > self.context_window:
+                raise ContextWindowExceeded(prompt_tokens, self.context_window)
 
         # Prepare tools configuration
-        function_declarations = [tool_to_gemini_function_declaration(t) for t in tools]
+        function_declarations = [t.payload("gemini_function_declaration", _function_declaration) for t in tools]
         gemini_tools = [types.Tool(function_declarations=function_declarations)] if function_declarations else None
         
         # TODO: This breaks with message: `Tool use with function calling is unsupported`
@@ -50,44 +145,31 @@ class LLM(BaseLLM):
             system_instruction=system_prompt,
             tools=gemini_tools if gemini_tools else None,
             temperature=1.0,
+            max_output_tokens=self.max_output_tokens,
         )
+        return contents, config, counted
 
-        # Use async streaming
-        stream = await self.client.aio.models.generate_content_stream(
-            model=self.model,
-            contents=contents,
-            config=config,
-        )
-
-        current_tool_calls = []
-
-        async for chunk in stream:
-            # Check if this chunk has any parts
-            if not chunk.candidates or not chunk.candidates[0].content.parts:
-                continue
-
-            for part in chunk.candidates[0].content.parts:
-                # Handle text content
-                if hasattr(part, 'text') and part.text:
-                    yield part.text
-
-                # Handle function calls
-                if hasattr(part, 'function_call') and part.function_call:
-                    func_call = part.function_call
-
-                    # Capture thought_signature if present (required for Gemini 3)
-                    metadata = {}
-                    if hasattr(part, 'thought_signature') and part.thought_signature:
-                        metadata['thought_signature'] = part.thought_signature
-
-                    tool_call = ToolCall(
-                        id=str(func_call.id) if func_call.id else str(uuid.uuid4()),
-                        name=func_call.name,
-                        args=dict(func_call.args) if func_call.args else {},
-                        metadata=metadata if metadata else None
-                    )
-                    current_tool_calls.append(tool_call)
-
-        # Yield all tool calls after streaming is complete
-        for tool_call in current_tool_calls:
-            yield tool_call
\ No newline at end of file
+    def count_tokens(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+        histories: Optional[ConvertedHistories[types.Content]] = None,
+    ) -> int:
+        history = (histories if histories is not None else self._histories).get(messages)
+        history.sync(messages)
+        return self.token_counter.calibrated(history.tokens + self.token_counter.count_tools(tools))
+
+
+def usage_from_metadata(metadata: types.GenerateContentResponseUsageMetadata) -> LLMUsage:
+    # Gemini counts cached tokens as part of the prompt, and thinking tokens apart from the output
+    cached = metadata.cached_content_token_count or 0
+    return LLMUsage(
+        input_tokens=(metadata.prompt_token_count or 0) - cached,
+        output_tokens=(metadata.candidates_token_count or 0) + (metadata.thoughts_token_count or 0),
+        cache_read_input_tokens=cached,
+    )
+
+
+def _function_declaration(tool: Tool) -> types.FunctionDeclaration:
+    # Validated once per tool, instead of re-validating the declaration dict on every request
+    return types.FunctionDeclaration.model_validate(tool_to_gemini_function_declaration(tool))
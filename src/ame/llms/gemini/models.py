@@ -3,4 +3,11 @@ from enum import Enum
 
 class GeminiLLMModel(Enum):
     GEMINI_2_5_FLASH = "gemini-2.5-flash"
-    GEMINI_3_FLASH_PREVIEW = "gemini-3-flash-preview"
\ No newline at end of file
+    GEMINI_3_FLASH_PREVIEW = "gemini-3-flash-preview"
+
+
+# Prompt tokens per request. Gemini limits output separately, to 65,536 tokens for these models.
+INPUT_TOKEN_LIMITS = {
+    GeminiLLMModel.GEMINI_2_5_FLASH: 1_048_576,
+    GeminiLLMModel.GEMINI_3_FLASH_PREVIEW: 1_048_576,
+}
@@ -0,0 +1,34 @@
+from ame.llms.tokens import HeuristicTokenCounter, TokenCounter
+
+# Google's rule of thumb is about four characters per token. Function declarations are sent as
+# schemas and counted as their text, without extra instructions.
+_CHARS_PER_TOKEN = 4.0
+_MESSAGE_OVERHEAD = 3
+
+
+class GemmaTokenCounter(TokenCounter):
+    """Exact text counts with the SentencePiece tokenizer Gemini models share with Gemma.
+
+    Needs the `sentencepiece` package (the `tokenizer` extra). The tokenizer model is downloaded once,
+    when the counter is created, and cached locally by google-genai; counting never uses the network.
+    """
+
+    exact = True
+
+    def __init__(self, model: str) -> None:
+        super().__init__("gemma", _MESSAGE_OVERHEAD)
+        from google.genai.local_tokenizer import LocalTokenizer
+
+        self._tokenizer = LocalTokenizer(model_name=model)
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._tokenizer.count_tokens(text).total_tokens
+
+
+def gemini_token_counter(model: str, local_tokenizer: bool = False) -> TokenCounter:
+    """A `GemmaTokenCounter` if `local_tokenizer` is set, otherwise an estimate."""
+    if local_tokenizer:
+        return GemmaTokenCounter(model)
+    return HeuristicTokenCounter("gemini", _CHARS_PER_TOKEN, _MESSAGE_OVERHEAD)
@@ -1,49 +1,128 @@
+from typing import Optional, Sequence
+import uuid
+
 from google.genai import types as gemini_types
 from ame.core.chat_context import ChatMessage, ChatRole
 from ame.core.tools import Tool, ToolCall
+from ame.llms.history import ConvertedHistory
+
 
+def chat_messages_to_gemini_system_and_contents(
+    messages: list[ChatMessage],
+    history: Optional[ConvertedHistory[gemini_types.Content]] = None,
+) -> tuple[str, Sequence[gemini_types.Content]]:
+    """Convert ChatMessages to Gemini system prompt and contents list.
 
-def chat_messages_to_gemini_system_and_contents(messages: list[ChatMessage]) -> tuple[str, list[gemini_types.Content]]:
-    """Convert ChatMessages to Gemini system prompt and contents list."""
+    If `history` is given, contents are built incrementally from it instead of converting every message,
+    and are usually its own list, as `ConvertedHistory.update` returns it.
+    """
     system_prompt = next((m.content for m in messages if m.role == ChatRole.SYSTEM), None)
     if not system_prompt:
         raise ValueError("No system prompt found!")
 
-    gemini_contents = []
-    # Gemini requires a user message, so if there is no user message, add an empty one at the beginning.
-    if not any(m.role == ChatRole.USER for m in messages):
-        gemini_contents.append(
+    if history is not None:
+        contents = history.update(messages)
+    else:
+        contents = []
+        for msg in messages:
+            contents.extend(chat_message_to_gemini_contents(msg))
+    # Gemini requires the contents to start with a user turn, so if they don't, add an empty one first.
+    if not contents or contents[0].role != "user":
+        contents = [gemini_types.Content(role="user", parts=[gemini_types.Part(text="")]), *contents]
+    return system_prompt, contents
+
+
+def gemini_part_to_tool_call(part: gemini_types.Part) -> ToolCall:
+    """Convert a response part holding a function call to a ToolCall."""
+    func_call = part.function_call
+
+    # Capture thought_signature if present (required for Gemini 3)
+    metadata = {}
+    if hasattr(part, 'thought_signature') and part.thought_signature:
+        metadata['thought_signature'] = part.thought_signature
+
+    return ToolCall(
+        id=str(func_call.id) if func_call.id else str(uuid.uuid4()),
+        name=func_call.name,
+        args=dict(func_call.args) if func_call.args else {},
+        metadata=metadata if metadata else None
+    )
+
+
+def gemini_response_to_chunks(response: gemini_types.GenerateContentResponse) -> list[str | ToolCall]:
+    """The text and tool calls of a complete response, as `LLM.astream` streams them."""
+    chunks: list[str | ToolCall] = []
+    if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
+        return chunks
+    for part in response.candidates[0].content.parts:
+        if part.text:
+            chunks.append(part.text)
+        if part.function_call:
+            chunks.append(gemini_part_to_tool_call(part))
+    return chunks
+
+
+def chat_message_to_gemini_contents(msg: ChatMessage) -> list[gemini_types.Content]:
+    """Convert a single ChatMessage to the Gemini contents it expands to."""
+    if msg.role == ChatRole.SYSTEM:
+        # Skip system messages as they're extracted separately
+        return []
+
+    role = "model" if msg.role == ChatRole.ASSISTANT else "user"
+
+    if isinstance(msg.content, str):
+        # Simple text message
+        return [
             gemini_types.Content(
-                role="user",
-                parts=[gemini_types.Part(text="")]
+                role=role,
+                parts=[gemini_types.Part(text=msg.content)]
             )
-        )
-
-    for msg in messages:
-        if msg.role == ChatRole.SYSTEM:
-            # Skip system messages as they're extracted separately
-            continue
-
-        role = "model" if msg.role == ChatRole.ASSISTANT else "user"
-
-        if isinstance(msg.content, str):
-            # Simple text message
-            gemini_contents.append(
-                gemini_types.Content(
-                    role=role,
-                    parts=[gemini_types.Part(text=msg.content)]
-                )
+        ]
+    elif isinstance(msg.content, ToolCall):
+        # Single tool call - add both the function call and response
+        tool_call = msg.content
+
+        # Extract thought_signature from metadata if present
+        thought_signature = None
+        if tool_call.metadata and 'thought_signature' in tool_call.metadata:
+            thought_signature = tool_call.metadata['thought_signature']
+
+        # Assistant message with function call
+        part_kwargs = {
+            "function_call": gemini_types.FunctionCall(
+                name=tool_call.name,
+                args=tool_call.args or {}
             )
-        elif isinstance(msg.content, ToolCall):
-            # Single tool call - add both the function call and response
-            tool_call = msg.content
+        }
+        if thought_signature is not None:
+            part_kwargs["thought_signature"] = thought_signature
 
+        return [
+            gemini_types.Content(
+                role="model",
+                parts=[gemini_types.Part(**part_kwargs)]
+            ),
+            # User message with function response
+            gemini_types.Content(
+                role="user",
+                parts=[gemini_types.Part.from_function_response(
+                    name=tool_call.name,
+                    response={"result": tool_call.response or ""}
+                )]
+            ),
+        ]
+    elif isinstance(msg.content, list) and all(isinstance(tc, ToolCall) for tc in msg.content):
+        # Multiple tool calls
+        function_call_parts = []
+        function_response_parts = []
+
+        for tool_call in msg.content:
             # Extract thought_signature from metadata if present
             thought_signature = None
             if tool_call.metadata and 'thought_signature' in tool_call.metadata:
                 thought_signature = tool_call.metadata['thought_signature']
 
-            # Assistant message with function call
+            # Build Part with function_call and optional thought_signature
             part_kwargs = {
                 "function_call": gemini_types.FunctionCall(
                     name=tool_call.name,
@@ -53,71 +132,28 @@ def chat_messages_to_gemini_system_and_contents(messages: list[ChatMessage]) ->
             if thought_signature is not None:
                 part_kwargs["thought_signature"] = thought_signature
 
-            gemini_contents.append(
-                gemini_types.Content(
-                    role="model",
-                    parts=[gemini_types.Part(**part_kwargs)]
-                )
-            )
-
-            # User message with function response
-            gemini_contents.append(
-                gemini_types.Content(
-                    role="user",
-                    parts=[gemini_types.Part.from_function_response(
-                        name=tool_call.name,
-                        response={"result": tool_call.response or ""}
-                    )]
+            function_call_parts.append(gemini_types.Part(**part_kwargs))
+            function_response_parts.append(
+                gemini_types.Part.from_function_response(
+                    name=tool_call.name,
+                    response={"result": tool_call.response or ""}
                 )
             )
-        elif isinstance(msg.content, list) and all(isinstance(tc, ToolCall) for tc in msg.content):
-            # Multiple tool calls
-            function_call_parts = []
-            function_response_parts = []
-
-            for tool_call in msg.content:
-                # Extract thought_signature from metadata if present
-                thought_signature = None
-                if tool_call.metadata and 'thought_signature' in tool_call.metadata:
-                    thought_signature = tool_call.metadata['thought_signature']
-
-                # Build Part with function_call and optional thought_signature
-                part_kwargs = {
-                    "function_call": gemini_types.FunctionCall(
-                        name=tool_call.name,
-                        args=tool_call.args or {}
-                    )
-                }
-                if thought_signature is not None:
-                    part_kwargs["thought_signature"] = thought_signature
-
-                function_call_parts.append(gemini_types.Part(**part_kwargs))
-                function_response_parts.append(
-                    gemini_types.Part.from_function_response(
-                        name=tool_call.name,
-                        response={"result": tool_call.response or ""}
-                    )
-                )
 
+        return [
             # Assistant message with all function calls
-            gemini_contents.append(
-                gemini_types.Content(
-                    role="model",
-                    parts=function_call_parts
-                )
-            )
-
+            gemini_types.Content(
+                role="model",
+                parts=function_call_parts
+            ),
             # User message with all function responses
-            gemini_contents.append(
-                gemini_types.Content(
-                    role="user",
-                    parts=function_response_parts
-                )
-            )
-        else:
-            raise ValueError(f"Unknown message type: {type(msg.content)}")
-
-    return system_prompt, gemini_contents
+            gemini_types.Content(
+                role="user",
+                parts=function_response_parts
+            ),
+        ]
+    else:
+        raise ValueError(f"Unknown message type: {type(msg.content)}")
 
 
 def _clean_schema_for_gemini(schema: dict) -> dict:
@@ -154,7 +190,14 @@ def _clean_schema_for_gemini(schema: dict) -> dict:
 
 
 def tool_to_gemini_function_declaration(tool: Tool) -> dict:
-    """Convert a Tool to Gemini function declaration format."""
+    """Convert a Tool to Gemini function declaration format.
+
+    The declaration is built once per tool and shared, so callers must not modify it.
+    """
+    return tool.payload("gemini", _build_gemini_function_declaration)
+
+
+def _build_gemini_function_declaration(tool: Tool) -> dict:
     schema = tool.input_schema.model_json_schema()
 
     # Clean properties to remove unsupported Gemini fields
@@ -0,0 +1,125 @@
+import operator
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from ame.core.chat_context import ChatMessage
+
+T = TypeVar("T")
+
+
+class ConvertedHistory(Generic[T]):
+    """A message history converted to one provider's request format, kept up to date incrementally.
+
+    When the history only grew since the previous call, just the new messages are converted. When it
+    was trimmed or messages were replaced, messages that are still present are reused and the rest are
+    converted. Histories with a `version`, such as `ChatHistory`, are checked for changes in O(1); other
+    lists are compared message by message. Reassigning a message's `content` (as `AgentWithTools.update_instructions` does) is
+    picked up for the first message and on any rebuild; other messages are treated as immutable once
+    converted, so replace them rather than editing them in place.
+
+    With `count`, each message's token count is kept with its converted items, and `tokens` is their
+    running total.
+    """
+
+    def __init__(self, convert: Callable[[ChatMessage], List[T]], count: Optional[Callable[[ChatMessage], int]] = None) -> None:
+        self._convert = convert
+        self._count = count
+        self._messages: List[ChatMessage] = []
+        self._version: Optional[int] = None
+        self._items: List[T] = []
+        # id(message) -> (message, content it was converted from, converted items, its `count`)
+        self._entries: Dict[int, Tuple[ChatMessage, Any, List[T], int]] = {}
+        # Sum of `count` over the history, kept up to date with it
+        self.tokens = 0
+
+    def update(self, messages: List[ChatMessage]) -> Sequence[T]:
+        """The converted items of `messages`. They are the history's own list, not a copy, so don't modify
+        it, and copy it to keep it past the next update."""
+        self.sync(messages)
+        return self._items
+
+    def sync(self, messages: List[ChatMessage]) -> None:
+        """Bring the converted items and token count up to date with `messages`."""
+        n = len(self._messages)
+        if (
+            n
+            and len(messages) >= n
+            and self._unchanged(messages, n)
+            and messages[0].content is self._entries[id(messages[0])][1]
+        ):
+            for i in range(n, len(messages)):
+                msg = messages[i]
+                self._items.extend(self._convert_new(msg))
+                self._messages.append(msg)
+        else:
+            self._rebuild(messages)
+        self._version = getattr(messages, "version", None)
+
+    def _unchanged(self, messages: List[ChatMessage], n: int) -> bool:
+        """Whether the first `n` messages are still the ones synced last."""
+        version = getattr(messages, "version", None)
+        if version is None:
+            return all(map(operator.is_, messages[:n], self._messages))
+        # Without replacements or insertions, trims and appends would have moved a newer message to n - 1
+        return version == self._version and messages[n - 1] is self._messages[-1]
+
+    def _convert_new(self, msg: ChatMessage) -> List[T]:
+        converted = self._convert(msg)
+        tokens = self._count(msg) if self._count is not None else 0
+        self._entries[id(msg)] = (msg, msg.content, converted, tokens)
+        self.tokens += tokens
+        return converted
+
+    def _rebuild(self, messages: List[ChatMessage]) -> None:
+        previous = self._entries
+        self._entries = {}
+        self._items = []
+        self.tokens = 0
+        for msg in messages:
+            entry = previous.get(id(msg))
+            if entry is not None and entry[0] is msg and entry[1] is msg.content:
+                self._entries[id(msg)] = entry
+                self._items.extend(entry[2])
+                self.tokens += entry[3]
+            else:
+                self._items.extend(self._convert_new(msg))
+        self._messages = list(messages)
+
+
+class ConvertedHistories(Generic[T]):
+    """`ConvertedHistory` caches for the conversations served by one LLM instance.
+
+    A history with `caches`, such as an agent's `ChatHistory` or `ForkedHistory`, holds its own
+    converted history, however many conversations the LLM serves. Other message lists are told apart
+    by their first (system) message, and the least recently used of them are evicted once there are
+    more than `max_histories`.
+    """
+
+    def __init__(
+        self,
+        convert: Callable[[ChatMessage], List[T]],
+        max_histories: int = 128,
+        count: Optional[Callable[[ChatMessage], int]] = None,
+    ) -> None:
+        self._convert = convert
+        self._count = count
+        self._max_histories = max_histories
+        self._histories: OrderedDict[int, ConvertedHistory[T]] = OrderedDict()
+
+    def get(self, messages: List[ChatMessage]) -> ConvertedHistory[T]:
+        caches = getattr(messages, "caches", None)
+        if caches is not None:
+            history = caches.get(self)
+            if history is None:
+                history = caches[self] = ConvertedHistory(self._convert, self._count)
+            return history
+        # The cached history holds a reference to messages[0], so its id can't be reused while cached.
+        key = id(messages[0])
+        history = self._histories.get(key)
+        if history is None:
+            history = self._histories[key] = ConvertedHistory(self._convert, self._count)
+            if len(self._histories) > self._max_histories:
+                self._histories.popitem(last=False)
+        else:
+            self._histories.move_to_end(key)
+        return history
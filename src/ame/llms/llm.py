@@ -1,15 +1,92 @@
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, List, Optional
+
+from pydantic import BaseModel
 
 from ame.core.chat_context import ChatMessage
 from ame.core.tools import Tool, ToolCall
+from ame.core.tracing import (
+    LLM_CACHE_CREATION_TOKENS,
+    LLM_CACHE_READ_TOKENS,
+    LLM_INPUT_TOKENS,
+    LLM_OUTPUT_TOKENS,
+    get_tracer,
+)
+from ame.llms.tokens import DEFAULT_TOKEN_COUNTER, TokenCounter
+
+
+class ContextWindowExceeded(ValueError):
+    """A request doesn't fit in the model's context window, by the LLM's local token count."""
+
+    def __init__(self, tokens: int, context_window: int) -> None:
+        super().__init__(f"Request of about {tokens} tokens doesn't fit in the context window of {context_window} tokens")
+        self.tokens = tokens
+        self.context_window = context_window
 
 
 class LLM(ABC):
+    # Prompt and output tokens the model accepts per request, if known. Agents trim their history to fit.
+    context_window: Optional[int] = None
+    token_counter: TokenCounter = DEFAULT_TOKEN_COUNTER
+
     @abstractmethod
     async def astream(
         self,
         messages: list[ChatMessage],
         tools: List[Tool],
     ) -> AsyncGenerator[str | ToolCall]:
-        ...
\ No newline at end of file
+        ...
+
+    def count_tokens(self, messages: list[ChatMessage], tools: List[Tool]) -> int:
+        """The prompt tokens of a request, counted locally with `token_counter`."""
+        counter = self.token_counter
+        return counter.calibrated(sum(map(counter.count_message, messages)) + counter.count_tools(tools))
+
+
+class WrapperLLM(LLM):
+    """Base of LLMs that pass requests on to `llm`, sharing its context window and token counting."""
+
+    llm: LLM
+
+    @property
+    def context_window(self) -> Optional[int]:
+        return self.llm.context_window
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        return self.llm.token_counter
+
+    def count_tokens(self, messages: list[ChatMessage], tools: List[Tool]) -> int:
+        return self.llm.count_tokens(messages, tools)
+
+
+class LLMUsage(BaseModel):
+    """Token counts reported by a provider, for one request or accumulated over many."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of prompt tokens that were read from the prompt cache."""
+        prompt_tokens = self.input_tokens + self.cache_creation_input_tokens + self.cache_read_input_tokens
+        return self.cache_read_input_tokens / prompt_tokens if prompt_tokens else 0.0
+
+    def add(self, other: "LLMUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_creation_input_tokens += other.cache_creation_input_tokens
+        self.cache_read_input_tokens += other.cache_read_input_tokens
+
+
+def trace_usage(usage: LLMUsage, provider: str) -> None:
+    """Report one request's token counts to the installed tracer."""
+    tracer = get_tracer()
+    if not tracer.enabled:
+        return
+    attributes = {"provider": provider}
+    tracer.record(LLM_INPUT_TOKENS, usage.input_tokens, attributes)
+    tracer.record(LLM_OUTPUT_TOKENS, usage.output_tokens, attributes)
+    tracer.record(LLM_CACHE_READ_TOKENS, usage.cache_read_input_tokens, attributes)
+    tracer.record(LLM_CACHE_CREATION_TOKENS, usage.cache_creation_input_tokens, attributes)
@@ -0,0 +1,179 @@
+import asyncio
+import contextlib
+import random
+import time
+from typing import AsyncGenerator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool, ToolCall
+from ame.llms.llm import LLM, WrapperLLM
+
+# HTTP statuses providers use for rate limiting and overload
+_RETRYABLE_STATUSES = {429, 503, 529}
+
+
+class RateLimits(BaseModel):
+    requests_per_minute: Optional[int] = None
+    # Input and output tokens, as counted by the LLM's token counter
+    tokens_per_minute: Optional[int] = None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` per second, up to `capacity`.
+
+    Waiters are served in arrival order, so one large request can't be overtaken forever by small ones.
+    """
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float) -> None:
+        # Requests larger than the bucket wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Take tokens without waiting. The bucket may go negative, delaying later acquires."""
+        self._refill()
+        self._tokens -= amount
+
+    def drain(self) -> None:
+        self._refill()
+        self._tokens = min(self._tokens, 0)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiterStats(BaseModel):
+    requests: int = 0
+    waiting: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    retries: int = 0
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by every session calling one model."""
+
+    def __init__(self, limits: RateLimits) -> None:
+        self.limits = limits
+        self.stats = RateLimiterStats()
+        self._requests = TokenBucket(limits.requests_per_minute, limits.requests_per_minute / 60) if limits.requests_per_minute else None
+        self._tokens = TokenBucket(limits.tokens_per_minute, limits.tokens_per_minute / 60) if limits.tokens_per_minute else None
+        self._paused_until = 0.0
+
+    async def acquire(self, tokens: int) -> None:
+        start = time.monotonic()
+        self.stats.waiting += 1
+        try:
+            while (pause := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+            if self._requests is not None:
+                await self._requests.acquire(1)
+            if self._tokens is not None:
+                await self._tokens.acquire(tokens)
+        finally:
+            self.stats.waiting -= 1
+        wait = time.monotonic() - start
+        self.stats.requests += 1
+        self.stats.total_wait += wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+
+    def consume_tokens(self, tokens: int) -> None:
+        """Account for tokens only known after the request, such as the output."""
+        if self._tokens is not None:
+            self._tokens.consume(tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, after the provider said it is rate limited or overloaded."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket.drain()
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(key: str, limits: RateLimits) -> RateLimiter:
+    """Return the process-wide limiter for `key` (e.g. "anthropic/claude-sonnet-4-5"), creating it with `limits`."""
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        limiter = _rate_limiters[key] = RateLimiter(limits)
+    return limiter
+
+
+class RateLimitedLLM(WrapperLLM):
+    """Wraps an LLM so its requests go through a shared `RateLimiter`.
+
+    A request that fails with a rate limit or overload error before streaming anything pauses the
+    limiter (for the provider's `retry-after` if it sent one) and is retried with exponential backoff,
+    up to `max_retries` times.
+    """
+
+    def __init__(self, llm: LLM, limiter: RateLimiter, max_retries: int = 3, backoff: float = 1.0) -> None:
+        self.llm = llm
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def astream(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+    ) -> AsyncGenerator[str | ToolCall]:
+        input_tokens = self.llm.count_tokens(messages, tools)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(input_tokens)
+            streamed = False
+            output: List[str] = []
+            try:
+                async with contextlib.aclosing(self.llm.astream(messages=messages, tools=tools)) as stream:
+                    async for chunk in stream:
+                        streamed = True
+                        if isinstance(chunk, str):
+                            output.append(chunk)
+                        yield chunk
+                return
+            except Exception as e:
+                if streamed or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after(e) or self.backoff * 2 ** attempt * (0.5 + random.random())
+                self.limiter.pause(delay)
+                self.limiter.stats.retries += 1
+                attempt += 1
+            finally:
+                # Counted whole, as tokenizers may merge text across chunk boundaries
+                self.limiter.consume_tokens(self.llm.token_counter.count_text("".join(output)))
+
+
+def _is_retryable(e: Exception) -> bool:
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    return status in _RETRYABLE_STATUSES
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
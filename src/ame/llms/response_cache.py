@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from typing import AsyncGenerator, List, Optional
+
+from ame.core.chat_context import ChatMessage, dump_message
+from ame.core.serialization import from_jsonable, to_jsonable
+from ame.core.tools import Tool, ToolCall, dump_tool_call, validate_tool_call
+from ame.llms.llm import LLM, WrapperLLM
+
+
+class CacheMode(Enum):
+    # Replay hits, call the LLM and record misses
+    READ_WRITE = "READ_WRITE"
+    # Replay hits, raise ResponseCacheMiss on misses. For deterministic offline tests.
+    REPLAY_ONLY = "REPLAY_ONLY"
+    # Always call the LLM and overwrite what was recorded
+    RECORD = "RECORD"
+
+
+class ResponseCacheMiss(LookupError):
+    pass
+
+
+class ResponseCache(ABC):
+    """Storage for recorded responses: serialized chunk sequences keyed by request hash."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        ...
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU cache, bounded by number of entries and total size of the serialized responses."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = 64 * 1024 * 1024) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._bytes = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = value
+        self._bytes += len(value)
+        while self._entries and (
+            len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk cache in a SQLite file. Entries older than `ttl` seconds are ignored and evicted on write."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL NOT NULL, chunks TEXT NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connection.execute(
+            "SELECT chunks FROM responses WHERE key = ? AND created >= ?", (key, self._oldest())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str) -> None:
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, created, chunks) VALUES (?, ?, ?)", (key, time.time(), value)
+            )
+            if self.ttl is not None:
+                self._connection.execute("DELETE FROM responses WHERE created < ?", (self._oldest(),))
+
+    def _oldest(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+
+class CachingLLM(WrapperLLM):
+    """Wraps an LLM to record complete responses and replay them for identical requests.
+
+    Requests are keyed by a hash of the wrapped LLM's class and model, the messages and the tool
+    definitions. A response is only recorded once its stream has been consumed to the end without
+    errors. Replayed tool calls are fresh objects, so the agent can fill in their responses.
+    """
+
+    def __init__(self, llm: LLM, cache: ResponseCache, mode: CacheMode = CacheMode.READ_WRITE) -> None:
+        self.llm = llm
+        self.cache = cache
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    async def astream(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+    ) -> AsyncGenerator[str | ToolCall]:
+        key = self.request_key(messages, tools)
+        if self.mode != CacheMode.RECORD:
+            recorded = await self.cache.get(key)
+            if recorded is not None:
+                self.hits += 1
+                for chunk in json.loads(recorded):
+                    yield validate_tool_call(from_jsonable(chunk["tool_call"])) if "tool_call" in chunk else chunk["text"]
+                return
+            if self.mode == CacheMode.REPLAY_ONLY:
+                raise ResponseCacheMiss(f"No recorded response for request {key}")
+
+        self.misses += 1
+        chunks = []
+        # A response the caller stops reading early isn't stored
+        async with contextlib.aclosing(self.llm.astream(messages=messages, tools=tools)) as stream:
+            async for chunk in stream:
+                if isinstance(chunk, ToolCall):
+                    # Serialized before the agent fills in the tool's response
+                    chunks.append({"tool_call": to_jsonable(dump_tool_call(chunk))})
+                else:
+                    chunks.append({"text": chunk})
+                yield chunk
+        await self.cache.set(key, json.dumps(chunks))
+
+    def request_key(self, messages: list[ChatMessage], tools: List[Tool]) -> str:
+        request = {
+            "llm": f"{type(self.llm).__module__}.{type(self.llm).__qualname__}",
+            "model": str(getattr(self.llm, "model", None)),
+            "messages": [to_jsonable(dump_message(m)) for m in messages],
+            "tools": [t.payload("response_cache", _tool_definition) for t in tools],
+        }
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _tool_definition(tool: Tool) -> dict:
+    return {"name": tool.name, "description": tool.description, "schema": tool.input_schema.model_json_schema()}
+
@@ -0,0 +1,219 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import Tool, ToolCall
+from ame.llms.llm import LLM
+from ame.llms.tokens import TokenCounter
+
+# ToolCall.metadata key recording which backend produced a tool call
+BACKEND_METADATA_KEY = "router_backend"
+
+_NO_CHUNKS = object()
+
+
+class RouterConfig(BaseModel):
+    # Weight of the newest sample in the time-to-first-token and error-rate EWMAs
+    ewma_alpha: float = 0.2
+    # A backend's score is its TTFT EWMA times (1 + error_penalty * error rate EWMA); lowest wins
+    error_penalty: float = 10.0
+    # Chance of routing to a random backend, so slow or failing backends get re-measured
+    explore_probability: float = 0.05
+    # Start a second request on the next best backend if the first token hasn't arrived by this
+    # percentile of the chosen backend's recent TTFTs. None disables hedging.
+    hedge_percentile: Optional[float] = 0.95
+    # Recent TTFT samples per backend kept for the hedge deadline, and how many are needed to hedge
+    ttft_window: int = 100
+    min_hedge_samples: int = 10
+    # Try the next best backend if a request fails before its first chunk
+    failover: bool = True
+
+
+class BackendStats(BaseModel):
+    requests: int = 0
+    errors: int = 0
+    hedges_won: int = 0
+    ttft_ewma: Optional[float] = None
+    error_rate_ewma: float = 0.0
+
+
+class RouterLLM(LLM):
+    """An LLM that sends each request to the backend with the best recent latency and error rate.
+
+    Tool calls are tagged with the backend that made them, and requests that continue a tool loop
+    stay on that backend, since provider-specific tool call metadata (such as Gemini's
+    `thought_signature`) is only valid for the provider that produced it. Hedging and failover only
+    apply to requests that aren't pinned this way, and only before the first chunk is streamed.
+    """
+
+    def __init__(self, backends: Dict[str, LLM], config: RouterConfig = RouterConfig()) -> None:
+        if not backends:
+            raise ValueError("RouterLLM needs at least one backend")
+        self.backends = backends
+        self.config = config
+        self.stats: Dict[str, BackendStats] = {name: BackendStats() for name in backends}
+        self._ttfts: Dict[str, Deque[float]] = {name: deque(maxlen=config.ttft_window) for name in backends}
+
+    async def astream(
+        self,
+        messages: list[ChatMessage],
+        tools: List[Tool],
+    ) -> AsyncGenerator[str | ToolCall]:
+        pinned = _pinned_backend(messages)
+        if pinned is not None and pinned in self.backends:
+            candidates = [pinned]
+        else:
+            candidates = self._ranked_backends()
+
+        name, stream, first = await self._first_chunk(candidates, messages, tools, hedge=pinned is None)
+        try:
+            if first is _NO_CHUNKS:
+                return
+            yield self._tag(name, first)
+            async for chunk in stream:
+                yield self._tag(name, chunk)
+        except Exception:
+            self._record_error(name)
+            raise
+        finally:
+            await stream.aclose()
+
+    @property
+    def context_window(self) -> Optional[int]:
+        # A request may go to any backend, so it has to fit the smallest window
+        windows = [b.context_window for b in self.backends.values() if b.context_window is not None]
+        return min(windows) if windows else None
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        return next(iter(self.backends.values())).token_counter
+
+    def count_tokens(self, messages: list[ChatMessage], tools: List[Tool]) -> int:
+        # By the backend whose `token_counter` this is, which may keep its count incrementally
+        return next(iter(self.backends.values())).count_tokens(messages, tools)
+
+    def _ranked_backends(self) -> List[str]:
+        names = list(self.backends)
+        if random.random() < self.config.explore_probability:
+            random.shuffle(names)
+            return names
+        return sorted(names, key=self._score)
+
+    def _score(self, name: str) -> float:
+        stats = self.stats[name]
+        if stats.ttft_ewma is None:
+            # Unmeasured backends go first, so every backend gets measured, unless they have only failed
+            return 0.0 if stats.errors == 0 else float("inf")
+        return stats.ttft_ewma * (1 + self.config.error_penalty * stats.error_rate_ewma)
+
+    async def _first_chunk(
+        self,
+        candidates: List[str],
+        messages: list[ChatMessage],
+        tools: List[Tool],
+        hedge: bool,
+    ) -> Tuple[str, AsyncIterator[str | ToolCall], object]:
+        """Start requests until one produces its first chunk; return that backend, its stream and the chunk."""
+        remaining = deque(candidates)
+        # Task fetching the first chunk -> (backend, stream, start time)
+        pending: Dict[asyncio.Task, Tuple[str, AsyncIterator[str | ToolCall], float]] = {}
+        last_error: Optional[BaseException] = None
+
+        def start_next() -> None:
+            name = remaining.popleft()
+            stream = aiter(self.backends[name].astream(messages=messages, tools=tools))
+            self.stats[name].requests += 1
+            pending[asyncio.ensure_future(anext(stream, _NO_CHUNKS))] = (name, stream, time.monotonic())
+
+        start_next()
+        try:
+            while pending:
+                timeout = None
+                if hedge and remaining and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The hedge deadline passed without a first chunk
+                    start_next()
+                    continue
+                for task in done:
+                    name, stream, started = pending.pop(task)
+                    if task.exception() is None:
+                        self._record_ttft(name, time.monotonic() - started)
+                        if any(other_started < started for _, _, other_started in pending.values()):
+                            self.stats[name].hedges_won += 1
+                        return name, stream, task.result()
+                    last_error = task.exception()
+                    self._record_error(name)
+                    await stream.aclose()
+                if not pending and remaining and self.config.failover:
+                    start_next()
+            raise last_error
+        finally:
+            # Cancel the requests that lost the race and free their connections
+            now = time.monotonic()
+            for task, (name, stream, started) in pending.items():
+                self._record_lost_race(name, now - started)
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await stream.aclose()
+
+    def _hedge_delay(self, request: Tuple[str, AsyncIterator[str | ToolCall], float]) -> Optional[float]:
+        name, _, started = request
+        samples = self._ttfts[name]
+        if self.config.hedge_percentile is None or len(samples) < self.config.min_hedge_samples:
+            return None
+        ordered = sorted(samples)
+        deadline = ordered[min(len(ordered) - 1, int(self.config.hedge_percentile * len(ordered)))]
+        return max(0.0, started + deadline - time.monotonic())
+
+    def _record_ttft(self, name: str, ttft: float) -> None:
+        stats = self.stats[name]
+        alpha = self.config.ewma_alpha
+        stats.ttft_ewma = ttft if stats.ttft_ewma is None else alpha * ttft + (1 - alpha) * stats.ttft_ewma
+        stats.error_rate_ewma = (1 - alpha) * stats.error_rate_ewma
+        self._ttfts[name].append(ttft)
+
+    def _record_lost_race(self, name: str, waited: float) -> None:
+        """Count the wait of a request cancelled before its first chunk, a lower bound of its TTFT.
+
+        Without it, a preferred backend that slows down is always beaten by the hedge, never measured,
+        and keeps its old TTFT and its rank.
+        """
+        stats = self.stats[name]
+        if stats.ttft_ewma is not None and waited <= stats.ttft_ewma:
+            return
+        alpha = self.config.ewma_alpha
+        stats.ttft_ewma = waited if stats.ttft_ewma is None else alpha * waited + (1 - alpha) * stats.ttft_ewma
+
+    def _record_error(self, name: str) -> None:
+        stats = self.stats[name]
+        alpha = self.config.ewma_alpha
+        stats.errors += 1
+        stats.error_rate_ewma = alpha + (1 - alpha) * stats.error_rate_ewma
+
+    @staticmethod
+    def _tag(name: str, chunk: str | ToolCall) -> str | ToolCall:
+        if isinstance(chunk, ToolCall):
+            chunk.metadata = {**(chunk.metadata or {}), BACKEND_METADATA_KEY: name}
+        return chunk
+
+
+def _pinned_backend(messages: list[ChatMessage]) -> Optional[str]:
+    """The backend that made the tool calls of the current turn, if the turn has any."""
+    for message in reversed(messages):
+        if message.role == ChatRole.USER and isinstance(message.content, str):
+            return None
+        if isinstance(message.content, list):
+            for tool_call in message.content:
+                if tool_call.metadata and BACKEND_METADATA_KEY in tool_call.metadata:
+                    return tool_call.metadata[BACKEND_METADATA_KEY]
+    return None
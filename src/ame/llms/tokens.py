@@ -0,0 +1,87 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from typing import List
+
+from ame.core.chat_context import ChatMessage
+from ame.core.tools import Tool
+
+# Bounds and weight of the newest request for the calibration scale's moving average
+_MIN_SCALE = 0.5
+_MAX_SCALE = 3.0
+_CALIBRATION_ALPHA = 0.2
+
+
+class TokenCounter(ABC):
+    """Counts the prompt tokens of messages and tool definitions locally, without a network call.
+
+    Counts of single messages and tools are uncalibrated, so they can be kept per message and summed.
+    `calibrated` corrects a sum by the ratio of reported to counted tokens that `calibrate` learns from
+    the prompt token counts providers report after each request.
+    """
+
+    # Whether text is counted with the model's own tokenizer rather than estimated from its length
+    exact: bool = False
+
+    def __init__(self, name: str, message_overhead: int = 0, tools_overhead: int = 0) -> None:
+        # Identifies the tokenization, to cache tool definition counts per counter kind
+        self.name = name
+        # Tokens added per message for its role and separators, and per request with tools for the
+        # instructions the provider adds to describe them
+        self.message_overhead = message_overhead
+        self.tools_overhead = tools_overhead
+        self.scale = 1.0
+
+    @abstractmethod
+    def count_text(self, text: str) -> int:
+        ...
+
+    def count_message(self, message: ChatMessage) -> int:
+        if isinstance(message.content, str):
+            return self.message_overhead + self.count_text(message.content)
+        tokens = self.message_overhead
+        for tool_call in message.content:
+            tokens += (
+                self.count_text(tool_call.name)
+                + self.count_text(json.dumps(tool_call.args or {}))
+                + self.count_text(tool_call.response or "")
+            )
+        return tokens
+
+    def count_tools(self, tools: List[Tool]) -> int:
+        if not tools:
+            return 0
+        return self.tools_overhead + sum(tool.payload(f"{self.name}_tokens", self._count_tool) for tool in tools)
+
+    def calibrated(self, tokens: int) -> int:
+        return math.ceil(tokens * self.scale)
+
+    def calibrate(self, counted: int, reported: int) -> None:
+        """Learn from a request counted as `counted` uncalibrated tokens that the provider reported as `reported`."""
+        if counted <= 0 or reported <= 0:
+            return
+        ratio = min(max(reported / counted, _MIN_SCALE), _MAX_SCALE)
+        self.scale += _CALIBRATION_ALPHA * (ratio - self.scale)
+
+    def _count_tool(self, tool: Tool) -> int:
+        schema = json.dumps(tool.input_schema.model_json_schema())
+        return self.count_text(tool.name) + self.count_text(tool.description) + self.count_text(schema)
+
+
+class HeuristicTokenCounter(TokenCounter):
+    """Estimates tokens from text length: `chars_per_token` for ASCII, and about one token per character
+    of other scripts, which tokenizers split much more finely."""
+
+    def __init__(self, name: str = "default", chars_per_token: float = 4.0, message_overhead: int = 0, tools_overhead: int = 0) -> None:
+        super().__init__(name, message_overhead, tools_overhead)
+        self.chars_per_token = chars_per_token
+
+    def count_text(self, text: str) -> int:
+        tokens = len(text) / self.chars_per_token
+        if not text.isascii():
+            # Non-ASCII characters take two to four bytes in UTF-8; count about one token for each
+            tokens += (len(text.encode()) - len(text)) / 2
+        return math.ceil(tokens)
+
+
+DEFAULT_TOKEN_COUNTER = HeuristicTokenCounter()
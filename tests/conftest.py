@@ -0,0 +1,13 @@
+import pytest
+
+from ame.llms.clients import aclose_clients
+
+
+@pytest.fixture
+async def provider_env(monkeypatch):
+    """API keys for adapters pointed at the stub servers, which don't check them. Shared clients are
+    closed afterwards, as their connections belong to the test's event loop."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "stub")
+    monkeypatch.setenv("GEMINI_API_KEY", "stub")
+    yield
+    await aclose_clients()
@@ -0,0 +1,171 @@
+import asyncio
+from typing import AsyncGenerator, List
+
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.agent_with_tools import AgentWithToolsConfig, StopReason
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import Tool, ToolCall
+from ame.llms.llm import LLM
+from ame.llms.tokens import HeuristicTokenCounter
+
+
+class StepsLLM(LLM):
+    """Plays one list of chunks per request, then answers "done"."""
+
+    def __init__(self, *responses: List[str | ToolCall]) -> None:
+        self.responses = list(responses)
+
+    async def astream(self, messages: list[ChatMessage], tools: List[Tool]) -> AsyncGenerator[str | ToolCall]:
+        chunks = self.responses.pop(0) if self.responses else ["done"]
+        for chunk in chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+def _sleep_call(call_id: str, seconds: float) -> ToolCall:
+    return ToolCall(id=call_id, name="sleep", args={"seconds": seconds})
+
+
+async def test_pipelined_tool_calls_are_yielded_and_recorded_in_call_order():
+    # The first call finishes last
+    llm = StepsLLM([_sleep_call("a", 0.05), _sleep_call("b", 0.0), _sleep_call("c", 0.02)])
+    agent = BenchAgent(llm, "bench", AgentWithToolsConfig(pipeline_tool_calls=True))
+
+    chunks = [chunk async for chunk in agent.astream(_user("go"))]
+
+    tool_calls = [chunk for chunk in chunks if isinstance(chunk, ToolCall)]
+    assert [tc.id for tc in tool_calls] == ["a", "b", "c"]
+    assert all(tc.response == "done" for tc in tool_calls)
+    recorded = next(m.content for m in agent._messages if isinstance(m.content, list))
+    assert [tc.id for tc in recorded] == ["a", "b", "c"]
+    assert chunks[-1] == "done"
+    assert agent.stop_reason == StopReason.COMPLETED
+
+
+async def test_interrupt_while_waiting_for_the_llm_keeps_the_consumer_task_uncancelled():
+    agent = BenchAgent(ScriptedLLM(ResponseScript(text_chunks=1000, tokens_per_second=200)), "bench")
+    chunks = []
+    async for chunk in agent.astream(_user("go")):
+        chunks.append(chunk)
+        if len(chunks) == 3:
+            assert agent.interrupt()
+
+    assert agent.stop_reason == StopReason.INTERRUPTED
+    assert asyncio.current_task().cancelling() == 0
+    assert agent._messages[-1].role == ChatRole.ASSISTANT
+    assert agent._messages[-1].content == "".join(chunks)
+    assert not agent.interrupt()
+
+
+async def test_interrupt_from_another_task_cancels_unfinished_tool_calls():
+    agent = BenchAgent(StepsLLM([_sleep_call("a", 10.0)]), "bench")
+    chunks = []
+
+    async def consume() -> None:
+        async for chunk in agent.astream(_user("go")):
+            chunks.append(chunk)
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    assert agent.interrupt()
+    await asyncio.wait_for(task, 1)
+
+    assert not task.cancelled()
+    assert agent.stop_reason == StopReason.INTERRUPTED
+    recorded = agent._messages[-1].content
+    assert recorded[0].response.startswith("[Interrupted")
+
+
+async def test_external_cancellation_isnt_absorbed_by_an_interrupt():
+    agent = BenchAgent(StepsLLM([_sleep_call("a", 10.0)]), "bench")
+
+    async def consume() -> None:
+        async for _ in agent.astream(_user("go")):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    agent.interrupt()
+    task.cancel()
+    try:
+        await asyncio.wait_for(task, 1)
+    except asyncio.CancelledError:
+        pass
+    assert task.cancelled()
+
+
+async def test_a_new_turn_ends_the_interrupted_one_without_waiting_for_its_consumer():
+    agent = BenchAgent(ScriptedLLM(ResponseScript(text_chunks=1000, tokens_per_second=200)), "bench")
+    stream = agent.astream(_user("first"))
+    await anext(stream)
+    agent.interrupt()
+
+    second = agent.astream(_user("second"))
+    assert await asyncio.wait_for(anext(second), 1) == "token "
+    agent.interrupt()
+    await second.aclose()
+    await stream.aclose()
+    assert agent.stop_reason == StopReason.INTERRUPTED
+
+
+async def test_messages_with_str_roles_are_stored_with_chat_roles():
+    agent = BenchAgent(ScriptedLLM(ResponseScript(text_chunks=1)), "bench")
+    async for _ in agent.astream(ChatMessage(role="USER", content="hi")):
+        pass
+    assert agent._messages[1].role is ChatRole.USER
+
+    agent.restore_history([ChatMessage(role="SYSTEM", content="bench"), ChatMessage(role="USER", content="hi")])
+    assert [message.role for message in agent._messages] == [ChatRole.SYSTEM, ChatRole.USER]
+
+
+async def test_the_step_token_budget_counts_with_the_llms_token_counter():
+    # Each response is 60 characters of text, and tool calls for five more steps
+    script = ResponseScript(text_chunks=10, tool_rounds=5)
+    config = AgentWithToolsConfig(max_tokens=30)
+    steps = []
+    for counter in [HeuristicTokenCounter(chars_per_token=4), HeuristicTokenCounter(chars_per_token=1)]:
+        llm = ScriptedLLM(script)
+        llm.token_counter = counter
+        agent = BenchAgent(llm, "bench", config)
+        [chunk async for chunk in agent.astream(_user("go"))]
+        assert agent.stop_reason == StopReason.MAX_TOKENS
+        steps.append(llm.requests)
+
+    assert steps == [2, 1]
+
+
+async def test_a_turn_runs_any_number_of_tool_rounds_in_one_generator():
+    rounds = 300
+    # The scripted LLM counts rounds from the history, so the whole turn has to stay in context
+    config = AgentWithToolsConfig(max_message_history=2 * rounds + 10)
+    agent = BenchAgent(ScriptedLLM(ResponseScript(text_chunks=2, tool_rounds=rounds)), "bench", config)
+
+    chunks = [chunk async for chunk in agent.astream(_user("go"))]
+
+    assert agent.stop_reason == StopReason.COMPLETED
+    assert sum(isinstance(chunk, ToolCall) for chunk in chunks) == rounds
+    assert len(chunks) == 2 * (rounds + 1) + rounds
+    assert agent._llm.requests == rounds + 1
+
+
+async def test_step_and_duration_budgets_end_the_turn_before_the_next_step():
+    script = ResponseScript(text_chunks=1, tool_rounds=100, tool_name="sleep", tool_args={"seconds": 0.01})
+
+    agent = BenchAgent(ScriptedLLM(script), "bench", AgentWithToolsConfig(max_steps=3))
+    [chunk async for chunk in agent.astream(_user("go"))]
+    assert agent.stop_reason == StopReason.MAX_STEPS
+    assert agent._llm.requests == 3
+
+    agent = BenchAgent(ScriptedLLM(script), "bench", AgentWithToolsConfig(max_duration=0.05))
+    [chunk async for chunk in agent.astream(_user("go"))]
+    assert agent.stop_reason == StopReason.MAX_DURATION
+    assert 2 <= agent._llm.requests < 10
+    # The last step finished, so every tool call has its result
+    recorded = [m.content for m in agent._messages if isinstance(m.content, list)]
+    assert len(recorded) == agent._llm.requests
+    assert all(tc.response == "done" for calls in recorded for tc in calls)
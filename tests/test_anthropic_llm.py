@@ -0,0 +1,63 @@
+import asyncio
+
+from fakes import ResponseScript
+from stub_servers import AnthropicStubServer
+
+from ame.core.chat_context import ChatHistory, ChatMessage, ChatRole
+from ame.llms.anthropic.batch import AnthropicBatchBackend
+from ame.llms.anthropic.llm import LLM
+from ame.llms.batch import BatchRequest
+from ame.llms.clients import aclose_clients
+
+
+def _messages(question: str) -> list[ChatMessage]:
+    return [ChatMessage(role=ChatRole.SYSTEM, content="system"), ChatMessage(role=ChatRole.USER, content=question)]
+
+
+async def _drain(llm: LLM, question: str) -> None:
+    async for _ in llm.astream(_messages(question), []):
+        pass
+
+
+async def test_usage_of_concurrent_requests_is_counted_once_each(provider_env):
+    questions = ["short", "a much longer question " * 50]
+    async with AnthropicStubServer(ResponseScript(text_chunks=20, tokens_per_second=1000)) as server:
+        sequential = LLM(base_url=server.base_url)
+        for question in questions:
+            await _drain(sequential, question)
+
+        concurrent = LLM(base_url=server.base_url)
+        await asyncio.gather(*(_drain(concurrent, question) for question in questions))
+
+    assert concurrent.usage == sequential.usage
+
+
+async def test_llms_share_one_connection_and_reconnect_after_aclose_clients(provider_env):
+    async with AnthropicStubServer(ResponseScript(text_chunks=2)) as server:
+        llms = [LLM(base_url=server.base_url) for _ in range(3)]
+        for llm in llms:
+            await _drain(llm, "hi")
+        assert server.connections == 1
+
+        await aclose_clients()
+        await _drain(llms[0], "hi")
+        assert server.connections == 2
+
+
+async def test_batch_requests_are_built_like_streaming_requests(provider_env):
+    llm = LLM()
+    backend = AnthropicBatchBackend(llm)
+    messages = ChatHistory(_messages("hi"))
+    request = BatchRequest("request_0", messages, [])
+
+    backend.prepare(request)
+    params, counted = llm.build_request(messages, [])
+
+    assert request.payload == {"custom_id": "request_0", "params": params}
+    assert backend._counted["request_0"] == counted
+    assert backend.count_tokens(messages, []) == llm.count_tokens(messages, [])
+
+    # The prepared payload keeps its messages while the conversation grows
+    messages.append(ChatMessage(role=ChatRole.ASSISTANT, content="hello"))
+    llm.build_request(messages, [], backend._histories)
+    assert len(request.payload["params"]["messages"]) == len(params["messages"]) == 2
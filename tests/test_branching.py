@@ -0,0 +1,73 @@
+import pytest
+
+from ame.core.branching import ForkedHistory
+from ame.core.chat_context import ChatMessage, ChatRole
+
+
+def _messages(n: int) -> list[ChatMessage]:
+    system = ChatMessage(role=ChatRole.SYSTEM, content="system")
+    return [system, *(ChatMessage(role=ChatRole.USER, content=f"m{i}") for i in range(1, n))]
+
+
+def _forked(messages: list[ChatMessage]) -> ForkedHistory:
+    """A history sharing `messages` with a sibling fork that adds its own message."""
+    shared = ForkedHistory(messages)
+    sibling = ForkedHistory(shared)
+    sibling.append(ChatMessage(role=ChatRole.USER, content="sibling"))
+    return ForkedHistory(shared)
+
+
+def _check(history: ForkedHistory, expected: list[ChatMessage]) -> None:
+    assert len(history) == len(expected)
+    assert list(history) == expected
+    assert all(history[i] is message for i, message in enumerate(expected))
+
+
+@pytest.mark.parametrize("index", [0, 1, 3, 5, 6, -1, -3, 100, -100])
+def test_insert_matches_list(index):
+    messages = _messages(6)
+    history = _forked(messages)
+    history.append(ChatMessage(role=ChatRole.USER, content="own"))
+    expected = [*messages, history[-1]]
+    new = ChatMessage(role=ChatRole.USER, content="new")
+
+    history.insert(index, new)
+    expected.insert(index, new)
+
+    _check(history, expected)
+
+
+@pytest.mark.parametrize(
+    "index",
+    [slice(1, 3), slice(2, 5), slice(4, None), slice(None, 3), slice(-2, None), slice(1, 6, 2), slice(3, 3)],
+)
+def test_slice_get_set_and_delete_match_list(index):
+    messages = _messages(6)
+    history = _forked(messages)
+    history.append(ChatMessage(role=ChatRole.USER, content="own"))
+    expected = [*messages, history[-1]]
+    assert history[index] == expected[index]
+
+    deleted = _forked(messages)
+    deleted.append(expected[-1])
+    del deleted[index]
+    expected_deleted = list(expected)
+    del expected_deleted[index]
+    _check(deleted, expected_deleted)
+
+    replacement = [ChatMessage(role=ChatRole.USER, content=f"r{i}") for i in range(len(expected[index]))]
+    history[index] = replacement
+    expected[index] = replacement
+    _check(history, expected)
+
+
+def test_front_trim_doesnt_change_the_sibling():
+    messages = _messages(6)
+    shared = ForkedHistory(messages)
+    first, second = ForkedHistory(shared), ForkedHistory(shared)
+
+    del first[1:4]
+    first[1] = ChatMessage(role=ChatRole.USER, content="replaced")
+
+    _check(first, [messages[0], first[1], messages[5]])
+    _check(second, messages)
@@ -0,0 +1,79 @@
+import asyncio
+from typing import List
+
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.bulk_runner import BulkRunner, BulkRunnerConfig
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import ToolCall
+from ame.llms.batch import BatchRequest, BatchRequestError, LocalBatchBackend
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+class RecordingBackend(LocalBatchBackend):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.batch_sizes: List[int] = []
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        self.batch_sizes.append(len(requests))
+        return await super().submit(requests)
+
+
+async def test_each_step_of_every_agent_is_one_batch_round():
+    script = ResponseScript(text_chunks=2, tool_rounds=2, tool_calls_per_round=2)
+    backend = RecordingBackend(ScriptedLLM(script), latency=0.01)
+    runner = BulkRunner(backend)
+    agents = [BenchAgent(runner.llm, "bench") for _ in range(10)]
+
+    results = await runner.run((agent, _user(f"question {i}")) for i, agent in enumerate(agents))
+
+    assert backend.batch_sizes == [10, 10, 10]
+    assert [result.agent for result in results] == agents
+    for result in results:
+        assert result.error is None
+        assert sum(isinstance(chunk, ToolCall) for chunk in result.chunks) == 4
+        assert result.text == "token " * 6
+    stats = runner.stats()
+    assert (stats.batches, stats.requests, stats.completed_turns, stats.failed_turns) == (3, 30, 10, 0)
+
+
+async def test_batches_are_split_at_the_backends_max_batch_size():
+    backend = RecordingBackend(ScriptedLLM(ResponseScript(text_chunks=1)), max_batch_size=4)
+    runner = BulkRunner(backend)
+
+    await runner.run((BenchAgent(runner.llm, "bench"), _user("go")) for _ in range(10))
+
+    assert backend.batch_sizes == [4, 4, 2]
+
+
+async def test_a_failed_request_fails_only_its_turn():
+    class FailingBackend(LocalBatchBackend):
+        async def poll(self, batch_id):
+            results = await super().poll(batch_id)
+            if results is not None:
+                results[0].chunks, results[0].error = [], BatchRequestError("expired")
+            return results
+
+    runner = BulkRunner(FailingBackend(ScriptedLLM(ResponseScript(text_chunks=1))))
+
+    results = await runner.run((BenchAgent(runner.llm, "bench"), _user("go")) for _ in range(3))
+
+    assert sum(isinstance(result.error, BatchRequestError) for result in results) == 1
+    assert runner.stats().failed_requests == 1
+
+
+async def test_cancelling_run_cancels_its_batches():
+    backend = LocalBatchBackend(ScriptedLLM(), latency=10)
+    runner = BulkRunner(backend, BulkRunnerConfig(max_batch_delay=0))
+    task = asyncio.create_task(runner.run([(BenchAgent(runner.llm, "bench"), _user("go"))]))
+    await asyncio.sleep(0.05)
+    assert backend._batches
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert not backend._batches
@@ -0,0 +1,31 @@
+import pytest
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.llms.anthropic.utils import chat_messages_to_anthropic_system_and_messages
+from ame.llms.gemini.utils import chat_messages_to_gemini_system_and_contents
+
+
+def _str_role_messages() -> list[ChatMessage]:
+    return [
+        ChatMessage(role="SYSTEM", content="system"),
+        ChatMessage(role="USER", content="question"),
+        ChatMessage(role="ASSISTANT", content="answer"),
+    ]
+
+
+def test_str_roles_are_converted_to_chat_roles():
+    assert [m.role for m in _str_role_messages()] == [ChatRole.SYSTEM, ChatRole.USER, ChatRole.ASSISTANT]
+    with pytest.raises(ValueError):
+        ChatMessage(role="user", content="question")
+
+
+def test_str_roles_reach_the_anthropic_request_as_their_roles():
+    system, messages = chat_messages_to_anthropic_system_and_messages(_str_role_messages())
+    assert system == "system"
+    assert [m["role"] for m in messages[-2:]] == ["user", "assistant"]
+
+
+def test_str_roles_reach_the_gemini_request_as_their_roles():
+    system, contents = chat_messages_to_gemini_system_and_contents(_str_role_messages())
+    assert system == "system"
+    assert [c.role for c in contents] == ["user", "model"]
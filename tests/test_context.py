@@ -0,0 +1,53 @@
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.context import MessageCountContextManager, TokenBudgetContextManager, estimate_message_tokens
+from ame.core.tool_output import expire_tool_outputs
+from ame.core.tools import ToolCall
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+def _tool_message(call_id: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.ASSISTANT, content=[ToolCall(id=call_id, name="fetch", response="x" * 400)])
+
+
+async def test_token_budget_counts_stubbed_tool_outputs_without_a_recount():
+    manager = TokenBudgetContextManager(max_tokens=100_000)
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system")]
+    for i in range(4):
+        await manager.add(messages, _user(f"question {i}"))
+        await manager.add(messages, _tool_message(f"call_{i}"))
+
+    replaced = expire_tool_outputs(messages, {"fetch": 1})
+    for index, previous in replaced:
+        manager.replaced(messages, index, previous)
+
+    assert len(replaced) == 2
+    assert manager._total == sum(map(estimate_message_tokens, messages[1:]))
+
+
+async def test_message_count_trims_in_batches_down_to_the_low_water_mark():
+    manager = MessageCountContextManager(20)
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system")]
+    lengths = []
+    for i in range(100):
+        await manager.add(messages, _user(f"question {i}"))
+        lengths.append(len(messages))
+
+    assert max(lengths) == 20
+    # Each trim drops a batch of messages, so most appends leave the front of the history alone
+    assert sum(b < a for a, b in zip(lengths, lengths[1:])) == 14
+    assert min(lengths[20:]) == 15
+    assert messages[-1].content == "question 99"
+
+
+async def test_message_count_trims_at_a_turn_boundary():
+    manager = MessageCountContextManager(10)
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system")]
+    for i in range(20):
+        await manager.add(messages, _user(f"question {i}"))
+        await manager.add(messages, _tool_message(f"call_{i}"))
+        await manager.add(messages, ChatMessage(role=ChatRole.ASSISTANT, content=f"answer {i}"))
+        assert len(messages) <= 10
+        assert messages[1].role == ChatRole.USER and isinstance(messages[1].content, str)
@@ -0,0 +1,154 @@
+from typing import List
+
+from fakes import BenchAgent, ScriptedLLM
+
+from ame.core.branching import ForkedHistory
+from ame.core.chat_context import ChatHistory, ChatMessage, ChatRole
+from ame.llms.gemini.utils import chat_message_to_gemini_contents, chat_messages_to_gemini_system_and_contents
+from ame.llms.history import ConvertedHistories, ConvertedHistory
+
+
+class CountingConverter:
+    def __init__(self) -> None:
+        self.converted: List[str] = []
+
+    def __call__(self, message: ChatMessage) -> List[str]:
+        self.converted.append(message.content)
+        return [message.content]
+
+
+def _messages(n: int) -> List[ChatMessage]:
+    system = ChatMessage(role=ChatRole.SYSTEM, content="system")
+    return [system, *(ChatMessage(role=ChatRole.USER, content=f"m{i}") for i in range(1, n))]
+
+
+def test_appended_messages_are_the_only_ones_converted():
+    convert = CountingConverter()
+    history = ConvertedHistory(convert, count=lambda m: 1)
+    messages = _messages(3)
+    assert history.update(messages) == ["system", "m1", "m2"]
+
+    messages.append(ChatMessage(role=ChatRole.USER, content="m3"))
+    assert history.update(messages) == ["system", "m1", "m2", "m3"]
+    assert convert.converted == ["system", "m1", "m2", "m3"]
+    assert history.tokens == 4
+
+
+def test_trimmed_and_replaced_messages_invalidate_only_what_changed():
+    convert = CountingConverter()
+    history = ConvertedHistory(convert, count=lambda m: 1)
+    messages = _messages(5)
+    history.update(messages)
+    convert.converted.clear()
+
+    # Trimmed from the front, as context managers do, with a summary put in its place
+    del messages[1:3]
+    messages.insert(1, ChatMessage(role=ChatRole.USER, content="summary"))
+
+    assert history.update(messages) == ["system", "summary", "m3", "m4"]
+    assert convert.converted == ["summary"]
+    assert history.tokens == 4
+
+
+def test_update_instructions_reconverts_the_system_message():
+    llm = ScriptedLLM()
+    agent = BenchAgent(llm, "before")
+    convert = CountingConverter()
+    history = ConvertedHistory(convert)
+    agent._messages.append(ChatMessage(role=ChatRole.USER, content="m1"))
+    history.update(agent._messages)
+    convert.converted.clear()
+
+    agent.update_instructions("after")
+
+    assert history.update(agent._messages) == ["after", "m1"]
+    assert convert.converted == ["after"]
+
+
+def test_update_instructions_on_a_fork_reconverts_only_that_fork():
+    agent = BenchAgent(ScriptedLLM(), "before")
+    branch, = agent.fork(1)
+    convert = CountingConverter()
+    parent_history, branch_history = ConvertedHistory(convert), ConvertedHistory(convert)
+    parent_history.update(agent._messages)
+    branch_history.update(branch._messages)
+
+    branch.update_instructions("after")
+
+    assert branch_history.update(branch._messages) == ["after"]
+    assert parent_history.update(agent._messages) == ["before"]
+
+
+def test_histories_of_more_agents_than_max_histories_are_kept():
+    convert = CountingConverter()
+    histories = ConvertedHistories(convert, max_histories=4)
+    agents = [BenchAgent(ScriptedLLM(), f"agent {i}") for i in range(10)]
+    for turn in range(3):
+        for agent in agents:
+            agent._messages.append(ChatMessage(role=ChatRole.USER, content=f"m{turn}"))
+            histories.get(agent._messages).update(agent._messages)
+
+    # Each message converted once, though the agents take turns on one LLM
+    assert len(convert.converted) == 10 * 4
+
+
+class NoSlicing(ChatHistory):
+    """Fails on the O(n) prefix comparison of lists without a version."""
+
+    def __getitem__(self, index):
+        assert not isinstance(index, slice)
+        return super().__getitem__(index)
+
+
+def test_appending_to_a_versioned_history_is_checked_without_comparing_it_whole():
+    history = ConvertedHistory(CountingConverter())
+    messages = NoSlicing(_messages(3))
+    items = history.update(messages)
+
+    messages.append(ChatMessage(role=ChatRole.USER, content="m3"))
+    # The history's own list, extended in place rather than copied
+    assert history.update(messages) is items
+    assert items == ["system", "m1", "m2", "m3"]
+
+
+def test_messages_replaced_in_place_are_reconverted():
+    for messages in [_messages(4), ChatHistory(_messages(4)), ForkedHistory(_messages(4))]:
+        convert = CountingConverter()
+        history = ConvertedHistory(convert)
+        history.update(messages)
+        convert.converted.clear()
+
+        # As expired tool outputs are replaced with stubs, after the turn's new message
+        messages.append(ChatMessage(role=ChatRole.USER, content="m4"))
+        messages[1] = ChatMessage(role=ChatRole.USER, content="stub")
+
+        assert list(history.update(messages)) == ["system", "stub", "m2", "m3", "m4"]
+        assert convert.converted == ["stub", "m4"]
+
+
+def test_trims_and_inserts_are_detected_after_the_history_grew_back():
+    convert = CountingConverter()
+    history = ConvertedHistory(convert)
+    messages = ChatHistory(_messages(5))
+    history.update(messages)
+
+    del messages[1:3]
+    messages.extend(ChatMessage(role=ChatRole.USER, content=f"m{i}") for i in range(5, 7))
+    assert list(history.update(messages)) == ["system", "m3", "m4", "m5", "m6"]
+
+    messages.insert(1, ChatMessage(role=ChatRole.USER, content="summary"))
+    del messages[2]
+    assert list(history.update(messages)) == ["system", "summary", "m4", "m5", "m6"]
+
+
+def test_gemini_contents_are_the_converted_history_when_they_start_with_a_user_turn():
+    history = ConvertedHistory(chat_message_to_gemini_contents)
+    messages = ChatHistory(_messages(1))
+
+    _, contents = chat_messages_to_gemini_system_and_contents(messages, history)
+    # Gemini needs a user turn first
+    assert [(c.role, c.parts[0].text) for c in contents] == [("user", "")]
+
+    messages.append(ChatMessage(role=ChatRole.USER, content="m1"))
+    _, contents = chat_messages_to_gemini_system_and_contents(messages, history)
+    assert contents is history.update(messages)
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import ame.llms
+from ame.llms import env
+
+
+def _run(code: str) -> None:
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_importing_ame_does_not_import_provider_sdks():
+    _run(
+        "import sys, ame, ame.llms\n"
+        "assert 'anthropic' not in sys.modules and 'google.genai' not in sys.modules\n"
+        "ame.llms.AnthropicLLM\n"
+        "assert 'anthropic' in sys.modules and 'google.genai' not in sys.modules\n"
+    )
+
+
+def test_adapters_resolve_on_first_access_and_are_cached():
+    from ame.llms.anthropic.llm import LLM
+
+    assert ame.llms.AnthropicLLM is LLM
+    assert "AnthropicLLM" in vars(ame.llms)
+    assert set(ame.llms.__all__) <= set(dir(ame.llms))
+    with pytest.raises(AttributeError):
+        ame.llms.OpenAILLM
+
+
+@pytest.fixture
+def dotenv_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("AME_TEST_KEY", raising=False)
+    monkeypatch.setattr(env, "_loaded", False)
+    (tmp_path / ".env").write_text("AME_TEST_KEY=first\n")
+    return tmp_path
+
+
+def test_the_env_file_is_loaded_from_the_working_directory_once(dotenv_dir, monkeypatch):
+    env.ensure_environment()
+    assert env._loaded
+    assert os.environ["AME_TEST_KEY"] == "first"
+
+    monkeypatch.delenv("AME_TEST_KEY")
+    env.ensure_environment()
+    assert "AME_TEST_KEY" not in os.environ
+
+
+def test_load_environment_reads_a_chosen_file(dotenv_dir, monkeypatch):
+    other = dotenv_dir / "other.env"
+    other.write_text("AME_TEST_KEY=second\n")
+    monkeypatch.setenv("AME_TEST_KEY", "set")
+
+    env.load_environment(str(other))
+    assert os.environ["AME_TEST_KEY"] == "set"
+    env.load_environment(str(other), override=True)
+    assert os.environ["AME_TEST_KEY"] == "second"
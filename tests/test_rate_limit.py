@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+from fakes import ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.llms.rate_limit import RateLimitedLLM, RateLimiter, RateLimits, TokenBucket
+
+MESSAGES = [ChatMessage(role=ChatRole.SYSTEM, content="system"), ChatMessage(role=ChatRole.USER, content="go")]
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyLLM(ScriptedLLM):
+    """Fails with a rate limit error on its first `failures` requests, after streaming `streamed_chunks` chunks."""
+
+    def __init__(self, failures: int, streamed_chunks: int = 0) -> None:
+        super().__init__(ResponseScript(text_chunks=3))
+        self.failures = failures
+        self.streamed_chunks = streamed_chunks
+
+    async def astream(self, messages, tools):
+        self.requests += 1
+        if self.requests <= self.failures:
+            for _ in range(self.streamed_chunks):
+                yield "partial "
+            raise RateLimitError()
+        for _ in range(self.script.text_chunks):
+            yield self.script.chunk_text
+
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self, limits: RateLimits = RateLimits()) -> None:
+        super().__init__(limits)
+        self.acquired = []
+        self.consumed = []
+
+    async def acquire(self, tokens: int) -> None:
+        self.acquired.append(tokens)
+        await super().acquire(tokens)
+
+    def consume_tokens(self, tokens: int) -> None:
+        self.consumed.append(tokens)
+        super().consume_tokens(tokens)
+
+
+async def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(capacity=10, rate=200)
+    start = time.monotonic()
+    await bucket.acquire(10)
+    assert time.monotonic() - start < 0.01
+
+    await bucket.acquire(10)
+    # An empty bucket takes capacity / rate to refill
+    assert time.monotonic() - start >= 0.045
+
+
+async def test_token_bucket_serves_waiters_in_arrival_order():
+    bucket = TokenBucket(capacity=10, rate=500)
+    await bucket.acquire(10)
+    order = []
+
+    async def acquire(name: str, amount: float) -> None:
+        await bucket.acquire(amount)
+        order.append(name)
+
+    await asyncio.gather(acquire("large", 10), acquire("small", 1))
+    assert order == ["large", "small"]
+
+
+async def test_rate_limiter_makes_requests_wait_for_tokens():
+    limiter = RateLimiter(RateLimits(tokens_per_minute=600))
+    await limiter.acquire(600)
+    # 600 tokens per minute refill 10 per second
+    await limiter.acquire(1)
+
+    assert limiter.stats.requests == 2
+    assert limiter.stats.max_wait >= 0.09
+    assert limiter.stats.waiting == 0
+
+
+async def test_a_paused_rate_limiter_holds_back_requests():
+    limiter = RateLimiter(RateLimits(requests_per_minute=1000))
+    limiter.pause(0.05)
+    start = time.monotonic()
+    await limiter.acquire(1)
+    assert time.monotonic() - start >= 0.05
+
+
+async def test_rate_limited_llm_charges_input_and_output_tokens():
+    llm = ScriptedLLM(ResponseScript(text_chunks=10))
+    limiter = RecordingLimiter(RateLimits(tokens_per_minute=100_000))
+    limited = RateLimitedLLM(llm, limiter)
+
+    chunks = [chunk async for chunk in limited.astream(MESSAGES, [])]
+
+    assert chunks == ["token "] * 10
+    assert limiter.acquired == [llm.count_tokens(MESSAGES, [])]
+    assert limiter.consumed == [llm.token_counter.count_text("token " * 10)]
+
+
+async def test_rate_limited_llm_retries_rate_limit_errors_before_any_output():
+    llm = FlakyLLM(failures=2)
+    limiter = RecordingLimiter()
+    limited = RateLimitedLLM(llm, limiter, backoff=0.001)
+
+    chunks = [chunk async for chunk in limited.astream(MESSAGES, [])]
+
+    assert chunks == ["token "] * 3
+    assert llm.requests == 3
+    assert limiter.stats.retries == 2
+    assert len(limiter.acquired) == 3
+
+
+async def test_rate_limited_llm_does_not_retry_after_streaming_output():
+    llm = FlakyLLM(failures=1, streamed_chunks=2)
+    limiter = RecordingLimiter()
+    limited = RateLimitedLLM(llm, limiter, backoff=0.001)
+
+    chunks = []
+    with pytest.raises(RateLimitError):
+        async for chunk in limited.astream(MESSAGES, []):
+            chunks.append(chunk)
+
+    assert chunks == ["partial "] * 2
+    assert llm.requests == 1
+    # The output streamed before the error is still charged
+    assert limiter.consumed == [llm.token_counter.count_text("partial " * 2)]
@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+
+import pytest
+from fakes import ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import ToolCall
+from ame.llms.response_cache import (
+    CacheMode,
+    CachingLLM,
+    MemoryResponseCache,
+    ResponseCacheMiss,
+    SQLiteResponseCache,
+)
+
+SCRIPT = ResponseScript(text_chunks=3, tool_rounds=1, tool_name="sleep", tool_args={"seconds": 0.1})
+
+
+def _request(text: str = "go") -> list[ChatMessage]:
+    return [ChatMessage(role=ChatRole.SYSTEM, content="system"), ChatMessage(role=ChatRole.USER, content=text)]
+
+
+async def _collect(llm: CachingLLM, messages: list[ChatMessage]) -> list[str | ToolCall]:
+    return [chunk async for chunk in llm.astream(messages, [])]
+
+
+async def test_a_recorded_response_is_replayed_for_an_identical_request():
+    llm = ScriptedLLM(SCRIPT)
+    caching = CachingLLM(llm, MemoryResponseCache())
+
+    recorded = await _collect(caching, _request())
+    recorded[-1].response = "filled in by the agent"
+    replayed = await _collect(caching, _request())
+    await _collect(caching, _request("something else"))
+
+    assert llm.requests == 2
+    assert (caching.hits, caching.misses) == (1, 2)
+    assert replayed[:3] == ["token "] * 3
+    tool_call = replayed[-1]
+    assert (tool_call.id, tool_call.name, tool_call.args) == ("call_0_0", "sleep", {"seconds": 0.1})
+    # A fresh object, recorded before the agent filled in its response
+    assert tool_call is not recorded[-1] and tool_call.response is None
+
+
+async def test_replay_only_raises_on_a_miss():
+    cache = MemoryResponseCache()
+    await _collect(CachingLLM(ScriptedLLM(SCRIPT), cache), _request())
+    llm = ScriptedLLM(SCRIPT)
+    replaying = CachingLLM(llm, cache, CacheMode.REPLAY_ONLY)
+
+    assert len(await _collect(replaying, _request())) == 4
+    with pytest.raises(ResponseCacheMiss):
+        await _collect(replaying, _request("something else"))
+    assert llm.requests == 0
+
+
+async def test_record_mode_always_calls_the_llm():
+    llm = ScriptedLLM(SCRIPT)
+    recording = CachingLLM(llm, MemoryResponseCache(), CacheMode.RECORD)
+    await _collect(recording, _request())
+    await _collect(recording, _request())
+    assert llm.requests == 2
+    assert recording.hits == 0
+
+
+async def test_a_response_read_only_partly_is_not_stored():
+    llm = ScriptedLLM(SCRIPT)
+    caching = CachingLLM(llm, MemoryResponseCache())
+
+    async with contextlib.aclosing(caching.astream(_request(), [])) as stream:
+        async for _ in stream:
+            break
+    await _collect(caching, _request())
+
+    assert llm.requests == 2
+    assert caching.hits == 0
+
+
+async def test_memory_cache_evicts_the_least_recently_used_entries():
+    cache = MemoryResponseCache(max_entries=2, max_bytes=None)
+    await cache.set("a", "1")
+    await cache.set("b", "2")
+    await cache.get("a")
+    await cache.set("c", "3")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == "1"
+    assert await cache.get("c") == "3"
+
+
+async def test_memory_cache_evicts_entries_over_its_size():
+    cache = MemoryResponseCache(max_entries=100, max_bytes=10)
+    await cache.set("a", "x" * 4)
+    await cache.set("b", "x" * 4)
+    # Replacing an entry counts only its new size
+    await cache.set("b", "x" * 5)
+    assert cache._bytes == 9
+
+    await cache.set("c", "x" * 4)
+    assert await cache.get("a") is None
+    assert await cache.get("b") == "x" * 5
+    assert cache._bytes == 9
+
+
+async def test_sqlite_cache_persists_and_expires_entries(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = SQLiteResponseCache(path, ttl=0.05)
+    await cache.set("a", "1")
+    cache.close()
+
+    cache = SQLiteResponseCache(path, ttl=0.05)
+    assert await cache.get("a") == "1"
+    await asyncio.sleep(0.06)
+    assert await cache.get("a") is None
+
+    # Expired entries are deleted on the next write
+    await cache.set("b", "2")
+    rows = cache._connection.execute("SELECT key FROM responses").fetchall()
+    assert rows == [("b",)]
+    cache.close()
@@ -0,0 +1,61 @@
+import asyncio
+from typing import AsyncGenerator, List
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tools import Tool, ToolCall
+from ame.llms.llm import LLM
+from ame.llms.router import RouterConfig, RouterLLM
+
+
+class DelayedLLM(LLM):
+    def __init__(self, ttft: float) -> None:
+        self.ttft = ttft
+        self.requests = 0
+        self.counted = 0
+
+    async def astream(self, messages: list[ChatMessage], tools: List[Tool]) -> AsyncGenerator[str | ToolCall]:
+        self.requests += 1
+        await asyncio.sleep(self.ttft)
+        yield "answer"
+
+    def count_tokens(self, messages: list[ChatMessage], tools: List[Tool]) -> int:
+        self.counted += 1
+        return super().count_tokens(messages, tools)
+
+
+async def _ask(router: RouterLLM) -> None:
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system"), ChatMessage(role=ChatRole.USER, content="hi")]
+    async for _ in router.astream(messages, []):
+        pass
+
+
+async def test_a_preferred_backend_that_slows_down_loses_its_rank():
+    fast, slow = DelayedLLM(0.08), DelayedLLM(0.1)
+    # A lost race moves fast's EWMA halfway to its wait, the hedge delay plus slow's TTFT: from 0.08 to
+    # about 0.13, well clear of slow's 0.1 despite scheduling jitter
+    config = RouterConfig(ewma_alpha=0.5, explore_probability=0.0, min_hedge_samples=5)
+    router = RouterLLM({"fast": fast, "slow": slow}, config)
+    # Unmeasured backends are tried first, so both get measured
+    for _ in range(10):
+        await _ask(router)
+    assert router.stats["slow"].ttft_ewma is not None
+    assert router._ranked_backends()[0] == "fast"
+
+    fast.ttft = 5.0
+    fast.requests = 0
+    for _ in range(10):
+        await _ask(router)
+
+    assert router._ranked_backends()[0] == "slow"
+    # Tried first once, and after that only as a hedge for slow
+    assert fast.requests < 6
+
+
+def test_tokens_are_counted_by_the_backend_the_token_counter_belongs_to():
+    first, second = DelayedLLM(0.0), DelayedLLM(0.0)
+    router = RouterLLM({"first": first, "second": second})
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system")]
+
+    router.count_tokens(messages, [])
+
+    assert (first.counted, second.counted) == (1, 0)
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.session_runner import SessionRunner, SessionRunnerConfig
+
+# Each turn streams for about 50 ms
+SCRIPT = ResponseScript(text_chunks=5, tokens_per_second=100)
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+class CountingLLM(ScriptedLLM):
+    """Counts requests streaming at once, across every agent sharing it."""
+
+    def __init__(self, script: ResponseScript = SCRIPT) -> None:
+        super().__init__(script)
+        self.active = 0
+        self.peak = 0
+
+    async def astream(self, messages, tools):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            async for chunk in super().astream(messages, tools):
+                yield chunk
+        finally:
+            self.active -= 1
+
+
+async def test_turns_run_concurrently_up_to_the_limit():
+    llm = CountingLLM()
+    agents = [BenchAgent(llm, "bench") for _ in range(6)]
+    async with SessionRunner(SessionRunnerConfig(max_concurrent_turns=3)) as runner:
+        turns = [await runner.submit(agent, _user("go")) for agent in agents]
+        results = await asyncio.gather(*turns)
+
+    assert llm.peak == 3
+    assert all("".join(chunks) == "token " * 5 for chunks in results)
+    stats = runner.stats()
+    assert (stats.completed, stats.failed, stats.queued, stats.running) == (6, 0, 0, 0)
+    assert stats.max_queue_depth == 6
+    assert stats.max_wait > 0
+
+
+async def test_turns_of_one_agent_run_in_order_one_at_a_time():
+    llm = CountingLLM()
+    agent = BenchAgent(llm, "bench")
+    async with SessionRunner(SessionRunnerConfig(max_concurrent_turns=3)) as runner:
+        turns = [await runner.submit(agent, _user(f"question {i}")) for i in range(3)]
+        await asyncio.gather(*turns)
+
+    assert llm.peak == 1
+    assert all(a.finished_at <= b.started_at for a, b in zip(turns, turns[1:]))
+    questions = [m.content for m in agent._messages if m.role == ChatRole.USER]
+    assert questions == ["question 0", "question 1", "question 2"]
+
+
+async def test_agents_with_queued_turns_take_turns_round_robin():
+    busy, other = BenchAgent(CountingLLM(), "bench"), BenchAgent(CountingLLM(), "bench")
+    async with SessionRunner(SessionRunnerConfig(max_concurrent_turns=1)) as runner:
+        busy_turns = [await runner.submit(busy, _user("go")) for _ in range(3)]
+        other_turn = await runner.submit(other, _user("go"))
+        await asyncio.gather(*busy_turns, other_turn)
+
+    assert busy_turns[0].finished_at <= other_turn.started_at <= busy_turns[1].started_at
+
+
+async def test_a_turn_can_be_streamed_while_it_runs():
+    async with SessionRunner() as runner:
+        turn = await runner.submit(BenchAgent(CountingLLM(), "bench"), _user("go"))
+        chunks, done = [], []
+        async for chunk in turn:
+            chunks.append(chunk)
+            done.append(turn.done())
+
+    assert chunks == ["token "] * 5
+    # The first chunks arrive while the turn is still running
+    assert not done[0]
+
+
+async def test_submit_nowait_raises_once_the_queue_is_full():
+    runner = SessionRunner(SessionRunnerConfig(max_queued_turns=2))
+    agent = BenchAgent(CountingLLM(), "bench")
+    turns = [await runner.submit_nowait(agent, _user("go")) for _ in range(2)]
+    with pytest.raises(asyncio.QueueFull):
+        await runner.submit_nowait(agent, _user("go"))
+
+    # Never started, so stopping fails the queued turns
+    await runner.stop()
+    for turn in turns:
+        with pytest.raises(asyncio.CancelledError):
+            await turn
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole, dump_message
+from ame.core.context import MessageCountContextManager, TokenBudgetContextManager
+from ame.core.session_store import PersistentContextManager, SessionLog, SessionStore
+from ame.core.tools import ToolOutputOptions, tool
+
+
+def _message(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+def _records(log: SessionLog) -> list[dict]:
+    return [json.loads(line) for line in log.path.read_bytes().splitlines()]
+
+
+def _dumped(messages: list[ChatMessage]) -> list[dict]:
+    return list(map(dump_message, messages))
+
+
+async def _log_messages(context_manager: PersistentContextManager, n: int) -> list[ChatMessage]:
+    messages = [ChatMessage(role=ChatRole.SYSTEM, content="system")]
+    for i in range(n):
+        await context_manager.add(messages, _message(f"message {i} " * 10))
+    context_manager.log.close()
+    return messages
+
+
+def test_load_ignores_a_record_cut_short_and_the_next_write_replaces_it(tmp_path):
+    log = SessionStore(tmp_path).open("session")
+    system = ChatMessage(role=ChatRole.SYSTEM, content="system")
+    log.write_snapshot([system, _message("a")])
+    log.append(_message("b"), drop=0)
+    log.close()
+    # A crash in the middle of writing the next record
+    with open(log.path, "ab") as f:
+        f.write(b'{"type":"append","message":{"role":"USER","con')
+
+    resumed = SessionLog(log.path)
+    messages = resumed.load()
+    assert [m.content for m in messages] == ["system", "a", "b"]
+
+    resumed.append(_message("c"), drop=1)
+    resumed.close()
+    assert [m.content for m in SessionLog(log.path).load()] == ["system", "b", "c"]
+    assert all(line.endswith(b"}") for line in log.path.read_bytes().splitlines())
+
+
+def test_load_of_a_log_without_a_complete_snapshot_is_none(tmp_path):
+    path = tmp_path / "session.jsonl"
+    path.write_bytes(b'{"type":"snapshot","messages":[')
+    assert SessionLog(path).load() is None
+
+
+def test_resuming_a_session_writes_nothing_to_its_log(tmp_path):
+    log = SessionStore(tmp_path).open("session")
+    log.write_snapshot([ChatMessage(role=ChatRole.SYSTEM, content="system"), _message("a")])
+    log.append(_message("b"), drop=0)
+    log.close()
+    logged = log.path.read_bytes()
+
+    context_manager = PersistentContextManager(SessionLog(log.path), MessageCountContextManager(10))
+    agent = BenchAgent(ScriptedLLM(), "system", context_manager=context_manager)
+    agent.restore_history(context_manager.load())
+
+    assert [m.content for m in agent._messages] == ["system", "a", "b"]
+    assert log.path.read_bytes() == logged
+
+
+class ExpiringAgent(BenchAgent):
+    @tool(output=ToolOutputOptions(keep_turns=1))
+    async def fetch(self) -> str:
+        """Returns a large output."""
+        return "x" * 4000
+
+
+async def test_expired_tool_outputs_are_logged_as_small_records(tmp_path):
+    log = SessionStore(tmp_path).open("session")
+    context_manager = PersistentContextManager(log, MessageCountContextManager(1000))
+    script = ResponseScript(text_chunks=1, tool_rounds=1, tool_name="fetch")
+    agent = ExpiringAgent(ScriptedLLM(script), "bench", context_manager=context_manager)
+
+    turns = 50
+    for i in range(turns):
+        async for _ in agent.astream(_message(f"question {i}")):
+            pass
+    log.close()
+
+    records = _records(log)
+    assert sum(record["type"] == "snapshot" for record in records) == 1
+    # Outputs more than one turn old are stubbed
+    assert sum(record["type"] == "replace" for record in records) == turns - 2
+    # Each output is logged once, rather than with every snapshot of the history
+    assert log.path.stat().st_size < turns * 5000
+    assert _dumped(SessionLog(log.path).load()) == _dumped(agent._messages)
+
+
+def test_updating_a_log_before_its_first_snapshot_raises(tmp_path):
+    log = SessionStore(tmp_path).open("session")
+    with pytest.raises(RuntimeError):
+        log.append(_message("a"), drop=0)
+    assert not log.path.exists()
+
+
+async def test_front_trims_are_logged_as_appends(tmp_path):
+    log = SessionStore(tmp_path).open("session")
+    messages = await _log_messages(PersistentContextManager(log, MessageCountContextManager(5)), 20)
+
+    assert [record["type"] for record in _records(log)] == ["snapshot"] + ["append"] * 19
+    assert _dumped(SessionLog(log.path).load()) == _dumped(messages)
+
+
+async def test_a_new_summary_is_logged_as_a_snapshot(tmp_path):
+    async def summarize(dropped: list[ChatMessage], previous: str | None) -> str:
+        return f"{len(dropped)} messages"
+
+    log = SessionStore(tmp_path).open("session")
+    inner = TokenBudgetContextManager(max_tokens=200, summarizer=summarize)
+    messages = await _log_messages(PersistentContextManager(log, inner), 20)
+
+    snapshots = [record for record in _records(log) if record["type"] == "snapshot"]
+    assert len(snapshots) > 1
+    assert snapshots[-1]["messages"][1]["content"].startswith("Summary of the earlier conversation")
+    assert _dumped(SessionLog(log.path).load()) == _dumped(messages)
+
+
+async def test_a_snapshot_is_forced_every_snapshot_every_records(tmp_path):
+    log = SessionStore(tmp_path, snapshot_every=5).open("session")
+    messages = await _log_messages(PersistentContextManager(log, MessageCountContextManager(100)), 20)
+
+    # The first snapshot, then one after every 5 appends
+    types = [record["type"] for record in _records(log)]
+    assert [i for i, t in enumerate(types) if t == "snapshot"] == [0, 6, 12, 18]
+    assert _dumped(SessionLog(log.path).load()) == _dumped(messages)
@@ -0,0 +1,99 @@
+import asyncio
+from typing import AsyncGenerator, List
+
+import pytest
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.streaming import CoalesceOptions, coalesce_text
+from ame.core.tools import ToolCall
+from ame.core.tracing import LLM_INTER_TOKEN_GAP, LLM_TIME_TO_FIRST_TOKEN, MetricsAggregator, set_tracer
+
+# Flushing on size only, and with a time limit, which reads the stream in a separate task
+OPTIONS = [CoalesceOptions(max_chars=10, max_delay=None), CoalesceOptions(max_chars=10, max_delay=10.0)]
+
+
+class Source:
+    def __init__(self, chunks: List[str | ToolCall], delay: float = 0.0) -> None:
+        self.chunks = chunks
+        self.delay = delay
+        self.closed = False
+
+    async def stream(self) -> AsyncGenerator[str | ToolCall]:
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.delay)
+                yield chunk
+        finally:
+            self.closed = True
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+async def test_text_chunks_are_merged_up_to_max_chars(options):
+    source = Source(["abc"] * 7)
+    chunks = [chunk async for chunk in coalesce_text(source.stream(), options)]
+    assert chunks == ["abc" * 4, "abc" * 3]
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+async def test_buffered_text_is_flushed_before_a_tool_call(options):
+    tool_call = ToolCall(id="a", name="noop")
+    source = Source(["ab", "cd", tool_call, "ef"])
+    chunks = [chunk async for chunk in coalesce_text(source.stream(), options)]
+    assert chunks == ["abcd", tool_call, "ef"]
+
+
+async def test_buffered_text_is_flushed_after_max_delay():
+    source = Source(["ab", "cd"], delay=0.1)
+    chunks = [chunk async for chunk in coalesce_text(source.stream(), CoalesceOptions(max_delay=0.01))]
+    assert chunks == ["ab", "cd"]
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+async def test_closing_early_closes_the_source(options):
+    source = Source(["abcdefghij"] * 100)
+    stream = coalesce_text(source.stream(), options)
+    assert await anext(stream) == "abcdefghij"
+    await stream.aclose()
+    assert source.closed
+
+
+async def test_cancelling_the_consumer_while_the_reader_stops_isnt_swallowed():
+    class SlowToClose(Source):
+        async def stream(self) -> AsyncGenerator[str | ToolCall]:
+            try:
+                async for chunk in super().stream():
+                    yield chunk
+            finally:
+                await asyncio.sleep(0.1)
+
+    closed = False
+
+    async def consume() -> None:
+        nonlocal closed
+        stream = coalesce_text(SlowToClose(["abcdefghij"] * 100, delay=0.01).stream(), OPTIONS[1])
+        await anext(stream)
+        await stream.aclose()
+        closed = True
+
+    task = asyncio.create_task(consume())
+    # Cancelled while `aclose` waits for the reader task to stop
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not closed
+
+
+async def test_latency_is_measured_on_the_provider_stream_not_the_coalesced_one():
+    aggregator = MetricsAggregator()
+    set_tracer(aggregator)
+    try:
+        agent = BenchAgent(ScriptedLLM(ResponseScript(text_chunks=200)), "bench")
+        chunks = [chunk async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go"), coalesce=True)]
+    finally:
+        set_tracer(None)
+
+    assert len(chunks) < 200
+    assert aggregator.metrics[LLM_TIME_TO_FIRST_TOKEN].count == 1
+    assert aggregator.metrics[LLM_INTER_TOKEN_GAP].count == 199
@@ -0,0 +1,144 @@
+import asyncio
+
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tool_cache import ToolResultCache
+from ame.core.tools import ToolCacheOptions, tool
+
+
+def _user(text: str) -> ChatMessage:
+    return ChatMessage(role=ChatRole.USER, content=text)
+
+
+class Counter:
+    def __init__(self, seconds: float = 0.0) -> None:
+        self.seconds = seconds
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"result {self.calls}"
+
+
+async def test_a_hit_returns_the_stored_result_without_running_the_tool():
+    cache = ToolResultCache(ToolCacheOptions())
+    run = Counter()
+
+    assert await cache.get_or_run("a", run) == "result 1"
+    assert await cache.get_or_run("a", run) == "result 1"
+    assert await cache.get_or_run("b", run) == "result 2"
+
+    assert run.calls == 2
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.deduplicated) == (1, 2, 0)
+
+
+async def test_results_expire_after_the_ttl():
+    cache = ToolResultCache(ToolCacheOptions(ttl=0.02))
+    run = Counter()
+
+    await cache.get_or_run("a", run)
+    await asyncio.sleep(0.03)
+    assert await cache.get_or_run("a", run) == "result 2"
+    assert (cache.stats.hits, cache.stats.misses) == (0, 2)
+
+
+async def test_concurrent_identical_calls_share_one_run():
+    cache = ToolResultCache(ToolCacheOptions())
+    run = Counter(0.01)
+
+    results = await asyncio.gather(*(cache.get_or_run("a", run) for _ in range(3)))
+
+    assert results == ["result 1"] * 3
+    assert run.calls == 1
+    assert (cache.stats.misses, cache.stats.deduplicated) == (1, 2)
+
+
+async def test_the_shared_run_stops_only_once_every_caller_is_cancelled():
+    cache = ToolResultCache(ToolCacheOptions())
+    run = Counter(0.05)
+    first = asyncio.create_task(cache.get_or_run("a", run))
+    second = asyncio.create_task(cache.get_or_run("a", run))
+    await asyncio.sleep(0.01)
+
+    first.cancel()
+    assert await second == "result 1"
+    assert run.cancelled == 0
+
+    third = asyncio.create_task(cache.get_or_run("b", run))
+    await asyncio.sleep(0.01)
+    third.cancel()
+    await asyncio.sleep(0.01)
+    assert run.cancelled == 1
+    # The cancelled run is forgotten, so the next call runs the tool again
+    assert await cache.get_or_run("b", run) == "result 3"
+
+
+class CachedAgent(BenchAgent):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lookups = []
+
+    @tool(cache=True)
+    async def lookup(self, query: str) -> str:
+        """Looks up the query."""
+        self.lookups.append(query)
+        await asyncio.sleep(0.01)
+        return f"found {query}"
+
+
+async def test_agent_caches_tool_results_by_their_arguments():
+    script = ResponseScript(text_chunks=1, tool_rounds=1, tool_calls_per_round=2, tool_name="lookup")
+    llm = ScriptedLLM(script)
+    agent = CachedAgent(llm, "bench")
+
+    for query in ["a", "b", "a"]:
+        script.tool_args = {"query": query}
+        [chunk async for chunk in agent.astream(_user("go"))]
+
+    assert agent.lookups == ["a", "b"]
+    stats = agent.tool_cache_stats()["lookup"]
+    assert (stats.hits, stats.misses, stats.deduplicated) == (2, 2, 2)
+
+
+class SlowCachedAgent(BenchAgent):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    @tool(cache=True)
+    async def slow_lookup(self, query: str) -> str:
+        """Looks up the query, slowly."""
+        self.started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return f"found {query}"
+
+
+async def test_interrupting_a_turn_cancels_its_cached_tool_call():
+    script = ResponseScript(text_chunks=1, tool_rounds=1, tool_name="slow_lookup", tool_args={"query": "a"})
+    agent = SlowCachedAgent(ScriptedLLM(script), "bench")
+
+    async def interrupt() -> None:
+        await agent.started.wait()
+        agent.interrupt()
+
+    interrupter = asyncio.create_task(interrupt())
+    [chunk async for chunk in agent.astream(_user("go"))]
+    await interrupter
+    await asyncio.sleep(0.01)
+
+    assert agent.cancelled
+    recorded = next(m.content for m in agent._messages if isinstance(m.content, list))
+    assert recorded[0].response.startswith("[Interrupted")
+    assert not agent._tool_caches["slow_lookup"]._in_flight
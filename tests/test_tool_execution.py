@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.agent_with_tools import AgentWithToolsConfig, StopReason
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tool_execution import ToolTimeoutError, configure_tool_execution, run_tool
+from ame.core.tools import ToolOptions, tool
+
+
+async def _nap(instance, seconds: float) -> float:
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+async def _contend(options: ToolOptions) -> None:
+    await asyncio.gather(*(run_tool(_nap, None, {"seconds": 0.01}, options) for _ in range(3)))
+
+
+def test_concurrency_limits_work_on_every_event_loop():
+    configure_tool_execution(max_concurrent_calls=2)
+    try:
+        options = ToolOptions(max_concurrency=1)
+        # Semaphores used on one loop would fail on the next, as with separate asyncio.run calls
+        asyncio.run(_contend(options))
+        asyncio.run(_contend(options))
+    finally:
+        configure_tool_execution()
+
+
+async def _fail_with_timeout(instance) -> None:
+    raise TimeoutError("the service timed out")
+
+
+async def test_only_the_timeout_raises_tool_timeout_error():
+    with pytest.raises(ToolTimeoutError):
+        await run_tool(_nap, None, {"seconds": 1}, ToolOptions(timeout=0.01))
+    with pytest.raises(TimeoutError) as raised:
+        await run_tool(_fail_with_timeout, None, {}, ToolOptions(timeout=1))
+    assert not isinstance(raised.value, ToolTimeoutError)
+
+
+class SlowAgent(BenchAgent):
+    @tool(timeout=0.01)
+    async def hang(self) -> str:
+        """Never returns in time."""
+        await asyncio.sleep(10)
+        return "done"
+
+
+async def test_a_timed_out_tool_call_is_recorded_as_its_response():
+    script = ResponseScript(text_chunks=1, tool_rounds=1, tool_calls_per_round=2, tool_name="hang")
+    agent = SlowAgent(ScriptedLLM(script), "bench")
+
+    [chunk async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go"))]
+
+    assert agent.stop_reason == StopReason.COMPLETED
+    recorded = next(m.content for m in agent._messages if isinstance(m.content, list))
+    assert [tc.response for tc in recorded] == ["[Timed out: the hang tool call didn't finish within 0.01 seconds]"] * 2
+
+
+def test_an_agents_tool_call_limit_works_on_every_event_loop():
+    script = ResponseScript(text_chunks=1, tool_rounds=1, tool_calls_per_round=3, tool_name="sleep", tool_args={"seconds": 0.01})
+    agent = BenchAgent(ScriptedLLM(script), "bench", AgentWithToolsConfig(max_concurrent_tool_calls=1))
+
+    async def turn() -> None:
+        [chunk async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go"))]
+        assert agent.stop_reason == StopReason.COMPLETED
+
+    asyncio.run(turn())
+    asyncio.run(turn())
@@ -0,0 +1,45 @@
+import pytest
+from pydantic import ValidationError
+
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tool_output import truncate_output
+from ame.core.tools import ToolOutputOptions, Truncation, tool
+from ame.llms.tokens import HeuristicTokenCounter
+
+
+@pytest.mark.parametrize("truncation", list(Truncation))
+def test_max_tokens_0_keeps_only_the_note(truncation):
+    truncated = truncate_output("x" * 100, ToolOutputOptions(max_tokens=0, truncation=truncation))
+    assert truncated == "[100 of 100 characters omitted]"
+
+
+def test_negative_max_tokens_are_rejected():
+    with pytest.raises(ValidationError):
+        ToolOutputOptions(max_tokens=-1)
+
+
+def test_outputs_are_truncated_by_the_given_token_counter():
+    options = ToolOutputOptions(max_tokens=10, truncation=Truncation.HEAD)
+    output = "x" * 100
+    assert truncate_output(output, options) == "x" * 40 + "\n[60 of 100 characters omitted]"
+    assert truncate_output(output, options, counter=HeuristicTokenCounter(chars_per_token=1)) == "x" * 10 + "\n[90 of 100 characters omitted]"
+
+
+class LimitedAgent(BenchAgent):
+    @tool(output=ToolOutputOptions(max_tokens=10, truncation=Truncation.HEAD))
+    async def fetch(self) -> str:
+        """Returns a large output."""
+        return "x" * 100
+
+
+async def test_agent_limits_tool_outputs_by_its_llms_token_counter():
+    llm = ScriptedLLM(ResponseScript(text_chunks=1, tool_rounds=1, tool_name="fetch"))
+    llm.token_counter = HeuristicTokenCounter(chars_per_token=1)
+    agent = LimitedAgent(llm, "bench")
+
+    [chunk async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go"))]
+
+    recorded = next(m.content for m in agent._messages if isinstance(m.content, list))
+    assert recorded[0].response.startswith("x" * 10 + "\n[90 of 100")
@@ -0,0 +1,63 @@
+import pytest
+from pydantic import ValidationError
+from fakes import BenchAgent, ScriptedLLM
+
+from ame.core.tools import ToolCall, ToolOutputOptions, tool
+from ame.llms.anthropic.utils import tool_to_anthropic_tool
+from ame.llms.gemini.utils import tool_to_gemini_function_declaration
+
+
+class SearchAgent(BenchAgent):
+    @tool
+    async def search(self, query: str) -> str:
+        """Searches for the query."""
+        return f"results for {query}"
+
+    # No longer a tool once overridden without @tool
+    async def sleep(self, seconds: float) -> str:
+        return "done"
+
+
+class SpillingAgent(BenchAgent):
+    @tool(output=ToolOutputOptions(max_tokens=10, spill=True))
+    async def fetch(self) -> str:
+        """Returns a large output."""
+        return "x" * 1000
+
+
+def test_the_tool_registry_is_built_once_per_class():
+    first, second = SearchAgent(ScriptedLLM(), "a"), SearchAgent(ScriptedLLM(), "b")
+
+    assert sorted(SearchAgent._tool_registry) == ["block", "noop", "search"]
+    assert first._tool_registry is second._tool_registry is SearchAgent._tool_registry
+    assert all(a is b for a, b in zip(first._tools, second._tools))
+    # The base class keeps its own tools
+    assert sorted(BenchAgent._tool_registry) == ["block", "noop", "sleep"]
+
+
+def test_read_tool_output_is_only_offered_with_spilled_outputs():
+    assert "read_tool_output" not in BenchAgent._tool_registry
+    assert "read_tool_output" in SpillingAgent._tool_registry
+
+
+async def test_only_registered_tools_can_be_called():
+    agent = SearchAgent(ScriptedLLM(), "bench")
+    assert await agent._execute_tool_call(ToolCall(id="a", name="search", args={"query": "q"})) == "results for q"
+    for name in ["sleep", "interrupt", "missing"]:
+        with pytest.raises(ValueError):
+            await agent._execute_tool_call(ToolCall(id="a", name=name, args={}))
+
+
+def test_provider_payloads_are_built_once_per_tool():
+    search = SearchAgent._tool_registry["search"]
+
+    anthropic_tool = tool_to_anthropic_tool(search)
+    gemini_declaration = tool_to_gemini_function_declaration(search)
+
+    assert tool_to_anthropic_tool(search) is anthropic_tool
+    assert tool_to_gemini_function_declaration(search) is gemini_declaration
+    assert anthropic_tool["name"] == gemini_declaration["name"] == "search"
+    assert anthropic_tool["input_schema"]["required"] == ["query"]
+    # Frozen, so a cached payload can't go stale
+    with pytest.raises(ValidationError):
+        search.description = "changed"
@@ -0,0 +1,147 @@
+from typing import Any, Optional
+
+import pytest
+from fakes import BenchAgent, ResponseScript, ScriptedLLM
+
+from ame.core.chat_context import ChatMessage, ChatRole
+from ame.core.tracing import (
+    AGENT_STEP,
+    AGENT_TURN,
+    LLM_INTER_TOKEN_GAP,
+    LLM_REQUEST,
+    LLM_TIME_TO_FIRST_TOKEN,
+    TOOL_DURATION,
+    TOOL_EXECUTE,
+    TOOL_QUEUE_TIME,
+    Attributes,
+    MetricsAggregator,
+    NoopTracer,
+    Span,
+    Tracer,
+    get_tracer,
+    set_tracer,
+)
+
+# One turn of two steps: the first calls two tools, the second answers
+SCRIPT = ResponseScript(text_chunks=3, tool_rounds=1, tool_calls_per_round=2)
+
+
+class RecordedSpan(Span):
+    def __init__(self, name: str, attributes: Optional[Attributes], parent: Optional[Span]) -> None:
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.ended = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        assert not self.ended
+        self.ended = True
+
+
+class RecordingTracer(Tracer):
+    def __init__(self) -> None:
+        self.spans: list[RecordedSpan] = []
+
+    def start_span(self, name: str, attributes: Optional[Attributes] = None, parent: Optional[Span] = None) -> Span:
+        span = RecordedSpan(name, attributes, parent)
+        self.spans.append(span)
+        return span
+
+    def record(self, name: str, value: float, attributes: Optional[Attributes] = None) -> None:
+        pass
+
+    def named(self, name: str) -> list[RecordedSpan]:
+        return [span for span in self.spans if span.name == name]
+
+
+@pytest.fixture
+def install():
+    def install(tracer: Tracer) -> Tracer:
+        set_tracer(tracer)
+        return tracer
+
+    yield install
+    set_tracer(None)
+
+
+async def _run_turn() -> BenchAgent:
+    agent = BenchAgent(ScriptedLLM(SCRIPT), "bench")
+    [chunk async for chunk in agent.astream(ChatMessage(role=ChatRole.USER, content="go"))]
+    return agent
+
+
+async def test_tracing_is_off_by_default():
+    assert isinstance(get_tracer(), NoopTracer)
+    assert not get_tracer().enabled
+    agent = await _run_turn()
+    assert agent._messages[-1].content == "token " * 3
+
+
+async def test_aggregator_summarizes_a_tool_loop_turn(install):
+    aggregator = install(MetricsAggregator())
+    await _run_turn()
+
+    counts = {name: summary.count for name, summary in aggregator.metrics.items()}
+    assert counts == {
+        AGENT_TURN: 1,
+        AGENT_STEP: 2,
+        LLM_REQUEST: 2,
+        LLM_TIME_TO_FIRST_TOKEN: 2,
+        # Three text chunks and two tool calls, then three text chunks
+        LLM_INTER_TOKEN_GAP: 4 + 2,
+        TOOL_EXECUTE: 2,
+        TOOL_QUEUE_TIME: 2,
+        TOOL_DURATION: 2,
+    }
+    turn = aggregator.metrics[AGENT_TURN]
+    assert turn.min == turn.max >= aggregator.metrics[AGENT_STEP].max
+
+    aggregator.reset()
+    assert not aggregator.metrics
+
+
+async def test_agent_spans_nest_under_the_turn(install):
+    tracer = install(RecordingTracer())
+    await _run_turn()
+
+    [turn] = tracer.named(AGENT_TURN)
+    steps = tracer.named(AGENT_STEP)
+    assert [step.attributes["step"] for step in steps] == [1, 2]
+    assert all(step.parent is turn for step in steps)
+    assert [request.parent for request in tracer.named(LLM_REQUEST)] == steps
+    assert [tool.parent for tool in tracer.named(TOOL_EXECUTE)] == [steps[0], steps[0]]
+    assert steps[0].attributes["tool_calls"] == 2
+    assert turn.attributes == {"agent": "BenchAgent", "stop_reason": "COMPLETED", "steps": 2}
+    assert all(span.ended for span in tracer.spans)
+
+
+async def test_opentelemetry_tracer_exports_nested_spans(install):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    from ame.core.tracing import OpenTelemetryTracer
+
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+    install(OpenTelemetryTracer(tracer_provider.get_tracer("test"), meter_provider.get_meter("test")))
+    await _run_turn()
+
+    spans = {span.context.span_id: span for span in exporter.get_finished_spans()}
+    by_name = {}
+    for span in spans.values():
+        by_name.setdefault(span.name, []).append(span)
+    [turn] = by_name[AGENT_TURN]
+    assert all(spans[step.parent.span_id] is turn for step in by_name[AGENT_STEP])
+    assert all(spans[tool.parent.span_id].name == AGENT_STEP for tool in by_name[TOOL_EXECUTE])
+    metrics = reader.get_metrics_data().resource_metrics[0].scope_metrics[0].metrics
+    assert TOOL_DURATION in {metric.name for metric in metrics}